@@ -1,9 +1,10 @@
 import argparse
 import numpy
 import pickle
-import pylab
 import sys
 
+from spike_store import SpikeStore
+
 def display_spikes_interleaved(e_spikes, i_spikes, raster_axis, rate_axis, num_hcus, num_mcu_neurons, num_mcu_per_hcu,
                                sim_start_time, sim_end_time, cmap, scatter_size=0.1):
     num_mcus = num_hcus * num_mcu_per_hcu
@@ -58,15 +59,19 @@ def load_spikes(filename, segment):
 
     return hcu_spikes
 
+# Load spikes from a SpikeStore recording in the same format as load_spikes
+def load_store_spikes(store, name, t_start=None, t_stop=None):
+    ids, times = store.get_spikes(name, t_start, t_stop)
+    return numpy.column_stack((ids, times)).astype(float)
 
-def combine_e_spikes(filenames, segment, num_mcu_neurons, num_mcu_per_hcu):
-    num_hcus = len(filenames)
+def combine_e_spikes(hcu_spikes, num_mcu_neurons, num_mcu_per_hcu):
+    num_hcus = len(hcu_spikes)
 
-    # Loop through filenames
+    # Loop through HCUs
     e_spikes = None
-    for i, f in enumerate(filenames):
-        # Load e spikes
-        hcu_e_spikes = load_spikes(f, segment)
+    for i, s in enumerate(hcu_spikes):
+        # Copy e spikes so they can be re-indexed in place
+        hcu_e_spikes = numpy.array(s, dtype=float)
 
         # Determine which minicolumn each spike originates from [0, num_mcus)
         hcu_e_minicolumn = numpy.remainder(hcu_e_spikes[:,0], num_mcu_per_hcu)
@@ -89,12 +94,12 @@ def combine_e_spikes(filenames, segment, num_mcu_neurons, num_mcu_per_hcu):
 
     return e_spikes
 
-def combine_i_spikes(filenames, segment):
-    # Loop through filenames
+def combine_i_spikes(hcu_spikes):
+    # Loop through HCUs
     i_spikes = None
-    for i, f in enumerate(filenames):
-        # Load i spikes
-        hcu_i_spikes = load_spikes(f, segment)
+    for i, s in enumerate(hcu_spikes):
+        # Copy i spikes so they can be re-indexed in place
+        hcu_i_spikes = numpy.array(s, dtype=float)
 
         hcu_i_spikes[:,0] += (i * NI)
 
@@ -105,25 +110,30 @@ def combine_i_spikes(filenames, segment):
     return i_spikes
 
 if __name__ == "__main__":
+    # **NOTE** only import pylab when displaying spikes so
+    # spike analysis functions can be used without matplotlib
+    import pylab
+
     parser = argparse.ArgumentParser(description="Combine together spikes recorded from multiple HCUs and display raster")
     parser.add_argument("--num_hcus", type=int, default=9, help="How many HCUs is data for")
     parser.add_argument("--num_mcu_neurons", type=int, default=100, help="How many neurons make up an MCU")
     parser.add_argument("--num_mcu_per_hcu", type=int, default=10, help="How many MCUs make up each HCU")
-    parser.add_argument("folder", nargs=1, help="Folder to search for spike files in")
-    parser.add_argument("e_filename", nargs=1, help="Filenames of excitatory spike files are of the form hcu_X_YYYY.npy where filename specified YYYY")
-    parser.add_argument("i_filename", nargs="?", help="Filenames of inhibitory spike files are of the form hcu_X_YYYY.npy where filename specified YYYY")
+    parser.add_argument("--show_i", action="store_true", help="Also display inhibitory spikes")
+    parser.add_argument("folder", nargs=1, help="Folder to search for spike store in")
+    parser.add_argument("store_name", nargs=1, help="Name of spike store within folder e.g. testing_spikes_asymmetrical")
     args = parser.parse_args()
 
+    store = SpikeStore("%s/%s" % (args.folder[0], args.store_name[0]))
+
     # Combine e spikes
-    e_filenames = ["%s/hcu_%u_%s.pkl" % (args.folder[0], i, args.e_filename[0]) for i in range(args.num_hcus)]
-    e_spikes = combine_e_spikes(e_filenames, 0, args.num_mcu_neurons, args.num_mcu_per_hcu)
+    e_spikes = combine_e_spikes([load_store_spikes(store, "hcu_%u_e" % i) for i in range(args.num_hcus)],
+                                args.num_mcu_neurons, args.num_mcu_per_hcu)
 
     figure, axes = pylab.subplots(2, sharex=True)
 
-    # If i spikes filename was specified
-    if args.i_filename is not None:
-        i_filenames = ["%s/hcu_%u_%s.pkl" % (args.folder[0], i, args.i_filename) for i in range(args.num_hcus)]
-        i_spikes = combine_i_spikes(i_filenames, 0)
+    # If i spikes should be shown
+    if args.show_i:
+        i_spikes = combine_i_spikes([load_store_spikes(store, "hcu_%u_i" % i) for i in range(args.num_hcus)])
 
         axes[0].set_ylim((0, (NE + NI) * args.num_hcus))
     else:
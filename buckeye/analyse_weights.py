@@ -6,10 +6,19 @@ import pickle
 import pylab
 import sys
 
-def load_masked_weights(filename):
+from weight_archive import WeightArchive
+from weight_files import get_dense_weights, is_sparse_weights, load_sparse_weights, load_weight_array
+
+# Load weights between populations of size neurons from a
+# .npy filename or a (WeightArchive, block name) tuple
+def load_masked_weights(source, size):
+    data = load_weight_array(source)
+
+    # If weights are sparse, expand them into dense matrix
+    if is_sparse_weights(data):
+        data = get_dense_weights(load_sparse_weights(source), (size, size))
     # **YUCK** older scripts output 3D rather than 2D weight data
-    data = numpy.load(filename)
-    if len(data.shape) == 3:
+    elif len(data.shape) == 3:
         data = data[0]
 
     weight = numpy.ma.array(data, fill_value=0.0)
@@ -50,16 +59,16 @@ def display_single_attractor(masked_weights, mi, axis, num_mcu_neurons):
     axis.set_xlabel("Post minicolumn ID")
     axis.set_ylabel("Mean weight")
 
-def combine_connection_weights(filenames, num_excitatory):
+def combine_connection_weights(sources, num_excitatory):
     # Initialise combined weights to nan
     combined_masked_weights = numpy.ma.empty((num_excitatory, num_excitatory),
                                              fill_value=0.0)
     combined_masked_weights[:] = numpy.ma.masked
 
     # Loop through all connectors, 256
-    for f in filenames:
+    for s in sources:
         # Load weights
-        masked_weights = load_masked_weights(f)
+        masked_weights = load_masked_weights(s, num_excitatory)
         combined_masked_weights = numpy.ma.array(combined_masked_weights.data + masked_weights.data,
                                                  mask=numpy.logical_and(combined_masked_weights.mask, masked_weights.mask),
                                                  fill_value=0.0)
@@ -72,8 +81,9 @@ if __name__ == "__main__":
     parser.add_argument("--num_mcu_per_hcu", type=int, default=10, help="How many MCUs make up each HCU")
     parser.add_argument("--selected_attractor", type=int, default=7, help="Which attractor to plot")
     parser.add_argument("--label_filename", help="Name of file containing pickled list of labels")
-    parser.add_argument("folder", nargs=1, help="Folder to search for weight files in")
-    parser.add_argument("filename", nargs=1, help="Filenames of weight files are of the form connection_X_YYYY.npy where filename specified YYYY")
+    parser.add_argument("--archive_name", default="connection_weights_asymmetrical", help="Name of weight archive within folder")
+    parser.add_argument("folder", nargs=1, help="Folder to search for weight archive in")
+    parser.add_argument("filename", nargs=1, help="Names of weight blocks are of the form connection_X_YYYY where filename specified YYYY")
     args = parser.parse_args()
 
     figure, axes = pylab.subplots(1, 2)
@@ -81,9 +91,10 @@ if __name__ == "__main__":
     # Calculate total neurons
     num_excitatory = args.num_mcu_per_hcu * args.num_mcu_neurons
 
-    # Build filenames from command line
-    filenames = ["%s/connection_%u_%s.npy" % (args.folder[0], i, args.filename[0]) for i in range(args.num_hcus ** 2)]
-    combined_masked_weights = combine_connection_weights(filenames, num_excitatory)
+    # Build archive blocks from command line
+    archive = WeightArchive("%s/%s.arc" % (args.folder[0], args.archive_name))
+    sources = [(archive, "connection_%u_%s" % (i, args.filename[0])) for i in range(args.num_hcus ** 2)]
+    combined_masked_weights = combine_connection_weights(sources, num_excitatory)
 
     # Display weights
     display_single_attractor(combined_masked_weights, args.selected_attractor, axes[0], args.num_mcu_neurons)
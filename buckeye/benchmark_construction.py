@@ -0,0 +1,172 @@
+import argparse
+import functools
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import numpy
+import os
+import re
+import shutil
+import tempfile
+
+import network
+import stub_sim
+
+from instrumentation import RunProfile
+from weight_archive import WeightArchive
+from weight_files import build_sparse_weights
+
+logger = logging.getLogger()
+
+# Default numbers of HCUs to build networks with - square grids from 1 to 100
+default_num_hcu = [n ** 2 for n in range(1, 11)]
+
+# Columns of results table - heading, format and function to get value from report
+table_columns = [("phase", "%-5s", lambda r: r["metadata"]["phase"]),
+                 ("HCUs", "%5u", lambda r: r["metadata"]["num_hcu"]),
+                 ("MCUs/HCU", "%8u", lambda r: r["metadata"]["num_mcu_per_hcu"]),
+                 ("neurons/MCU", "%11u", lambda r: r["metadata"]["num_mcu_neurons"]),
+                 ("populations", "%11u", lambda r: r["counts"].get("populations", 0)),
+                 ("projections", "%11u", lambda r: r["counts"].get("projections", 0)),
+                 ("synapses", "%12u", lambda r: r["counts"].get("synapses", 0)),
+                 ("stimuli [s]", "%11.2f", lambda r: _get_phase_time(r, "stimulus_generation")),
+                 ("HCUs [s]", "%8.2f", lambda r: _get_phase_time(r, "hcu_construction")),
+                 ("connections [s]", "%15.2f", lambda r: _get_phase_time(r, "connection_construction")),
+                 ("total [s]", "%9.2f", lambda r: r["wall_time"]),
+                 ("peak RSS [MiB]", "%14.1f", lambda r: r["peak_rss"] or 0.0)]
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Euclidean delay model on the smallest square grid which fits num_hcu HCUs
+def get_delay_model(num_hcu):
+    grid_size = int(math.ceil(math.sqrt(num_hcu)))
+    return functools.partial(network.euclidean_hcu_delay, grid_size=grid_size,
+                             distance_scale=0.75, velocity=0.2)
+
+# Build network configured for training on stub simulator and profile construction
+def benchmark_training(num_hcu, num_mcu_per_hcu, num_mcu_neurons, merge_delays, grid_populations,
+                       background_mode):
+    profile = RunProfile({"phase": "train", "num_hcu": num_hcu,
+                          "num_mcu_per_hcu": num_mcu_per_hcu,
+                          "num_mcu_neurons": num_mcu_neurons})
+
+    # Stimulate each minicolumn once in sequence
+    stim_minicolumns = [(m, m * 100.0, 20.0, 100.0) for m in range(num_mcu_per_hcu)]
+    training_simtime = num_mcu_per_hcu * 100.0
+
+    _, _, end_simulation = network.train_discrete(network.tau_syn_ampa_gaba, network.tau_syn_ampa_gaba,
+                                                  network.tau_syn_nmda, network.tau_syn_ampa_gaba, 2000.0,
+                                                  stim_minicolumns, training_simtime, get_delay_model(num_hcu),
+                                                  num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                                                  stim_seed=1, merge_delays=merge_delays, profile=profile,
+                                                  grid_populations=grid_populations,
+                                                  background_mode=background_mode)
+    end_simulation()
+    return profile.get_report()
+
+# Build network configured for testing on stub simulator and profile construction.
+# Every HCU pair is connected with the same randomly generated weights
+def benchmark_testing(num_hcu, num_mcu_per_hcu, num_mcu_neurons, merge_delays, grid_populations,
+                      background_mode):
+    profile = RunProfile({"phase": "test", "num_hcu": num_hcu,
+                          "num_mcu_per_hcu": num_mcu_per_hcu,
+                          "num_mcu_neurons": num_mcu_neurons})
+
+    num_excitatory = network.scale_parameters(num_mcu_per_hcu, num_mcu_neurons)[0]
+
+    folder = tempfile.mkdtemp()
+    try:
+        # Write archive containing random weights with training connectivity
+        archive_filename = os.path.join(folder, "connection_weights.arc")
+        with WeightArchive(archive_filename, "w") as archive:
+            for name in ("ampa", "nmda"):
+                connected = numpy.random.uniform(size=(num_excitatory, num_excitatory)) < network.epsilon
+                pre, post = numpy.where(connected)
+                archive.add(name, build_sparse_weights(pre, post, numpy.random.normal(size=len(pre))))
+
+        with WeightArchive(archive_filename) as archive:
+            connection_weights = [((archive, "ampa"), (archive, "nmda"))] * (num_hcu ** 2)
+            hcu_biases = [numpy.zeros(num_excitatory)] * num_hcu
+
+            _, end_simulation = network.test_discrete(connection_weights, hcu_biases,
+                                                      0.5 / num_hcu, 0.1 / num_hcu, 300.0, 0.15,
+                                                      [(0, 100.0, 20.0, 50.0)], 1000.0, get_delay_model(num_hcu),
+                                                      num_hcu, num_mcu_per_hcu, num_mcu_neurons, False,
+                                                      stim_seed=1, merge_delays=merge_delays, profile=profile,
+                                                      grid_populations=grid_populations,
+                                                      background_mode=background_mode)
+            end_simulation()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return profile.get_report()
+
+# Format row of results table, right-aligning values under their headings
+# in columns wide enough for both the heading and the formatted value
+def format_header():
+    return " ".join(h.rjust(_get_column_width(h, f)) for h, f, _ in table_columns)
+
+def format_row(report):
+    return " ".join((f % c(report)).rjust(_get_column_width(h, f)) for h, f, c in table_columns)
+
+def _get_column_width(heading, format):
+    return max(len(heading), int(re.search(r"\d+", format).group()))
+
+def _get_phase_time(report, name):
+    total = report["phase_totals"].get(name)
+    return 0.0 if total is None else total["wall_time"]
+
+# Build network on stub simulator in worker process
+# so peak RSS is independent of other benchmarks
+def _init_worker(verbose):
+    logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    network.select_backend("stub")
+
+def _run_benchmark(benchmark):
+    phase, num_hcu, num_mcu_per_hcu, num_mcu_neurons, merge_delays, grid_populations, background_mode = benchmark
+
+    benchmark_func = benchmark_training if phase == "train" else benchmark_testing
+    report = benchmark_func(num_hcu, num_mcu_per_hcu, num_mcu_neurons, merge_delays, grid_populations,
+                            background_mode)
+    report["calls"] = dict(stub_sim.calls)
+    return report
+
+if __name__ == "__main__":
+    logger.addHandler(logging.StreamHandler())
+
+    parser = argparse.ArgumentParser(description="Benchmark host-side construction of networks using a stub simulator")
+    parser.add_argument("--num_hcu", type=int, nargs="+", default=default_num_hcu, help="Numbers of HCUs to build networks with")
+    parser.add_argument("--num_mcu_per_hcu", type=int, nargs="+", default=[10], help="Numbers of MCUs in each HCU")
+    parser.add_argument("--num_mcu_neurons", type=int, nargs="+", default=[100], help="Numbers of neurons in each MCU")
+    parser.add_argument("--phase", choices=["train", "test", "both"], default="both", help="Which networks to build")
+    parser.add_argument("--merge_delays", action="store_true", help="Merge HCU connections which share a delay")
+    parser.add_argument("--grid_populations", action="store_true", help="Build HCUs from grid-wide populations")
+    parser.add_argument("--background_mode", choices=network.background_modes, default="poisson", help="How background drive is provided to neurons")
+    parser.add_argument("--json", help="Filename to write full profile reports to")
+    parser.add_argument("--verbose", action="store_true", help="Log construction of each HCU and connection")
+    args = parser.parse_args()
+
+    phases = ["train", "test"] if args.phase == "both" else [args.phase]
+    benchmarks = [(p, h, m, n, args.merge_delays, args.grid_populations, args.background_mode)
+                  for p, m, n, h in itertools.product(phases, args.num_mcu_per_hcu,
+                                                      args.num_mcu_neurons, args.num_hcu)]
+
+    # Run each benchmark in a fresh process, printing table as they complete
+    pool = multiprocessing.Pool(1, _init_worker, (args.verbose,), maxtasksperchild=1)
+    reports = []
+    try:
+        for report in pool.imap(_run_benchmark, benchmarks):
+            if len(reports) == 0:
+                print(format_header())
+            print(format_row(report))
+            reports.append(report)
+    finally:
+        pool.close()
+        pool.join()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=4, sort_keys=True)
@@ -9,16 +9,26 @@ import pickle
 import six
 import sys
 import network
+import resource_estimator
+
+from instrumentation import RunProfile
+from result_collection import collect_results
+from spike_store import SpikeStore
+from weight_archive import WeightArchive
+from stimulus_cache import StimulusCache
 
 # Configuration
 train = True
 session_name = "s0103a"
 num_mcu_neurons = 100
 num_hcu = 1
-spinnaker_kwargs = {"spalloc_num_boards": 1}
 tau_p = 2000
 epochs = 20
 
+# Seed stimulus generation so stimuli can be reused between runs
+stim_seed = 1
+stim_cache = StimulusCache("stimulus_cache")
+
 # Set PyNN spinnaker log level
 logger = logging.getLogger("pynn_spinnaker")
 logger.setLevel(logging.INFO)
@@ -110,26 +120,48 @@ if train:
     training_simtime = stim_minicolumns[-1][1] + stim_minicolumns[-1][3]
     print("%u phonemes, training for %ums" % (len(phoneme_indices), training_simtime))
 
+    # Size machine for training before submitting
+    estimate = resource_estimator.estimate_training(num_hcu, len(phoneme_indices), num_mcu_neurons,
+                                                    delay_model, training_simtime, stim_minicolumns)
+    estimate.log()
+    spinnaker_kwargs = estimate.get_spinnaker_kwargs()
+
+    # Profile training
+    profile = RunProfile({"num_hcu": num_hcu, "num_mcu_per_hcu": len(phoneme_indices),
+                          "num_mcu_neurons": num_mcu_neurons, "simtime": training_simtime})
+
     # Simulate
     hcu_results, connection_results, end_simulation = network.train_discrete(network.tau_syn_ampa_gaba, network.tau_syn_ampa_gaba,
                                                                              network.tau_syn_nmda, network.tau_syn_ampa_gaba, tau_p,
                                                                              stim_minicolumns, training_simtime, delay_model,
-                                                                             1, len(phoneme_indices), num_mcu_neurons, **spinnaker_kwargs)
+                                                                             1, len(phoneme_indices), num_mcu_neurons,
+                                                                             stim_seed=stim_seed, stim_cache=stim_cache,
+                                                                             profile=profile, **spinnaker_kwargs)
 
-    # Save weights for all connections
+    # Save weights for all connections to archive
+    weight_archive = WeightArchive("%s/connection_weights.arc" % folder, "w")
+    result_tasks = []
     for i, (ampa_weight_writer, nmda_weight_writer) in enumerate(connection_results):
         # Write AMPA weights
-        ampa_weight_writer("%s/connection_%u_e_e_ampa.npy" % (folder, i))
-
-        # Write NMDA weights to correct folder
-        nmda_weight_writer("%s/connection_%u_e_e_nmda.npy" % (folder, i))
-
-    # Loop through the HCU results and save data to pickle format
-    for i, (hcu_e_data_writer,) in enumerate(hcu_results):
-        hcu_e_data_writer("%s/hcu_%u_e_data.pkl" % (folder, i))
-
-    # Once data is read, end simulation
+        result_tasks.append((ampa_weight_writer, (weight_archive, "connection_%u_e_e_ampa" % i)))
+
+        # Write NMDA weights
+        result_tasks.append((nmda_weight_writer, (weight_archive, "connection_%u_e_e_nmda" % i)))
+
+    # Loop through the HCU results, saving spikes to store and final biases
+    spike_store = SpikeStore("%s/training_spikes" % folder)
+    spike_store.truncate(0.0)
+    for i, (hcu_spikes_writer, hcu_bias_writer) in enumerate(hcu_results):
+        result_tasks.append((hcu_spikes_writer, spike_store))
+        result_tasks.append((hcu_bias_writer, "%s/hcu_%u_e_bias.npy" % (folder, i)))
+
+    # Collect results and, once they are on disk, end simulation
+    with profile.phase("result_collection"):
+        collect_results(result_tasks)
+        weight_archive.close()
     end_simulation()
+
+    profile.write("%s/profile_training.json" % folder)
 else:
     # Open label file
     with open("%s/phoneme_labels.pkl" % folder, "rb") as label_file:
@@ -146,49 +178,52 @@ else:
     # Calculate gain
     gain = gain_per_hcu / float(num_hcu)
 
-    # Load biases for each HCU
-    hcu_biases = []
-    for i in range(num_hcu):
-        # Open pickle file
-        with open("%s/hcu_%u_e_data.pkl" % (folder, i), "rb") as f:
-            # Load pickled data
-            pickled_data = pickle.load(f)
-
-            # Filter out bias
-            hcu_bias = pickled_data.segments[0].filter(name="bias")[0]
+    # Load final biases for each HCU
+    hcu_biases = [network.load_hcu_bias("%s/hcu_%u_e_bias.npy" % (folder, i))
+                  for i in range(num_hcu)]
 
-            # Add final recorded bias to list
-            # **HACK** investigate where out by 1000 comes from!
-            hcu_biases.append(hcu_bias[-1,:] * 0.001)
+    # Open weight archive
+    weight_archive = WeightArchive("%s/connection_weights.arc" % folder)
 
-    # Build correct filename format string for weights
-    nmda_weight_filename_format = ("%s/connection_%u_e_e_nmda.npy")
-
-    # Load weights for each connection
+    # Get archive blocks containing weights for each connection
     connection_weights = []
     for i in range(num_hcu ** 2):
         connection_weights.append((
-            "%s/connection_%u_e_e_ampa.npy" % (folder, i),
-            nmda_weight_filename_format % (folder, i)
+            (weight_archive, "connection_%u_e_e_ampa" % i),
+            (weight_archive, "connection_%u_e_e_nmda" % i)
         ))
 
     # Stimulate the first minicolumn for 50ms, 100ms into simulation
     stim_minicolumns = [(6, 100.0, 20.0, 50.0)]
 
+    # Size machine for testing before submitting
+    estimate = resource_estimator.estimate_testing(num_hcu, num_phonemes, num_mcu_neurons,
+                                                   delay_model, testing_simtime, False, stim_minicolumns)
+    estimate.log()
+    spinnaker_kwargs = estimate.get_spinnaker_kwargs()
+
+    # Profile testing
+    profile = RunProfile({"num_hcu": num_hcu, "num_mcu_per_hcu": num_phonemes,
+                          "num_mcu_neurons": num_mcu_neurons, "simtime": testing_simtime})
 
     hcu_results, end_simulation = network.test_discrete(connection_weights, hcu_biases,
                                                         gain, gain / ampa_nmda_ratio, tau_ca2, i_alpha,
                                                         stim_minicolumns, testing_simtime, delay_model,
                                                         num_hcu, num_phonemes, num_mcu_neurons, False,
-                                                        **spinnaker_kwargs)
+                                                        stim_seed=stim_seed, stim_cache=stim_cache,
+                                                        profile=profile, **spinnaker_kwargs)
 
     # Loop through the HCU results and save spikes data
-    for i, (hcu_e_data_writer, hcu_i_data_writer) in enumerate(hcu_results):
-        hcu_e_data_writer("%s/hcu_%u_e_testing_data.pkl" % (folder, i))
-        hcu_i_data_writer("%s/hcu_%u_i_testing_data.pkl" % (folder, i))
+    spike_store = SpikeStore("%s/testing_spikes" % folder)
+    spike_store.truncate(0.0)
+    result_tasks = [(hcu_spikes_writer, spike_store) for (hcu_spikes_writer,) in hcu_results]
 
-    # Once data is read, end simulation
+    # Collect results and, once they are on disk, end simulation
+    with profile.phase("result_collection"):
+        collect_results(result_tasks)
     end_simulation()
 
+    profile.write("%s/profile_testing.json" % folder)
+
 
 
@@ -1,18 +1,20 @@
 import enum
 import functools
 import itertools
+import json
 import logging
 import numpy
 import os
-import pickle
 import sys
 
 import network
+import resource_estimator
 
-# Set PyNN spinnaker log level
-logger = logging.getLogger("pynn_spinnaker")
-logger.setLevel(logging.INFO)
-logger.addHandler(logging.StreamHandler())
+from instrumentation import RunProfile
+from result_collection import collect_results
+from spike_store import SpikeStore
+from weight_archive import WeightArchive
+from stimulus_cache import StimulusCache
 
 class Mode(enum.Enum):
     train_asymmetrical = 1
@@ -20,34 +22,25 @@ class Mode(enum.Enum):
     test_asymmetrical  = 3
     test_symmetrical   = 4
 
-mode = Mode.train_asymmetrical
-
-hcu_grid_size = 1
-num_hcu = hcu_grid_size ** 2
-num_mcu_per_hcu = 10
-num_mcu_neurons = 100
-
-record_membrane = True
-
-spinnaker_kwargs = {"spalloc_num_boards": 1}
-#spinnaker_kwargs = {"spinnaker_hostname": "192.168.240.253"}
-
-tau_p = 2000
-
-folder = "sequence_%u_%u" % (num_hcu, tau_p)
-if not os.path.exists(folder):
-    os.makedirs(folder)
+# Get suffix used to name files written in mode
+def get_mode_suffix(mode):
+    if mode == Mode.train_asymmetrical or mode == Mode.test_asymmetrical:
+        return "asymmetrical"
+    else:
+        return "symmetrical"
 
 # Bind parameters to euclidean HCU delay model
-delay_model = functools.partial(network.euclidean_hcu_delay,
-                                grid_size=hcu_grid_size, distance_scale=0.75, velocity=0.2)
-#delay_model = functools.partial(network.euclidean_hcu_delay,
-#                                grid_size=hcu_grid_size, distance_scale=0.6, velocity=0.2)
-#delay_model = functools.partial(network.euclidean_hcu_delay,
-#                                grid_size=hcu_grid_size, distance_scale=0.5, velocity=0.2)
-
-# If we're training
-if mode == Mode.train_asymmetrical or mode == Mode.train_symmetrical:
+def get_delay_model(hcu_grid_size):
+    return functools.partial(network.euclidean_hcu_delay,
+                             grid_size=hcu_grid_size, distance_scale=0.75, velocity=0.2)
+    #return functools.partial(network.euclidean_hcu_delay,
+    #                         grid_size=hcu_grid_size, distance_scale=0.6, velocity=0.2)
+    #return functools.partial(network.euclidean_hcu_delay,
+    #                         grid_size=hcu_grid_size, distance_scale=0.5, velocity=0.2)
+
+# Get minicolumn stimuli for training - each minicolumn in sequence, repeated
+# for a number of epochs - and how long training must run to deliver them
+def get_training_stimuli():
     # Training parameters
     training_stim_time = 100.0
     training_interval_time = 0.0
@@ -65,100 +58,261 @@ if mode == Mode.train_asymmetrical or mode == Mode.train_symmetrical:
 
     # Calculate length of training required
     training_simtime = float(len(stim_minicolumns)) * epoch_duration
+    return stim_minicolumns, training_simtime
+
+# Get minicolumn stimuli for testing - the first minicolumn for
+# 50ms, 100ms into simulation - and how long testing runs for
+def get_testing_stimuli():
+    return [(0, 100.0, 20.0, 50.0)], 6000.0
+
+# Load final biases of each HCU and get archive blocks containing
+# weights of each connection trained in training_folder for mode
+def load_trained_network(training_folder, mode, num_hcu):
+    hcu_biases = [network.load_hcu_bias("%s/hcu_%u_e_bias.npy" % (training_folder, i))
+                  for i in range(num_hcu)]
+
+    # Open weight archive for mode
+    weight_archive = WeightArchive("%s/connection_weights_%s.arc" % (training_folder, get_mode_suffix(mode)))
+
+    # Get archive blocks containing weights for each connection
+    connection_weights = []
+    for i in range(num_hcu ** 2):
+        connection_weights.append((
+            (weight_archive, "connection_%u_e_e_ampa" % i),
+            (weight_archive, "connection_%u_e_e_nmda_%s" % (i, get_mode_suffix(mode)))
+        ))
+
+    return hcu_biases, connection_weights
+
+def train(folder, mode, tau_p, hcu_grid_size, num_mcu_per_hcu, num_mcu_neurons,
+          stim_seed=None, stim_cache=None, segment_duration=None,
+          checkpoint_folder=None, convergence_tolerance=None,
+          bias_sampling_interval=None, **setup_kwargs):
+    num_hcu = hcu_grid_size ** 2
+
+    # Get training stimuli and length of training required
+    stim_minicolumns, training_simtime = get_training_stimuli()
 
     # Determine tau_zj for NMDA synapses depending on mode
     nmda_tau_zj = network.tau_syn_ampa_gaba if mode == Mode.train_asymmetrical else network.tau_syn_nmda
 
+    # Stream spikes recorded during training to store
+    spike_store = SpikeStore("%s/training_spikes" % folder)
+
+    # Profile training
+    profile = RunProfile({"mode": mode.name, "num_hcu": num_hcu,
+                          "num_mcu_per_hcu": num_mcu_per_hcu, "num_mcu_neurons": num_mcu_neurons,
+                          "simtime": training_simtime})
+
     # Simulate
     hcu_results, connection_results, end_simulation = network.train_discrete(network.tau_syn_ampa_gaba, network.tau_syn_ampa_gaba,
                                                                              network.tau_syn_nmda, nmda_tau_zj, tau_p,
-                                                                             stim_minicolumns, training_simtime, delay_model,
-                                                                             num_hcu, num_mcu_per_hcu, num_mcu_neurons, **spinnaker_kwargs)
-
-    # Save weights for all connections
+                                                                             stim_minicolumns, training_simtime, get_delay_model(hcu_grid_size),
+                                                                             num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                                                                             stim_seed=stim_seed, stim_cache=stim_cache,
+                                                                             segment_duration=segment_duration,
+                                                                             checkpoint_folder=checkpoint_folder,
+                                                                             convergence_tolerance=convergence_tolerance,
+                                                                             spike_store=spike_store,
+                                                                             bias_sampling_interval=bias_sampling_interval,
+                                                                             profile=profile, **setup_kwargs)
+
+    # Save weights for all connections to archive for mode
+    weight_archive = WeightArchive("%s/connection_weights_%s.arc" % (folder, get_mode_suffix(mode)), "w")
+    result_tasks = []
     for i, (ampa_weight_writer, nmda_weight_writer) in enumerate(connection_results):
         # Write AMPA weights
-        ampa_weight_writer("%s/connection_%u_e_e_ampa.npy" % (folder, i))
+        result_tasks.append((ampa_weight_writer, (weight_archive, "connection_%u_e_e_ampa" % i)))
 
-        # Write NMDA weights to correct folder
-        if mode == Mode.train_asymmetrical:
-            nmda_weight_writer("%s/connection_%u_e_e_nmda_asymmetrical.npy" % (folder, i))
-        else:
-            nmda_weight_writer("%s/connection_%u_e_e_nmda_symmetrical.npy" % (folder, i))
+        # Write NMDA weights to correct block
+        result_tasks.append((nmda_weight_writer, (weight_archive, "connection_%u_e_e_nmda_%s" % (i, get_mode_suffix(mode)))))
 
-    # Loop through the HCU results and save data to pickle format
-    for i, (hcu_e_data_writer,) in enumerate(hcu_results):
-        hcu_e_data_writer("%s/hcu_%u_e_data.pkl" % (folder, i))
+    # Loop through the HCU results, flushing remaining spikes and saving final biases
+    for i, (hcu_spikes_writer, hcu_bias_writer) in enumerate(hcu_results):
+        result_tasks.append((hcu_spikes_writer, spike_store))
+        result_tasks.append((hcu_bias_writer, "%s/hcu_%u_e_bias.npy" % (folder, i)))
 
-    # Once data is read, end simulation
+    # Collect results and, once they are on disk, end simulation
+    with profile.phase("result_collection"):
+        collect_results(result_tasks)
+        weight_archive.close()
     end_simulation()
-else:
+
+    profile.write("%s/profile_training.json" % folder)
+
+# Test network trained in training_folder, writing results to folder
+def test(training_folder, folder, mode, gain_per_hcu, i_alpha,
+         hcu_grid_size, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
+         stim_seed=None, stim_cache=None, stop_condition=None, chunk_duration=500.0,
+         **setup_kwargs):
+    num_hcu = hcu_grid_size ** 2
+
     # Testing parameters
-    testing_simtime = 6000.0   # simulation time [ms]
+    stim_minicolumns, testing_simtime = get_testing_stimuli()
 
     ampa_nmda_ratio = 4.795918367
     tau_ca2 = 300.0
 
-    if mode == Mode.test_symmetrical:
-        i_alpha = 0.7
-        gain_per_hcu = 1.3
-    else:
-        i_alpha = 0.15
-        gain_per_hcu = 0.546328125
-
     # Calculate gain
     gain = gain_per_hcu / float(num_hcu)
 
-    # Load biases for each HCU
-    hcu_biases = []
-    for i in range(num_hcu):
-        # Open pickle file
-        with open("%s/hcu_%u_e_data.pkl" % (folder, i), "rb") as f:
-            # Load pickled data
-            pickled_data = pickle.load(f)
+    # Load trained biases and weights
+    hcu_biases, connection_weights = load_trained_network(training_folder, mode, num_hcu)
 
-            # Filter out bias
-            hcu_bias = pickled_data.segments[0].filter(name="bias")[0]
+    # Profile testing
+    profile = RunProfile({"mode": mode.name, "num_hcu": num_hcu,
+                          "num_mcu_per_hcu": num_mcu_per_hcu, "num_mcu_neurons": num_mcu_neurons,
+                          "simtime": testing_simtime})
 
-            # Add final recorded bias to list
-            # **HACK** investigate where out by 1000 comes from!
-            hcu_biases.append(hcu_bias[-1,:] * 0.001)
-
-    # Build correct filename format string for weights
-    nmda_weight_filename_format = ("%s/connection_%u_e_e_nmda_asymmetrical.npy"
-                                   if mode == Mode.test_asymmetrical
-                                   else "%s/connection_%u_e_e_nmda_symmetrical.npy")
-
-    # Load weights for each connection
-    connection_weights = []
-    for i in range(num_hcu ** 2):
-        connection_weights.append((
-            "%s/connection_%u_e_e_ampa.npy" % (folder, i),
-            nmda_weight_filename_format % (folder, i)
-        ))
-
-    # Stimulate the first minicolumn for 50ms, 100ms into simulation
-    stim_minicolumns = [(0, 100.0, 20.0, 50.0)]
+    # Build correct spike store and filename format string for data
+    spike_store = SpikeStore("%s/testing_spikes_asymmetrical" % folder
+                             if mode == Mode.test_asymmetrical
+                             else "%s/testing_spikes_symmetrical" % folder)
+    spike_store.truncate(0.0)
 
+    # If a stop condition is specified, stream spikes to store in chunks so test can
+    # stop early. Otherwise, spikes are only read back once simulation has finished
+    early_stop = stop_condition is not None
 
     hcu_results, end_simulation = network.test_discrete(connection_weights, hcu_biases,
                                                         gain, gain / ampa_nmda_ratio, tau_ca2, i_alpha,
-                                                        stim_minicolumns, testing_simtime, delay_model,
+                                                        stim_minicolumns, testing_simtime, get_delay_model(hcu_grid_size),
                                                         num_hcu, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
-                                                        **spinnaker_kwargs)
+                                                        stim_seed=stim_seed, stim_cache=stim_cache,
+                                                        profile=profile, spike_store=spike_store if early_stop else None,
+                                                        chunk_duration=chunk_duration if early_stop else None,
+                                                        stop_condition=stop_condition, **setup_kwargs)
 
-    # Build correct filename format string for data
     e_filename_format = ("%s/hcu_%u_e_testing_data_asymmetrical.pkl"
                          if mode == Mode.test_asymmetrical
                          else "%s/hcu_%u_e_testing_data_symmetrical.pkl")
-    i_filename_format = ("%s/hcu_%u_i_testing_data_asymmetrical.pkl"
-                         if mode == Mode.test_asymmetrical
-                         else "%s/hcu_%u_i_testing_data_symmetrical.pkl")
 
-    # Loop through the HCU results and save spikes data
-    for i, (hcu_e_data_writer, hcu_i_data_writer) in enumerate(hcu_results):
-        hcu_e_data_writer(e_filename_format % (folder, i))
-        hcu_i_data_writer(i_filename_format % (folder, i))
+    # Loop through the HCU results and save spikes and, if recorded, membrane voltages
+    result_tasks = []
+    for i, hcu_writers in enumerate(hcu_results):
+        result_tasks.append((hcu_writers[0], spike_store))
+        if record_membrane:
+            result_tasks.append((hcu_writers[1], e_filename_format % (folder, i)))
+
+    # Collect results and, once they are on disk, end simulation
+    with profile.phase("result_collection"):
+        collect_results(result_tasks)
+    end_simulation()
+
+    profile.write("%s/profile_testing_%s.json" % (folder, get_mode_suffix(mode)))
+
+# Test recall of network trained in training_folder when cued with each minicolumn
+# in cue_minicolumns (by default all of them), writing results to folder. All cues
+# are tested in one simulation, in trials separated by reset windows, so the
+# network is only loaded once. Without reset spikes, attractors remain active
+# through reset windows so they are enabled by default. Trial times are saved
+# alongside the spikes
+def test_batch(training_folder, folder, mode, gain_per_hcu, i_alpha,
+               hcu_grid_size, num_mcu_per_hcu, num_mcu_neurons,
+               cue_minicolumns=None, trial_duration=6000.0, reset_duration=1000.0,
+               reset_rate=200.0, stim_seed=None, stim_cache=None, **setup_kwargs):
+    num_hcu = hcu_grid_size ** 2
+
+    # Testing parameters
+    ampa_nmda_ratio = 4.795918367
+    tau_ca2 = 300.0
+
+    # Calculate gain
+    gain = gain_per_hcu / float(num_hcu)
 
-    # Once data is read, end simulation
+    # Load trained biases and weights
+    hcu_biases, connection_weights = load_trained_network(training_folder, mode, num_hcu)
+
+    # By default, cue every minicolumn
+    if cue_minicolumns is None:
+        cue_minicolumns = list(range(num_mcu_per_hcu))
+
+    # Profile testing
+    profile = RunProfile({"mode": mode.name, "num_hcu": num_hcu,
+                          "num_mcu_per_hcu": num_mcu_per_hcu, "num_mcu_neurons": num_mcu_neurons,
+                          "num_cues": len(cue_minicolumns)})
+
+    hcu_results, trials, end_simulation = network.test_discrete_batch(connection_weights, hcu_biases,
+                                                                      gain, gain / ampa_nmda_ratio, tau_ca2, i_alpha,
+                                                                      cue_minicolumns, trial_duration, reset_duration,
+                                                                      get_delay_model(hcu_grid_size),
+                                                                      num_hcu, num_mcu_per_hcu, num_mcu_neurons, False,
+                                                                      reset_rate=reset_rate, stim_seed=stim_seed,
+                                                                      stim_cache=stim_cache, profile=profile, **setup_kwargs)
+
+    # Save spikes of all trials to store
+    spike_store = SpikeStore("%s/testing_spikes_batch_%s" % (folder, get_mode_suffix(mode)))
+    spike_store.truncate(0.0)
+    result_tasks = [(hcu_writers[0], spike_store) for hcu_writers in hcu_results]
+
+    # Collect results and, once they are on disk, end simulation
+    with profile.phase("result_collection"):
+        collect_results(result_tasks)
     end_simulation()
+
+    # Save cue and time of each trial
+    with open("%s/trials_%s.json" % (folder, get_mode_suffix(mode)), "w") as f:
+        json.dump({"cue_minicolumns": cue_minicolumns, "trials": trials}, f)
+
+    profile.write("%s/profile_testing_batch_%s.json" % (folder, get_mode_suffix(mode)))
+
+if __name__ == "__main__":
+    # Set PyNN spinnaker log level
+    logger = logging.getLogger("pynn_spinnaker")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+    mode = Mode.train_asymmetrical
+
+    hcu_grid_size = 1
+    num_hcu = hcu_grid_size ** 2
+    num_mcu_per_hcu = 10
+    num_mcu_neurons = 100
+
+    record_membrane = True
+
+    #spinnaker_kwargs = {"spinnaker_hostname": "192.168.240.253"}
+
+    tau_p = 2000
+
+    # Seed stimulus generation so stimuli can be reused between runs
+    stim_seed = 1
+    stim_cache = StimulusCache("stimulus_cache")
+
+    folder = "sequence_%u_%u" % (num_hcu, tau_p)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # If we're training
+    if mode == Mode.train_asymmetrical or mode == Mode.train_symmetrical:
+        # Size machine for training segments before submitting
+        estimate = resource_estimator.estimate_training(num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                                                        get_delay_model(hcu_grid_size), 5000.0,
+                                                        get_training_stimuli()[0])
+        estimate.log()
+        spinnaker_kwargs = estimate.get_spinnaker_kwargs()
+
+        # Train in 5s segments, checkpointing so completed training isn't repeated
+        train(folder, mode, tau_p, hcu_grid_size, num_mcu_per_hcu, num_mcu_neurons,
+              stim_seed=stim_seed, stim_cache=stim_cache,
+              segment_duration=5000.0, checkpoint_folder="%s/checkpoint" % folder,
+              **spinnaker_kwargs)
+    else:
+        if mode == Mode.test_symmetrical:
+            i_alpha = 0.7
+            gain_per_hcu = 1.3
+        else:
+            i_alpha = 0.15
+            gain_per_hcu = 0.546328125
+
+        # Size machine for testing before submitting
+        stim_minicolumns, testing_simtime = get_testing_stimuli()
+        estimate = resource_estimator.estimate_testing(num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                                                       get_delay_model(hcu_grid_size), testing_simtime,
+                                                       record_membrane, stim_minicolumns)
+        estimate.log()
+        spinnaker_kwargs = estimate.get_spinnaker_kwargs()
+
+        test(folder, folder, mode, gain_per_hcu, i_alpha,
+             hcu_grid_size, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
+             stim_seed=stim_seed, stim_cache=stim_cache, **spinnaker_kwargs)
@@ -0,0 +1,147 @@
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# **NOTE** resource module is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Get peak resident set size of this process [MiB] or None if it is unavailable
+def get_peak_rss():
+    if resource is None:
+        return None
+
+    # **YUCK** ru_maxrss is in bytes on OS X but kilobytes everywhere else
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0)
+    else:
+        return max_rss / 1024.0
+
+# Get CPU time used by all threads of this process [s]
+def get_cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+#------------------------------------------------------------------------------
+# RunProfile
+#------------------------------------------------------------------------------
+# Records the wall time, CPU time and peak RSS growth of each phase of a run
+# alongside counts of things like populations, projections and stimulus
+# spikes so runs can be written to a JSON report and compared across sizes
+class RunProfile(object):
+    def __init__(self, metadata=None):
+        self.metadata = {} if metadata is None else dict(metadata)
+        self.phases = []
+        self.counts = {}
+
+        self._projections = []
+        self._start_wall_time = time.time()
+        self._start_cpu_time = get_cpu_time()
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # Context manager which times the code it wraps as a named phase.
+    # Phases can be repeated e.g. once per training segment. As peak RSS
+    # is only available for the lifetime of the process, each phase records
+    # the process peak after it and how much the phase raised it by
+    @contextlib.contextmanager
+    def phase(self, name):
+        start_wall_time = time.time()
+        start_cpu_time = get_cpu_time()
+        start_peak_rss = get_peak_rss()
+        try:
+            yield
+        finally:
+            wall_time = time.time() - start_wall_time
+            cpu_time = get_cpu_time() - start_cpu_time
+            process_peak_rss = get_peak_rss()
+            self.phases.append({"name": name, "wall_time": wall_time, "cpu_time": cpu_time,
+                                "process_peak_rss": process_peak_rss,
+                                "peak_rss_increase": (None if process_peak_rss is None
+                                                      else process_peak_rss - start_peak_rss)})
+
+            logger.info("Phase '%s' took %.2fs (%.2fs CPU)" % (name, wall_time, cpu_time))
+
+    def count(self, name, number=1):
+        self.counts[name] = self.counts.get(name, 0) + number
+
+    # Wrap simulator module so populations and
+    # projections created through it are counted
+    def wrap_simulator(self, sim):
+        return _ProfiledSimulator(sim, self)
+
+    # Count synapses in projections created through wrapped simulators.
+    # **NOTE** some backends only build connectivity when simulation runs
+    def count_synapses(self):
+        try:
+            self.counts["synapses"] = sum(p.size() for p in self._projections)
+        except Exception as e:
+            logger.warning("Unable to count synapses: %s" % e)
+
+    def get_report(self):
+        # Total time and peak RSS growth of each phase
+        totals = {}
+        for p in self.phases:
+            total = totals.setdefault(p["name"], {"wall_time": 0.0, "cpu_time": 0.0,
+                                                  "peak_rss_increase": None, "calls": 0})
+            total["wall_time"] += p["wall_time"]
+            total["cpu_time"] += p["cpu_time"]
+            if p["peak_rss_increase"] is not None:
+                total["peak_rss_increase"] = (total["peak_rss_increase"] or 0.0) + p["peak_rss_increase"]
+            total["calls"] += 1
+
+        return {"metadata": self.metadata,
+                "wall_time": time.time() - self._start_wall_time,
+                "cpu_time": get_cpu_time() - self._start_cpu_time,
+                "peak_rss": get_peak_rss(),
+                "phases": self.phases,
+                "phase_totals": totals,
+                "counts": self.counts}
+
+    def write(self, filename):
+        # Write to temporary file and rename so report is never partially written
+        handle, temp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                                 suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(self.get_report(), f, indent=4, sort_keys=True)
+        os.rename(temp_filename, filename)
+
+        logger.info("Wrote run profile to %s" % filename)
+
+#------------------------------------------------------------------------------
+# _ProfiledSimulator
+#------------------------------------------------------------------------------
+# Proxy for a simulator module which counts the populations, neurons
+# and projections created through it and otherwise forwards everything
+class _ProfiledSimulator(object):
+    def __init__(self, sim, profile):
+        self._sim = sim
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._sim, name)
+
+    def Population(self, *args, **kwargs):
+        population = self._sim.Population(*args, **kwargs)
+        self._profile.count("populations")
+        self._profile.count("neurons", len(population))
+        return population
+
+    def Projection(self, *args, **kwargs):
+        projection = self._sim.Projection(*args, **kwargs)
+        self._profile.count("projections")
+        self._profile._projections.append(projection)
+        return projection
@@ -1,18 +1,29 @@
 # Import modules
+import hashlib
+import importlib
 import itertools
 import logging
 import math
+import multiprocessing
 import numpy
-import pickle
-import pylab
-import random
+import os
+import threading
 
-# Import classes
-from pyNN.random import NumpyRNG, RandomDistribution
+# Import local modules
+import training_checkpoint
 
-# Import simulator
-import pynn_spinnaker as sim
-import pynn_spinnaker_bcpnn as bcpnn
+# Import classes
+from instrumentation import RunProfile
+from network_archive import NetworkArchive, get_array_hash, get_network_key, open_network
+from spike_store import get_spiketrain_arrays
+from stimulus_cache import get_stimulus_key
+from weight_files import (get_sparse_weight_field, get_sparse_weights_from_list, get_weight_source_key,
+                          is_sparse_weights, load_weight_array, save_sparse_weights)
+
+# Simulator and module providing BCPNN models - only imported when
+# networks are built so importing helpers doesn't require either
+sim = None
+bcpnn = None
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -58,76 +69,522 @@ cell_params = {"tau_m"      : tauMem,
                "v_thresh"   : theta,
                "cm"         : 0.25}     # (nF)
 
-#-------------------------------------------------------------------
-# Functions
-#-------------------------------------------------------------------
-# Convert weights in format returned by getWeights into a connection list
-def convert_weights_to_list(filename, delay, weight_scale=1.0):
-    # Load dense matrix
-    matrix = numpy.load(filename)
-
-    def build_list(indices):
-        # Extract weights from matrix using indices
-        weights = matrix[indices]
-
-        # Scale weights
-        weights = numpy.multiply(weights, weight_scale)
-
-        # Build numpy array of delays
-        delays = numpy.repeat(delay, len(weights))
+# Ways of providing background drive to HCUs - see build_background
+background_modes = ("poisson", "shared", "current")
 
-        # Zip x-y coordinates of non-zero weights with weights and delays
-        return zip(indices[0], indices[1], weights, delays)
+# Rate of Poisson input each neuron's background drive is equivalent to [Hz]
+background_rate = 65.0
 
-    # Get indices of non-nan i.e. connected weights
-    connected_indices = numpy.where(~numpy.isnan(matrix))
+# How many sources of a shared background pool each neuron receives input from
+background_fan_in = 10
 
-    # Return connection lists
-    return build_list(connected_indices)
+# Names of modules providing simulator and BCPNN models of each backend
+backends = {"spinnaker" : ("pynn_spinnaker", "pynn_spinnaker_bcpnn"),
+            "numpy"     : ("numpy_sim", "numpy_sim"),
+            "stub"      : ("stub_sim", "stub_sim")}
 
-# Generate poisson noise of given rate between start and stop times
-def poisson_generator(rate, t_start, t_stop):
-    n = (t_stop - t_start) / 1000.0 * rate
-    number = numpy.ceil(n + 3 * numpy.sqrt(n))
-    if number < 100:
-        number = min(5 + numpy.ceil(2 * n),100)
-
-    if number > 0:
-        isi = numpy.random.exponential(1.0/rate, number)*1000.0
-        if number > 1:
-            spikes = numpy.add.accumulate(isi)
-        else:
-            spikes = isi
+#-------------------------------------------------------------------
+# Functions
+#-------------------------------------------------------------------
+# Select simulator and module providing BCPNN models used to build networks
+# e.g. set_backend(numpy_sim, numpy_sim) to simulate locally
+def set_backend(sim_module, bcpnn_module):
+    global sim, bcpnn
+    sim = sim_module
+    bcpnn = bcpnn_module
+
+# Register names of modules providing simulator and BCPNN models of
+# a backend so it can be selected by name e.g. to use BCPNN models
+# for NEST, register_backend("nest", "pyNN.nest", <BCPNN module>)
+def register_backend(name, sim_module_name, bcpnn_module_name):
+    backends[name] = (sim_module_name, bcpnn_module_name)
+
+# Import modules of named backend and select it
+def select_backend(name):
+    if name not in backends:
+        raise ValueError("Unknown backend '%s' - choose from %s" % (name, ", ".join(sorted(backends))))
+
+    sim_module_name, bcpnn_module_name = backends[name]
+    set_backend(importlib.import_module(sim_module_name),
+                importlib.import_module(bcpnn_module_name))
+    logger.info("Using %s backend" % name)
+
+# Ensure a backend is selected before building a network. If name is None and
+# no backend has already been selected, SpiNNaker is used. The NumPy reference
+# implementation is never silently substituted as it can't simulate full-size
+# networks in reasonable time - it must be selected by name
+def ensure_backend(name=None):
+    if name is not None:
+        select_backend(name)
+    elif sim is None:
+        try:
+            select_backend("spinnaker")
+        except ImportError as e:
+            raise ImportError("SpiNNaker backend unavailable (%s) - select another "
+                              "backend e.g. select_backend(\"numpy\")" % e)
+
+# Compact record type used for connection lists. Every field is float32 so lists
+# can be passed to PyNN's FromListConnector, which expects a 2D array with a column
+# per attribute, without copying - neuron indices are exact as long as they are below 2^24
+connection_dtype = numpy.dtype([("pre", numpy.float32), ("post", numpy.float32),
+                                ("weight", numpy.float32), ("delay", numpy.float32)])
+
+# Convert weights in format returned by getWeights into a connection list. Weights
+# are read from a filename or a (WeightArchive, block name) tuple as in weight_files
+def convert_weights_to_list(source, delay, weight_scale=1.0, chunk_rows=256):
+    # Memory-map weights rather than loading them
+    matrix = load_weight_array(source)
+
+    # If weights are sparse, copy them straight from the
+    # memory-mapped data into connection list, scaling any fixed-point
+    if is_sparse_weights(matrix):
+        weight_field, fixed_point_scale = get_sparse_weight_field(matrix)
+
+        connections = numpy.empty(len(matrix), dtype=connection_dtype)
+        connections["pre"] = matrix["pre"]
+        connections["post"] = matrix["post"]
+        connections["weight"] = matrix[weight_field]
+        connections["weight"] *= (weight_scale * fixed_point_scale)
+        connections["delay"] = delay
+        return connections
+
+    # **YUCK** older scripts output 3D rather than 2D weight data
+    if len(matrix.shape) == 3:
+        matrix = matrix[0]
+
+    # Count connected i.e. non-nan weights in each block of rows so the
+    # connection list can be allocated once, without ever having more
+    # than one chunk of the matrix resident
+    row_starts = range(0, matrix.shape[0], chunk_rows)
+    chunk_counts = [numpy.count_nonzero(~numpy.isnan(matrix[row_start:row_start + chunk_rows]))
+                    for row_start in row_starts]
+    connections = numpy.empty(sum(chunk_counts), dtype=connection_dtype)
+
+    # Fill connection list with indices and weights of each chunk in turn
+    offset = 0
+    for row_start, count in zip(row_starts, chunk_counts):
+        chunk = matrix[row_start:row_start + chunk_rows]
+        pre, post = numpy.where(~numpy.isnan(chunk))
+
+        chunk_connections = connections[offset:offset + count]
+        chunk_connections["pre"] = pre
+        chunk_connections["pre"] += row_start
+        chunk_connections["post"] = post
+        chunk_connections["weight"] = chunk[pre, post]
+        offset += count
+
+    # Scale weights in place
+    connections["delay"] = delay
+    weights = connections["weight"]
+    weights *= weight_scale
+
+    return connections
+
+# View connection list as the float32 columns PyNN's FromListConnector expects.
+# Lists of connection_dtype are viewed without copying, lists in any other
+# record type e.g. from older network archives, are converted first
+def connection_list_columns(connections):
+    assert len(connections) == 0 or max(numpy.amax(connections["pre"]), numpy.amax(connections["post"])) < (2 ** 24), \
+        "Neuron indices must be exactly representable in float32"
+
+    if connections.dtype != connection_dtype:
+        connections = connections.astype(connection_dtype)
+    connections = numpy.ascontiguousarray(connections)
+    return connections.view(numpy.float32).reshape(len(connections), len(connection_dtype.names))
+
+# Generate a connection list with fixed probability connectivity
+def fixed_probability_list(rng, num_pre, num_post, p_connect, weight, delay):
+    # Draw connectivity for each possible synapse
+    connected = rng.next(num_pre * num_post, "uniform", {"low": 0.0, "high": 1.0}) < p_connect
+    connected_indices = numpy.flatnonzero(connected)
+
+    # Build connection list
+    connections = numpy.empty(len(connected_indices), dtype=connection_dtype)
+    connections["pre"] = connected_indices // num_post
+    connections["post"] = connected_indices % num_post
+    connections["weight"] = weight
+    connections["delay"] = delay
+    return connections
+
+# Generate a connection list in which each postsynaptic neuron receives
+# input from n different presynaptic neurons, chosen at random
+def fixed_number_pre_list(rng, num_pre, num_post, n, weight, delay):
+    # Rank uniform draws for each postsynaptic neuron and connect the n lowest ranked
+    draws = rng.next(num_pre * num_post, "uniform", {"low": 0.0, "high": 1.0}).reshape((num_post, num_pre))
+    pre = numpy.argpartition(draws, n - 1, axis=1)[:,:n] if n < num_pre else numpy.tile(numpy.arange(num_pre), (num_post, 1))
+
+    # Build connection list
+    connections = numpy.empty(num_post * n, dtype=connection_dtype)
+    connections["pre"] = pre.flatten()
+    connections["post"] = numpy.repeat(numpy.arange(num_post), n)
+    connections["weight"] = weight
+    connections["delay"] = delay
+    return connections
+
+# Derive the seed of an independent random stream, e.g. for the connectivity of
+# one projection, from a base seed and a key such as ("connection", 0, 1, "ampa").
+# Streams don't depend on the order things are built in so can be generated in
+# parallel and any one can be regenerated without generating the others
+def get_stream_seed(seed, *key):
+    key_hash = hashlib.sha1(("%u:%s" % (seed, ",".join(str(k) for k in key))).encode("ascii"))
+
+    # **NOTE** NumpyRNG seeds must fit in 32 bits
+    return int(key_hash.hexdigest()[:8], 16)
+
+def get_stream_rng(seed, *key):
+    from pyNN.random import NumpyRNG
+    return NumpyRNG(seed=get_stream_seed(seed, *key))
+
+# Generate fixed probability AMPA and NMDA connectivity of
+# the connection between two HCUs from their own streams
+def generate_hcu_connection_lists(seed, i_pre, i_post, num_excitatory, delay):
+    return tuple(fixed_probability_list(get_stream_rng(seed, "connection", i_pre, i_post, r),
+                                        num_excitatory, num_excitatory, epsilon, 0.0, delay)
+                 for r in ("ampa", "nmda"))
+
+# Generate connectivity of all HCU connections in parallel worker processes.
+# Returns list of AMPA and NMDA connection lists for each HCU->HCU product
+def pregenerate_connection_lists(seed, num_hcu, num_excitatory, delay_model, num_processes=None):
+    pairs = [(seed, i_pre, i_post, num_excitatory, delay_model(i_pre, i_post))
+             for i_pre, i_post in itertools.product(range(num_hcu), repeat=2)]
+
+    pool = multiprocessing.Pool(num_processes)
+    try:
+        return pool.map(_generate_hcu_connection_lists, pairs)
+    finally:
+        pool.close()
+        pool.join()
+
+def _generate_hcu_connection_lists(pair):
+    return generate_hcu_connection_lists(*pair)
+
+def _get_gcd(a, b):
+    while b != 0:
+        a, b = b, a % b
+    return a
+
+# Build background drive equivalent to Poisson input at background_rate [Hz] through
+# synapses of background_weight [nA] for cells of num_hcu HCUs using background_mode:
+# "poisson" - an independent Poisson source per neuron, connected one-to-one
+# "shared"  - a pool of background_pool_size Poisson sources per HCU, each neuron
+#             receiving input from background_fan_in of them at a rate which
+#             keeps the total rate of each neuron's input unchanged
+# "current" - a noise current injected into each neuron, matching the mean and
+#             low-frequency power of the Poisson input's synaptic current
+def build_background(sim, seed, cells, label, num_hcu, background_weight, background_rate,
+                     simtime, background_mode, background_pool_size):
+    if background_mode == "poisson":
+        poisson = sim.Population(len(cells), sim.SpikeSourcePoisson(rate=background_rate, duration=simtime),
+                                 label="%s_poisson" % label)
+
+        logger.debug("Creating background->%s AMPA connection weight %g nA.", label, background_weight)
+        sim.Projection(poisson, cells,
+                       sim.OneToOneConnector(),
+                       sim.StaticSynapse(weight=background_weight, delay=delay),
+                       receptor_type="excitatory")
+    elif background_mode == "shared":
+        pool = sim.Population(num_hcu * background_pool_size,
+                              sim.SpikeSourcePoisson(rate=background_rate / float(background_fan_in), duration=simtime),
+                              label="%s_background_pool" % label)
+
+        # Connect the neurons of each HCU to sources in that HCU's section of
+        # the pool so, as in a single HCU, each HCU has a pool of its own
+        num_hcu_neurons = len(cells) // num_hcu
+        lists = []
+        for h in range(num_hcu):
+            hcu_list = fixed_number_pre_list(get_stream_rng(seed, "background", label, h), background_pool_size,
+                                             num_hcu_neurons, background_fan_in, background_weight, delay)
+            hcu_list["pre"] += h * background_pool_size
+            hcu_list["post"] += h * num_hcu_neurons
+            lists.append(hcu_list)
+
+        logger.debug("Creating shared background->%s AMPA connection with %u inputs per neuron, weight %g nA.",
+                     label, background_fan_in, background_weight)
+        sim.Projection(pool, cells,
+                       sim.FromListConnector(connection_list_columns(numpy.concatenate(lists))),
+                       sim.StaticSynapse(weight=background_weight, delay=delay),
+                       receptor_type="excitatory")
+    elif background_mode == "current":
+        # Each input spike deposits background_weight * tau_syn of charge
+        rate_per_ms = background_rate / 1000.0
+        charge = background_weight * tau_syn_ampa_gaba
+        noise = sim.NoisyCurrentSource(mean=charge * rate_per_ms, stdev=charge * math.sqrt(rate_per_ms / dt),
+                                       start=0.0, stop=simtime, dt=dt)
+
+        logger.debug("Injecting background noise current into %s.", label)
+        cells.inject(noise)
     else:
-        spikes = numpy.array([])
-
-    spikes += t_start
-    i = numpy.searchsorted(spikes, t_stop)
-
-    extra_spikes = []
-    if len(spikes) == i:
-        # ISI buf overrun
-        t_last = spikes[-1] + numpy.random.exponential(1.0 / rate, 1)[0] * 1000.0
-
-        while (t_last<t_stop):
-            extra_spikes.append(t_last)
-            t_last += numpy.random.exponential(1.0 / rate, 1)[0] * 1000.0
-
-            spikes = numpy.concatenate((spikes, extra_spikes))
+        raise ValueError("Unknown background mode '%s' - choose from %s" % (background_mode, ", ".join(background_modes)))
+
+# Build spike source array to stimulate cells with stim_spike_times, a list of spike
+# times for each cell. Only cells which receive spikes are given a source, connected
+# to their cell through an index-mapped connection list
+def build_stimulus(sim, cells, label, stim_spike_times, stim_weight):
+    stimulated = numpy.asarray([i for i, t in enumerate(stim_spike_times) if len(t) > 0], dtype=numpy.int64)
+
+    # If no cells are stimulated, there's no need for a stimulus at all
+    if len(stimulated) == 0:
+        logger.debug("No cells of %s stimulated.", label)
+        return
+
+    stim_spike_source = sim.Population(len(stimulated),
+                                       sim.SpikeSourceArray(spike_times=[stim_spike_times[i] for i in stimulated]),
+                                       label="%s_stim" % label)
+
+    # Connect each source to the cell it stimulates
+    connections = numpy.empty(len(stimulated), dtype=connection_dtype)
+    connections["pre"] = numpy.arange(len(stimulated))
+    connections["post"] = stimulated
+    connections["weight"] = stim_weight
+    connections["delay"] = delay
+
+    logger.debug("Creating stimulus->%s AMPA connection to %u of %u cells, weight %g nA.",
+                 label, len(stimulated), len(cells), stim_weight)
+    sim.Projection(stim_spike_source, cells,
+                   sim.FromListConnector(connection_list_columns(connections)),
+                   sim.StaticSynapse(weight=stim_weight, delay=delay),
+                   receptor_type="excitatory")
+
+# Get number of sources, spikes per second they emit and synaptic events per second they
+# cause when providing background drive in background_mode to num_hcu HCUs of num_neurons
+def get_background_traffic(num_hcu, num_neurons, background_rate, background_mode, background_pool_size):
+    if background_mode == "poisson":
+        spikes = num_hcu * num_neurons * background_rate
+        return num_hcu * num_neurons, spikes, spikes
+    elif background_mode == "shared":
+        pool_rate = background_rate / float(background_fan_in)
+        return (num_hcu * background_pool_size, num_hcu * background_pool_size * pool_rate,
+                num_hcu * num_neurons * background_fan_in * pool_rate)
     else:
-        spikes = numpy.resize(spikes,(i,))
-
-    # Return spike times, rounded to millisecond boundaries
-    return [round(x) for x in spikes]
+        return 0, 0.0, 0.0
+
+# Log the background traffic of a network in background_mode, the cores estimated
+# to provide it and what it saves compared to Poisson sources, counting both in profile
+def report_background_traffic(profile, num_hcu, num_excitatory, num_inhibitory, wta,
+                              background_rate, background_mode, background_pool_size):
+    # **NOTE** resource_estimator imports this module so import it here
+    import resource_estimator
+
+    # Excitatory and any inhibitory cells each have their own background
+    populations = [num_excitatory, num_inhibitory] if wta else [num_excitatory]
+    sources, spikes, events = numpy.sum([get_background_traffic(num_hcu, n, background_rate,
+                                                                background_mode, background_pool_size)
+                                         for n in populations], axis=0)
+    poisson_sources, poisson_spikes, poisson_events = numpy.sum([get_background_traffic(num_hcu, n, background_rate,
+                                                                                        "poisson", background_pool_size)
+                                                                 for n in populations], axis=0)
+
+    cores = resource_estimator.estimate_background_cores(num_hcu, populations, background_rate,
+                                                         background_mode, background_pool_size)
+    poisson_cores = resource_estimator.estimate_background_cores(num_hcu, populations, background_rate,
+                                                                 "poisson", background_pool_size)
+
+    logger.info("%s background uses %u sources emitting %.0f spikes/s and causing %.0f synaptic events/s "
+                "on an estimated %.1f cores" % (background_mode, sources, spikes, events, cores))
+    if background_mode != "poisson":
+        logger.info("Saving %u sources, %.0f spikes/s, %.0f synaptic events/s and an estimated %.1f cores "
+                    "compared to poisson background"
+                    % (poisson_sources - sources, poisson_spikes - spikes, poisson_events - events,
+                       poisson_cores - cores))
+
+    profile.count("background_cores", float(cores))
+    profile.count("background_sources", int(sources))
+    profile.count("background_spikes_per_second", float(spikes))
+    profile.count("background_synaptic_events_per_second", float(events))
+
+# Group HCU pairs by the delay the delay model gives them
+def group_hcu_pairs_by_delay(num_hcu, delay_model):
+    delay_pairs = {}
+    for i_pre, i_post in itertools.product(range(num_hcu), repeat=2):
+        delay_pairs.setdefault(delay_model(i_pre, i_post), []).append((i_pre, i_post))
+
+    return sorted(delay_pairs.items())
+
+# Generate poisson stimuli for all HCUs in a single pass, returning spike
+# trains of all num_hcu * num_excitatory neurons in CSR format i.e. spike
+# times of neuron n in HCU h are times[offsets[i]:offsets[i + 1]] where
+# i = (h * num_excitatory) + n
+def generate_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu, rng=numpy.random):
+    num_trains = num_hcu * num_excitatory
+
+    # Split stimulus schedule into columns
+    stim = numpy.asarray(stim_minicolumns, dtype=float).reshape(-1, 4)
+    minicolumn = stim[:,0].astype(int)
+    start_time = stim[:,1]
+    frequency = stim[:,2]
+    duration = stim[:,3]
+    assert numpy.all((minicolumn >= 0) & (minicolumn < num_mcu_per_hcu)), \
+        "Stimulated minicolumns must be in [0, %u)" % num_mcu_per_hcu
+
+    logger.debug("Stimulating %u minicolumn periods across %u HCUs" % (len(stim), num_hcu))
+
+    # Calculate how many neurons are in each stimulated minicolumn
+    # and hence how many trains each schedule entry generates across all HCUs
+    entry_mcu_neurons = (num_excitatory - minicolumn + num_mcu_per_hcu - 1) // num_mcu_per_hcu
+    entry_num_trains = entry_mcu_neurons * num_hcu
+
+    # Determine which schedule entry each stimulated train belongs to
+    # and its index within the trains of that entry
+    train_entry = numpy.repeat(numpy.arange(len(stim)), entry_num_trains)
+    entry_train_start = numpy.cumsum(entry_num_trains) - entry_num_trains
+    train_index = numpy.arange(len(train_entry)) - entry_train_start[train_entry]
+
+    # Convert this into the index of neuron (across all HCUs) the train stimulates
+    train_hcu = train_index // entry_mcu_neurons[train_entry]
+    train_mcu_neuron = train_index % entry_mcu_neurons[train_entry]
+    train_neuron = ((train_hcu * num_excitatory) + minicolumn[train_entry] +
+                    (train_mcu_neuron * num_mcu_per_hcu))
+
+    # Draw number of spikes in each train
+    train_num_spikes = rng.poisson((frequency * duration / 1000.0)[train_entry])
+
+    # Given their number, spikes of a poisson process are
+    # uniformly distributed within the stimulation period
+    spike_entry = numpy.repeat(train_entry, train_num_spikes)
+    spike_neuron = numpy.repeat(train_neuron, train_num_spikes)
+    spike_times = start_time[spike_entry] + (rng.uniform(size=len(spike_entry)) * duration[spike_entry])
+
+    # Round spike times to millisecond boundaries
+    spike_times = numpy.round(spike_times)
+
+    # Sort spikes by neuron and then time
+    spike_order = numpy.lexsort((spike_times, spike_neuron))
+
+    # Build offsets from the number of spikes emitted by each neuron
+    offsets = numpy.zeros(num_trains + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(spike_neuron, minlength=num_trains), out=offsets[1:])
+
+    return offsets, spike_times[spike_order]
+
+# Schedule a cue of each minicolumn in cue_minicolumns in its own trial. Each trial
+# lasts trial_duration and is followed by a reset window of reset_duration. Returns
+# schedule in the format used by stim_minicolumns and [start, stop) time of each trial
+def get_cue_schedule(cue_minicolumns, trial_duration, reset_duration,
+                     cue_time=100.0, cue_frequency=20.0, cue_duration=50.0):
+    trial_period = trial_duration + reset_duration
+    stim_minicolumns = [(m, (i * trial_period) + cue_time, cue_frequency, cue_duration)
+                        for i, m in enumerate(cue_minicolumns)]
+    trials = [(i * trial_period, (i * trial_period) + trial_duration)
+              for i in range(len(cue_minicolumns))]
+    return stim_minicolumns, trials
+
+# Get regular spike times at reset_rate throughout the reset window following each trial
+def get_reset_spike_times(trials, reset_duration, reset_rate):
+    interval = 1000.0 / reset_rate
+    return numpy.concatenate([numpy.arange(stop, stop + reset_duration, interval)
+                              for _, stop in trials])
+
+# Split spike trains of a single HCU out of CSR-format stimuli
+def get_hcu_stimuli(offsets, times, hcu, num_excitatory):
+    # Get offsets of HCU's neurons
+    hcu_offsets = offsets[hcu * num_excitatory:(hcu + 1) * num_excitatory + 1]
+
+    # Split times into a view for each neuron
+    return numpy.split(times[hcu_offsets[0]:hcu_offsets[-1]], hcu_offsets[1:-1] - hcu_offsets[0])
+
+# Drop spikes emitted before t_start from CSR-format stimuli e.g. when resuming training from t_start
+def window_stimuli(offsets, times, t_start):
+    keep = times >= t_start
+    train = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+
+    windowed_offsets = numpy.zeros(len(offsets), dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(train[keep], minlength=len(offsets) - 1), out=windowed_offsets[1:])
+    return windowed_offsets, times[keep]
+
+# Get CSR-format stimuli for all HCUs, seeding generation so, if a
+# StimulusCache is provided, previously generated stimuli can be reused
+def get_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu, seed=None, cache=None):
+    # Without a seed, stimuli are not reproducible so can't be cached
+    if seed is None:
+        return generate_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu)
+
+    # If cache contains stimuli, return them
+    key = get_stimulus_key(stim_minicolumns, seed, num_hcu, num_excitatory, num_mcu_per_hcu)
+    cached = None if cache is None else cache.load(key)
+    if cached is not None:
+        return cached
+
+    # Otherwise, generate stimuli using seeded RNG and add them to cache
+    offsets, times = generate_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory,
+                                               num_mcu_per_hcu, numpy.random.RandomState(seed))
+    if cache is not None:
+        cache.store(key, offsets, times)
+
+    return offsets, times
+
+# Open archive of network built for training from these inputs, first exporting network to
+# it if archive is missing or was built from different inputs. Connectivity is drawn from
+# the same streams as it would be when building the network without an archive. Returns
+# None if stimuli are unseeded, so the network must be built without an archive
+def get_training_archive(filename, stim_minicolumns, delay_model, num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                         stim_seed=None, stim_cache=None, connectivity_seed=1, parameters=None):
+    # Without a seed, stimuli are not reproducible so networks built from them mustn't be reused
+    if stim_seed is None:
+        logger.info("Stimuli are unseeded so network will not be archived in %s" % filename)
+        return None
+
+    num_excitatory, num_inhibitory, _, _ = scale_parameters(num_mcu_per_hcu, num_mcu_neurons)
+    delays = [float(delay_model(i_pre, i_post)) for i_pre, i_post in itertools.product(range(num_hcu), repeat=2)]
+
+    # Archived arrays are determined by these inputs
+    description = {"phase": "train", "num_hcu": num_hcu,
+                   "num_mcu_per_hcu": num_mcu_per_hcu, "num_mcu_neurons": num_mcu_neurons,
+                   "num_excitatory": num_excitatory, "num_inhibitory": num_inhibitory,
+                   "stim_minicolumns": [[float(v) for v in s] for s in stim_minicolumns], "stim_seed": stim_seed,
+                   "connectivity_seed": connectivity_seed, "delays": delays}
+    key = get_network_key(description)
+
+    archive = open_network(filename, key)
+    if archive is not None:
+        return archive
+
+    stim_offsets, stim_times = get_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu,
+                                                    stim_seed, stim_cache)
+    connection_lists = (generate_hcu_connection_lists(connectivity_seed, i_pre, i_post, num_excitatory, d)
+                        for (i_pre, i_post), d in zip(itertools.product(range(num_hcu), repeat=2), delays))
+
+    description.update(key=key, parameters={} if parameters is None else parameters)
+    return NetworkArchive.write(filename, description, stim_offsets, stim_times, connection_lists)
+
+# Open archive of network built for testing from these inputs, first exporting network to
+# it if archive is missing or was built from different inputs. Weights are identified by
+# get_weight_source_key, without reading them. Returns None if stimuli are unseeded, as for training
+def get_testing_archive(filename, connection_weight_filenames, hcu_biases, ampa_gain, nmda_gain,
+                        stim_minicolumns, delay_model, num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                        stim_seed=None, stim_cache=None, parameters=None):
+    # Without a seed, stimuli are not reproducible so networks built from them mustn't be reused
+    if stim_seed is None:
+        logger.info("Stimuli are unseeded so network will not be archived in %s" % filename)
+        return None
+
+    num_excitatory, num_inhibitory, _, _ = scale_parameters(num_mcu_per_hcu, num_mcu_neurons)
+    delays = [float(delay_model(i_pre, i_post)) for i_pre, i_post in itertools.product(range(num_hcu), repeat=2)]
+
+    # Archived arrays are determined by these inputs
+    description = {"phase": "test", "num_hcu": num_hcu,
+                   "num_mcu_per_hcu": num_mcu_per_hcu, "num_mcu_neurons": num_mcu_neurons,
+                   "num_excitatory": num_excitatory, "num_inhibitory": num_inhibitory,
+                   "stim_minicolumns": [[float(v) for v in s] for s in stim_minicolumns], "stim_seed": stim_seed,
+                   "ampa_gain": ampa_gain, "nmda_gain": nmda_gain, "delays": delays,
+                   "weights": [[get_weight_source_key(s) for s in f] for f in connection_weight_filenames],
+                   "biases": get_array_hash(hcu_biases)}
+    key = get_network_key(description)
+
+    archive = open_network(filename, key)
+    if archive is not None:
+        return archive
+
+    stim_offsets, stim_times = get_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu,
+                                                    stim_seed, stim_cache)
+    connection_lists = ((convert_weights_to_list(f[0], d, ampa_gain), convert_weights_to_list(f[1], d, nmda_gain))
+                        for f, d in zip(connection_weight_filenames, delays))
+
+    description.update(key=key, parameters={} if parameters is None else parameters)
+    return NetworkArchive.write(filename, description, stim_offsets, stim_times, connection_lists, hcu_biases)
 
 def generate_discrete_hcu_stimuli(stim_minicolumns, num_excitatory, num_mcu_per_hcu):
-    # Loop through minicolumn indices to stimulate
-    spike_times = [[] for _ in range(num_excitatory)]
-    for m, start_time, frequency, duration in stim_minicolumns:
-        logger.debug("Stimulating minicolumn %u at %f Hz for %f ms from %f ms" % (m, frequency, duration, start_time))
-        # Loop through neurons in minicolumn and add a block of noise to their spike times
-        for n in range(m, num_excitatory, num_mcu_per_hcu):
-            spike_times[n].extend(poisson_generator(frequency, start_time, start_time + duration))
+    offsets, times = generate_discrete_stimuli(stim_minicolumns, 1, num_excitatory, num_mcu_per_hcu)
+    spike_times = get_hcu_stimuli(offsets, times, 0, num_excitatory)
 
     assert len(spike_times) == num_excitatory
     return spike_times
@@ -165,18 +622,38 @@ def scale_parameters(num_mcu_per_hcu, num_mcu_neurons):
 
     return num_excitatory, num_inhibitory, JE, JI
 
+# Get bias sample of cells taken at the end of the simulation so far, in the units it is recorded
+# in. Raises if the last sample is older, e.g. because the sampling schedule doesn't align with the end of the
+# run, rather than returning the stale bias
+def get_final_bias_sample(sim, cells):
+    bias = cells.get_data("bias").segments[0].filter(name="bias")[0]
+    sample_time = float(bias.times[-1].rescale("ms").magnitude) if len(bias) > 0 else None
+    final_time = sim.get_current_time()
+    if sample_time is None or abs(sample_time - final_time) > (0.5 * dt):
+        raise ValueError("Last bias sample of %s, at %sms, was not taken at the end of the run "
+                         "(%gms) - sampling interval must divide the run" % (cells.label, sample_time, final_time))
+
+    return numpy.asarray(bias[-1,:], dtype=numpy.float64)
+
+# Load final bias vector of an HCU saved by the training bias writer
+def load_hcu_bias(filename):
+    # **HACK** investigate where out by 1000 comes from!
+    return numpy.load(filename) * 0.001
+
 #-------------------------------------------------------------------
 # HCU
 #-------------------------------------------------------------------
 class HCU(object):
-    def __init__(self, name, sim, rng,
+    def __init__(self, name, sim, seed,
                  num_excitatory, num_inhibitory, JE, JI,
                  e_cell_model, i_cell_model,
                  e_cell_params, i_cell_params,
                  e_cell_flush_time, e_cell_mean_firing_rate,
                  stim_spike_times, wta, background_weight, background_rate,
                  stim_weight, simtime,
-                 record_bias, record_spikes, record_membrane):
+                 record_bias, record_spikes, record_membrane,
+                 bias_sampling_interval=None, reset_spike_times=None, reset_weight=None,
+                 e_cell_max_cluster_width=None, background_mode="poisson", background_pool_size=100):
 
         logger.info("Creating HCU:%s" % name)
 
@@ -186,26 +663,41 @@ class HCU(object):
         # compute number of excitatory synapses on neuron
         num_excitatory_synapses = int(epsilon * num_excitatory)
 
+        # Cache name and simulator for flushing recorded spikes
+        self.name = name
+        self.sim = sim
+
+        # Spikes are flushed from the start of simulation
+        self._spike_flush_time = 0.0
+
         # Cache recording flags
         self.record_bias = record_bias
         self.record_spikes = record_spikes
         self.record_membrane = record_membrane
         self.wta = wta
 
+        # Draw initial membrane voltages of each population from its own
+        # stream so they don't depend on how HCUs are built, as in HCUGrid
         logger.debug("Membrane potentials uniformly distributed between %g mV and %g mV.", -80, U0)
-        membrane_voltage_distribution = RandomDistribution("uniform", low=-80.0, high=U0, rng=rng)
+        from pyNN.random import RandomDistribution
+        get_voltage_distribution = lambda population: RandomDistribution("uniform", low=-80.0, high=U0,
+                                                                         rng=get_stream_rng(seed, "hcu", name,
+                                                                                            population, "v"))
 
         logger.debug("Creating excitatory population with %d neurons.", num_excitatory)
         self.e_cells = sim.Population(num_excitatory, e_cell_model(**e_cell_params),
                                       label="%s - e_cells" % name)
-        self.e_cells.initialize(v=membrane_voltage_distribution)
+        self.e_cells.initialize(v=get_voltage_distribution("e"))
 
         # Set e cell mean firing rate
         self.e_cells.spinnaker_config.mean_firing_rate = e_cell_mean_firing_rate
 
         # **HACK** issue #18 means that we end up with 1024 wide clusters
-        # which needs a lot of 256-wide neuron and synapse cores
-        self.e_cells.spinnaker_config.max_cluster_width = 512
+        # which needs a lot of 256-wide neuron and synapse cores so, unless
+        # a width is specified e.g. by resource_estimator, limit them to 512
+        if e_cell_max_cluster_width is None:
+            e_cell_max_cluster_width = 512
+        self.e_cells.spinnaker_config.max_cluster_width = e_cell_max_cluster_width
 
         # Set flush time
         self.e_cells.spinnaker_config.flush_time = e_cell_flush_time
@@ -215,26 +707,25 @@ class HCU(object):
         if self.record_spikes:
             self.e_cells.record("spikes", sampling_interval=1000.0)
 
+        # Unless a coarse schedule is specified, only capture the final bias:
+        # samples are taken at the end of each sampling interval so, with
+        # an interval of simtime, the last is the final state
         if self.record_bias:
-            self.e_cells.record("bias", sampling_interval=1000.0)
+            if bias_sampling_interval is None:
+                bias_sampling_interval = simtime
+            self.e_cells.record("bias", sampling_interval=bias_sampling_interval)
 
         if self.record_membrane:
             self.e_cells.record("v", sampling_interval=1000.0)
 
-        e_poisson = sim.Population(num_excitatory, sim.SpikeSourcePoisson(rate=background_rate, duration=simtime),
-                                   label="%s - e_poisson" % name)
-
-        logger.debug("Creating background->E AMPA connection weight %g nA.", background_weight)
-        sim.Projection(e_poisson, self.e_cells,
-                       sim.OneToOneConnector(),
-                       sim.StaticSynapse(weight=background_weight, delay=delay),
-                       receptor_type="excitatory")
+        build_background(sim, seed, self.e_cells, "%s - e" % name, 1, background_weight, background_rate,
+                         simtime, background_mode, background_pool_size)
 
         if self.wta:
             logger.debug("Creating inhibitory population with %d neurons.", num_inhibitory)
             self.i_cells = sim.Population(num_inhibitory, i_cell_model, i_cell_params,
                                           label="%s - i_cells" % name)
-            self.i_cells.initialize(v=membrane_voltage_distribution)
+            self.i_cells.initialize(v=get_voltage_distribution("i"))
 
             # Inhibitory cells generally fire at a low rate
             self.i_cells.spinnaker_config.mean_firing_rate = 5.0
@@ -242,71 +733,117 @@ class HCU(object):
             if self.record_spikes:
                 self.i_cells.record("spikes")
 
-            i_poisson = sim.Population(num_inhibitory, sim.SpikeSourcePoisson(rate=background_rate, duration=simtime),
-                                       label="%s - i_poisson" % name)
-
             logger.debug("Creating I->E GABA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JI, delay)
             I_to_E = sim.Projection(self.i_cells, self.e_cells,
-                                    sim.FixedProbabilityConnector(p_connect=epsilon, rng=rng),
+                                    sim.FixedProbabilityConnector(p_connect=epsilon, rng=get_stream_rng(seed, "hcu", name, "i_e")),
                                     sim.StaticSynapse(weight=JI, delay=delay),
                                     receptor_type="inhibitory")
 
             logger.debug("Creating E->I AMPA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JE, delay)
             sim.Projection(self.e_cells, self.i_cells,
-                           sim.FixedProbabilityConnector(p_connect=epsilon, rng=rng),
+                           sim.FixedProbabilityConnector(p_connect=epsilon, rng=get_stream_rng(seed, "hcu", name, "e_i")),
                            sim.StaticSynapse(weight=JE, delay=delay),
                            receptor_type="excitatory")
 
             logger.debug("Creating I->I GABA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JI, delay)
             sim.Projection(self.i_cells, self.i_cells,
-                           sim.FixedProbabilityConnector(p_connect=epsilon, rng=rng),
+                           sim.FixedProbabilityConnector(p_connect=epsilon, rng=get_stream_rng(seed, "hcu", name, "i_i")),
                            sim.StaticSynapse(weight=JI, delay=delay),
                            receptor_type="inhibitory")
 
-            logger.debug("Creating background->I AMPA connection weight %g nA.", background_weight)
-            sim.Projection(i_poisson, self.i_cells,
-                           sim.OneToOneConnector(),
-                           sim.StaticSynapse(weight=background_weight, delay=delay),
-                           receptor_type="excitatory")
+            build_background(sim, seed, self.i_cells, "%s - i" % name, 1, background_weight, background_rate,
+                             simtime, background_mode, background_pool_size)
 
-        # Create a spike source capable of stimulating entirely excitatory population
-        stim_spike_source = sim.Population(num_excitatory, sim.SpikeSourceArray(spike_times=stim_spike_times))
+        # Create spike sources to stimulate excitatory neurons
+        build_stimulus(sim, self.e_cells, "%s - e" % name, stim_spike_times, stim_weight)
 
-        # Connect one-to-one to excitatory neurons
-        sim.Projection(stim_spike_source, self.e_cells,
-                       sim.OneToOneConnector(),
-                       sim.StaticSynapse(weight=stim_weight, delay=delay),
-                       receptor_type="excitatory")
+        # If reset spikes are specified, create a single spike
+        # source to inhibit all excitatory neurons at these times
+        if reset_spike_times is not None:
+            reset_spike_source = sim.Population(1, sim.SpikeSourceArray(spike_times=[reset_spike_times]),
+                                                label="%s - reset" % name)
+
+            logger.debug("Creating reset->E GABA connection weight %g nA.", reset_weight)
+            sim.Projection(reset_spike_source, self.e_cells,
+                           sim.AllToAllConnector(),
+                           sim.StaticSynapse(weight=reset_weight, delay=delay),
+                           receptor_type="inhibitory")
 
 
     #-------------------------------------------------------------------
     # Public methods
     #-------------------------------------------------------------------
+    # Returns a writer which flushes spikes to a SpikeStore and, if recorded,
+    # a writer which saves the last recorded bias vector to a .npy filename
+    # and one which pickles membrane voltages, as a neo Block, to a filename
     def read_results(self):
         results = ()
 
         if self.record_spikes:
-            e_spikes_writer = lambda filename: self.e_cells.write_data(filename)
-            results += (e_spikes_writer,)
+            spikes_writer = lambda store: self.flush_spikes(store)
+            results += (spikes_writer,)
+
+        if self.record_bias:
+            bias_writer = lambda filename: numpy.save(filename, self._get_final_bias())
+            results += (bias_writer,)
 
-            if self.wta:
-                i_spikes_writer = lambda filename: self.i_cells.write_data(filename)
-                results += (i_spikes_writer,)
+        if self.record_membrane:
+            e_membrane_writer = lambda filename: self.e_cells.write_data(filename, variables="v")
+            results += (e_membrane_writer,)
 
         return results
 
+    # When simulation is restored to time, rather than started from
+    # zero, spikes recorded after restoring are flushed from time
+    def set_spike_flush_time(self, time):
+        self._spike_flush_time = time
+
+    # Append spikes recorded since last flush to SpikeStore,
+    # freeing them from the simulator's recording buffers
+    def flush_spikes(self, store):
+        if not self.record_spikes:
+            return
+
+        t_start = self._spike_flush_time
+        t_stop = self.sim.get_current_time()
+
+        # If simulation hasn't advanced since last flush, there are no new spikes
+        if t_stop <= t_start:
+            return
+
+        populations = [("e", self.e_cells)]
+        if self.wta:
+            populations.append(("i", self.i_cells))
+
+        for suffix, cells in populations:
+            spiketrains = cells.get_data("spikes", clear=True).segments[0].spiketrains
+            ids, times = get_spiketrain_arrays(spiketrains)
+            store.append("hcu_%s_%s" % (self.name, suffix), ids, times,
+                         cells.size, t_start, t_stop)
+
+        self._spike_flush_time = self.sim.get_current_time()
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    # Get last bias sample, in the units it is recorded in
+    def _get_final_bias(self):
+        return get_final_bias_sample(self.sim, self.e_cells)
+
     #-------------------------------------------------------------------
     # Class methods
     #-------------------------------------------------------------------
     # Create an HCU suitable for testing:
     # Uses adaptive neuron model and doesn't record biases
     @classmethod
-    def testing_adaptive(cls, name, sim, rng,
+    def testing_adaptive(cls, name, sim, seed,
                          num_excitatory, num_inhibitory, JE, JI,
                          bias, tau_ca2, i_alpha,
                          e_cell_mean_firing_rate,
                          simtime, stim_spike_times,
-                         record_membrane):
+                         record_membrane, reset_spike_times=None, reset_weight=None,
+                         e_cell_max_cluster_width=None, background_mode="poisson",
+                         background_pool_size=100):
 
         # Copy base cell parameters
         e_cell_params = cell_params.copy()
@@ -318,23 +855,28 @@ class HCU(object):
         e_cell_params["plasticity_enabled"] = False
 
         # Build HCU
-        return cls(name=name, sim=sim, rng=rng,
+        return cls(name=name, sim=sim, seed=seed,
                    num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
                    e_cell_model=bcpnn.IF_curr_ca2_adaptive_dual_exp, i_cell_model=sim.IF_curr_exp,
                    e_cell_params=e_cell_params, i_cell_params=cell_params,
                    e_cell_flush_time=None, e_cell_mean_firing_rate=e_cell_mean_firing_rate,
                    stim_spike_times=stim_spike_times, wta=True,
-                   background_weight=0.4, background_rate=65.0,
+                   background_weight=0.4, background_rate=background_rate,
                    stim_weight=4.0, simtime=simtime, record_bias=False,
-                   record_spikes=True, record_membrane=record_membrane)
+                   record_spikes=True, record_membrane=record_membrane,
+                   reset_spike_times=reset_spike_times, reset_weight=reset_weight,
+                   e_cell_max_cluster_width=e_cell_max_cluster_width,
+                   background_mode=background_mode, background_pool_size=background_pool_size)
 
     # Create an HCU suitable for training
     # Uses a non-adaptive neuron model and records biaseses
     @classmethod
-    def training(cls, name, sim, rng,
+    def training(cls, name, sim, seed,
                  num_excitatory, num_inhibitory, JE, JI,
                  intrinsic_tau_z, intrinsic_tau_p,
-                 simtime, e_cell_mean_firing_rate, stim_spike_times):
+                 simtime, e_cell_mean_firing_rate, stim_spike_times,
+                 bias_sampling_interval=None, e_cell_max_cluster_width=None,
+                 background_mode="poisson", background_pool_size=100):
         # Copy base cell parameters
         e_cell_params = cell_params.copy()
         e_cell_params["tau_syn_E2"] = tau_syn_nmda
@@ -346,15 +888,319 @@ class HCU(object):
         e_cell_params["plasticity_enabled"] = True
         
         # Build HCU
-        return cls(name=name, sim=sim, rng=rng,
+        return cls(name=name, sim=sim, seed=seed,
+                   num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                   e_cell_model=bcpnn.IF_curr_dual_exp, i_cell_model=sim.IF_curr_exp,
+                   e_cell_params=e_cell_params, i_cell_params=cell_params,
+                   e_cell_flush_time=500.0, e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                   stim_spike_times=stim_spike_times, wta=False,
+                   background_weight=0.2, background_rate=background_rate,
+                   stim_weight=2.0, simtime=simtime, record_bias=True,
+                   record_spikes=True, record_membrane=False,
+                   bias_sampling_interval=bias_sampling_interval,
+                   e_cell_max_cluster_width=e_cell_max_cluster_width,
+                   background_mode=background_mode, background_pool_size=background_pool_size)
+
+#------------------------------------------------------------------------------
+# HCUGrid
+#------------------------------------------------------------------------------
+# All HCUs of a network built from single grid-wide populations of excitatory
+# and inhibitory cells, stimulus and background spike sources. Each HCU's
+# neurons are a contiguous slice of these populations, accessible through
+# population views, so the number of populations doesn't grow with the grid,
+# connectivity within HCUs is block-diagonal and results are read back in bulk
+class HCUGrid(object):
+    def __init__(self, sim, seed, num_hcu,
+                 num_excitatory, num_inhibitory, JE, JI,
+                 e_cell_model, i_cell_model,
+                 e_cell_params, i_cell_params,
+                 e_cell_flush_time, e_cell_mean_firing_rate,
+                 stim_spike_times, wta, background_weight, background_rate,
+                 stim_weight, simtime,
+                 record_bias, record_spikes, record_membrane,
+                 bias_sampling_interval=None, reset_spike_times=None, reset_weight=None,
+                 e_cell_max_cluster_width=None, background_mode="poisson", background_pool_size=100):
+
+        logger.info("Creating grid of %u HCUs" % num_hcu)
+
+        # Cache sizes and simulator for flushing recorded spikes
+        self.sim = sim
+        self.num_hcu = num_hcu
+        self.num_excitatory = num_excitatory
+        self.num_inhibitory = num_inhibitory
+
+        # Spikes are flushed from the start of simulation
+        self._spike_flush_time = 0.0
+
+        # Cache recording flags
+        self.record_bias = record_bias
+        self.record_spikes = record_spikes
+        self.record_membrane = record_membrane
+        self.wta = wta
+
+        # Draw initial membrane voltages of each HCU's populations from the same streams as individual HCUs
+        get_voltages = lambda population, num_neurons: numpy.concatenate(
+            [get_stream_rng(seed, "hcu", "%u" % h, population, "v").next(num_neurons, "uniform",
+                                                                         {"low": -80.0, "high": U0})
+             for h in range(num_hcu)])
+
+        logger.debug("Creating excitatory population with %d neurons.", num_hcu * num_excitatory)
+        self.e_cells = sim.Population(num_hcu * num_excitatory, e_cell_model(**e_cell_params),
+                                      label="grid - e_cells")
+        self.e_cells.initialize(v=get_voltages("e", num_excitatory))
+
+        # Set e cell mean firing rate
+        self.e_cells.spinnaker_config.mean_firing_rate = e_cell_mean_firing_rate
+
+        # **HACK** issue #18 means that we end up with 1024 wide clusters
+        # which needs a lot of 256-wide neuron and synapse cores so, unless
+        # a width is specified e.g. by resource_estimator, limit them to 512
+        if e_cell_max_cluster_width is None:
+            e_cell_max_cluster_width = 512
+        self.e_cells.spinnaker_config.max_cluster_width = e_cell_max_cluster_width
+
+        # Set flush time
+        self.e_cells.spinnaker_config.flush_time = e_cell_flush_time
+
+        # **YUCK** record spikes actually entirely ignores
+        # sampling interval but throws exception if it is not set
+        if self.record_spikes:
+            self.e_cells.record("spikes", sampling_interval=1000.0)
+
+        # Unless a coarse schedule is specified, only capture the final bias
+        if self.record_bias:
+            if bias_sampling_interval is None:
+                bias_sampling_interval = simtime
+            self.e_cells.record("bias", sampling_interval=bias_sampling_interval)
+
+        if self.record_membrane:
+            self.e_cells.record("v", sampling_interval=1000.0)
+
+        # Views of each HCU's excitatory cells
+        self.e_cell_views = [self.e_cells[h * num_excitatory:(h + 1) * num_excitatory]
+                             for h in range(num_hcu)]
+
+        build_background(sim, seed, self.e_cells, "grid - e", num_hcu, background_weight, background_rate,
+                         simtime, background_mode, background_pool_size)
+
+        if self.wta:
+            logger.debug("Creating inhibitory population with %d neurons.", num_hcu * num_inhibitory)
+            self.i_cells = sim.Population(num_hcu * num_inhibitory, i_cell_model, i_cell_params,
+                                          label="grid - i_cells")
+            self.i_cells.initialize(v=get_voltages("i", num_inhibitory))
+
+            # Inhibitory cells generally fire at a low rate
+            self.i_cells.spinnaker_config.mean_firing_rate = 5.0
+
+            if self.record_spikes:
+                self.i_cells.record("spikes")
+
+            # Views of each HCU's inhibitory cells
+            self.i_cell_views = [self.i_cells[h * num_inhibitory:(h + 1) * num_inhibitory]
+                                 for h in range(num_hcu)]
+
+            logger.debug("Creating I->E GABA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JI, delay)
+            sim.Projection(self.i_cells, self.e_cells,
+                           sim.FromListConnector(self._get_block_diagonal_list(seed, "i_e", num_inhibitory, num_excitatory, JI)),
+                           sim.StaticSynapse(weight=JI, delay=delay),
+                           receptor_type="inhibitory")
+
+            logger.debug("Creating E->I AMPA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JE, delay)
+            sim.Projection(self.e_cells, self.i_cells,
+                           sim.FromListConnector(self._get_block_diagonal_list(seed, "e_i", num_excitatory, num_inhibitory, JE)),
+                           sim.StaticSynapse(weight=JE, delay=delay),
+                           receptor_type="excitatory")
+
+            logger.debug("Creating I->I GABA connection with connection probability %g, weight %g nA and delay %g ms.", epsilon, JI, delay)
+            sim.Projection(self.i_cells, self.i_cells,
+                           sim.FromListConnector(self._get_block_diagonal_list(seed, "i_i", num_inhibitory, num_inhibitory, JI)),
+                           sim.StaticSynapse(weight=JI, delay=delay),
+                           receptor_type="inhibitory")
+
+            build_background(sim, seed, self.i_cells, "grid - i", num_hcu, background_weight, background_rate,
+                             simtime, background_mode, background_pool_size)
+
+        # Create spike sources to stimulate excitatory neurons in grid
+        build_stimulus(sim, self.e_cells, "grid - e", stim_spike_times, stim_weight)
+
+        # If reset spikes are specified, create a single spike source
+        # to inhibit all excitatory neurons in grid at these times
+        if reset_spike_times is not None:
+            reset_spike_source = sim.Population(1, sim.SpikeSourceArray(spike_times=[reset_spike_times]),
+                                                label="grid - reset")
+
+            logger.debug("Creating reset->E GABA connection weight %g nA.", reset_weight)
+            sim.Projection(reset_spike_source, self.e_cells,
+                           sim.AllToAllConnector(),
+                           sim.StaticSynapse(weight=reset_weight, delay=delay),
+                           receptor_type="inhibitory")
+
+        # Bias is read back lazily, once for the whole grid and again
+        # whenever simulation has advanced since. Writers may be
+        # called from multiple threads so lock readback
+        self._bias = None
+        self._bias_time = None
+        self._bias_lock = threading.Lock()
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # Returns list of result writers for each HCU in the format returned by HCU.read_results.
+    # Spikes are read back from grid-wide populations so the first HCU's spike writer
+    # flushes those of the whole grid and those of the other HCUs do nothing
+    def read_results(self):
+        results = []
+        for h in range(self.num_hcu):
+            hcu_results = ()
+
+            if self.record_spikes:
+                spikes_writer = (lambda store: self.flush_spikes(store)) if h == 0 else (lambda store: None)
+                hcu_results += (spikes_writer,)
+
+            if self.record_bias:
+                bias_writer = lambda filename, h=h: numpy.save(filename, self._get_hcu_final_bias(h))
+                hcu_results += (bias_writer,)
+
+            if self.record_membrane:
+                e_membrane_writer = lambda filename, h=h: self.e_cell_views[h].write_data(filename, variables="v")
+                hcu_results += (e_membrane_writer,)
+
+            results.append(hcu_results)
+
+        return results
+
+    # When simulation is restored to time, rather than started from
+    # zero, spikes recorded after restoring are flushed from time
+    def set_spike_flush_time(self, time):
+        self._spike_flush_time = time
+
+    # Append spikes recorded since last flush to SpikeStore, reading
+    # back each grid-wide population once and splitting it into HCUs
+    def flush_spikes(self, store):
+        if not self.record_spikes:
+            return
+
+        t_start = self._spike_flush_time
+        t_stop = self.sim.get_current_time()
+
+        # If simulation hasn't advanced since last flush, there are no new spikes
+        if t_stop <= t_start:
+            return
+
+        populations = [("e", self.e_cells, self.num_excitatory)]
+        if self.wta:
+            populations.append(("i", self.i_cells, self.num_inhibitory))
+
+        for suffix, cells, hcu_size in populations:
+            spiketrains = cells.get_data("spikes", clear=True).segments[0].spiketrains
+            ids, times = get_spiketrain_arrays(spiketrains)
+
+            # Split spikes into HCUs
+            order = numpy.argsort(ids, kind="mergesort")
+            ids = ids[order]
+            times = times[order]
+            hcu_starts = numpy.searchsorted(ids, numpy.arange(self.num_hcu + 1) * hcu_size)
+            for h in range(self.num_hcu):
+                hcu_slice = slice(hcu_starts[h], hcu_starts[h + 1])
+                store.append("hcu_%u_%s" % (h, suffix), ids[hcu_slice] - (h * hcu_size), times[hcu_slice],
+                             hcu_size, t_start, t_stop)
+
+        self._spike_flush_time = self.sim.get_current_time()
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    # Build connection list containing fixed probability connectivity within
+    # each HCU, drawn from the same streams used by individual HCUs
+    def _get_block_diagonal_list(self, seed, name, num_pre, num_post, weight):
+        lists = []
+        for h in range(self.num_hcu):
+            hcu_list = fixed_probability_list(get_stream_rng(seed, "hcu", "%u" % h, name),
+                                              num_pre, num_post, epsilon, weight, delay)
+            hcu_list["pre"] += h * num_pre
+            hcu_list["post"] += h * num_post
+            lists.append(hcu_list)
+
+        return connection_list_columns(numpy.concatenate(lists))
+
+    # Get final bias of HCU's neurons, in the units it is recorded in
+    def _get_hcu_final_bias(self, h):
+        with self._bias_lock:
+            time = self.sim.get_current_time()
+            if self._bias is None or time != self._bias_time:
+                self._bias = get_final_bias_sample(self.sim, self.e_cells)
+                self._bias_time = time
+
+            return self._bias[h * self.num_excitatory:(h + 1) * self.num_excitatory]
+
+    #-------------------------------------------------------------------
+    # Class methods
+    #-------------------------------------------------------------------
+    # Create a grid of HCUs suitable for testing, with the bias of each HCU
+    @classmethod
+    def testing_adaptive(cls, sim, seed, num_hcu,
+                         num_excitatory, num_inhibitory, JE, JI,
+                         biases, tau_ca2, i_alpha,
+                         e_cell_mean_firing_rate,
+                         simtime, stim_spike_times,
+                         record_membrane, reset_spike_times=None, reset_weight=None,
+                         e_cell_max_cluster_width=None, background_mode="poisson",
+                         background_pool_size=100):
+
+        # Copy base cell parameters
+        e_cell_params = cell_params.copy()
+        e_cell_params["tau_syn_E2"] = tau_syn_nmda
+        e_cell_params["tau_ca2"] = tau_ca2
+        e_cell_params["i_alpha"] = i_alpha
+        e_cell_params["i_offset"] = numpy.concatenate(biases)
+        e_cell_params["bias_enabled"] = False
+        e_cell_params["plasticity_enabled"] = False
+
+        # Build grid
+        return cls(sim=sim, seed=seed, num_hcu=num_hcu,
+                   num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                   e_cell_model=bcpnn.IF_curr_ca2_adaptive_dual_exp, i_cell_model=sim.IF_curr_exp,
+                   e_cell_params=e_cell_params, i_cell_params=cell_params,
+                   e_cell_flush_time=None, e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                   stim_spike_times=stim_spike_times, wta=True,
+                   background_weight=0.4, background_rate=background_rate,
+                   stim_weight=4.0, simtime=simtime, record_bias=False,
+                   record_spikes=True, record_membrane=record_membrane,
+                   reset_spike_times=reset_spike_times, reset_weight=reset_weight,
+                   e_cell_max_cluster_width=e_cell_max_cluster_width,
+                   background_mode=background_mode, background_pool_size=background_pool_size)
+
+    # Create a grid of HCUs suitable for training
+    @classmethod
+    def training(cls, sim, seed, num_hcu,
+                 num_excitatory, num_inhibitory, JE, JI,
+                 intrinsic_tau_z, intrinsic_tau_p,
+                 simtime, e_cell_mean_firing_rate, stim_spike_times,
+                 bias_sampling_interval=None, e_cell_max_cluster_width=None,
+                 background_mode="poisson", background_pool_size=100):
+        # Copy base cell parameters
+        e_cell_params = cell_params.copy()
+        e_cell_params["tau_syn_E2"] = tau_syn_nmda
+        e_cell_params["phi"] = 0.05
+        e_cell_params["f_max"] = 20.0
+        e_cell_params["tau_z"] = intrinsic_tau_z
+        e_cell_params["tau_p"] = intrinsic_tau_p
+        e_cell_params["bias_enabled"] = False
+        e_cell_params["plasticity_enabled"] = True
+
+        # Build grid
+        return cls(sim=sim, seed=seed, num_hcu=num_hcu,
                    num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
                    e_cell_model=bcpnn.IF_curr_dual_exp, i_cell_model=sim.IF_curr_exp,
                    e_cell_params=e_cell_params, i_cell_params=cell_params,
                    e_cell_flush_time=500.0, e_cell_mean_firing_rate=e_cell_mean_firing_rate,
                    stim_spike_times=stim_spike_times, wta=False,
-                   background_weight=0.2, background_rate=65.0,
+                   background_weight=0.2, background_rate=background_rate,
                    stim_weight=2.0, simtime=simtime, record_bias=True,
-                   record_spikes=True, record_membrane=False)
+                   record_spikes=True, record_membrane=False,
+                   bias_sampling_interval=bias_sampling_interval,
+                   e_cell_max_cluster_width=e_cell_max_cluster_width,
+                   background_mode=background_mode, background_pool_size=background_pool_size)
 
 #------------------------------------------------------------------------------
 # HCUConnection
@@ -364,10 +1210,11 @@ class HCUConnection(object):
                  pre_hcu, post_hcu,
                  ampa_connector, nmda_connector,
                  ampa_synapse, nmda_synapse,
-                 record_ampa, record_nmda):
+                 record_ampa, record_nmda, weight_frac_bits=None):
 
         self.record_ampa = record_ampa
         self.record_nmda = record_nmda
+        self.weight_frac_bits = weight_frac_bits
 
         # Create connection
         self.ampa_connection = sim.Projection(pre_hcu.e_cells, post_hcu.e_cells,
@@ -383,48 +1230,71 @@ class HCUConnection(object):
     #-------------------------------------------------------------------
     # Public methods
     #-------------------------------------------------------------------
+    # Returns writers which save sparse weights, in
+    # fixed-point if weight_frac_bits is set, to a filename
     def read_results(self):
         results = ()
         if self.record_ampa:
-            ampa_writer = lambda filename: numpy.save(filename, self.ampa_connection.get("weight", format="array"))
+            ampa_writer = lambda filename: save_sparse_weights(filename, self._get_sparse_weights(self.ampa_connection),
+                                                               self.weight_frac_bits)
             results += (ampa_writer,)
 
         if self.record_nmda:
-            nmda_writer = lambda filename: numpy.save(filename, self.nmda_connection.get("weight", format="array"))
+            nmda_writer = lambda filename: save_sparse_weights(filename, self._get_sparse_weights(self.nmda_connection),
+                                                               self.weight_frac_bits)
             results += (nmda_writer,)
 
         return results
 
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _get_sparse_weights(self, connection):
+        return get_sparse_weights_from_list(connection.get("weight", format="list"))
+
 
     #-------------------------------------------------------------------
     # Class methods
     #-------------------------------------------------------------------
-    # Creates an HCU connection for training
+    # Creates an HCU connection for training, with fixed probability connectivity
+    # drawn from the connection's own streams or from pregenerated connection lists
     @classmethod
     def training(cls, sim,
                  pre_hcu, post_hcu,
-                 ampa_synapse, nmda_synapse, rng):
-        # Build connector
-        ampa_connector = sim.FixedProbabilityConnector(p_connect=epsilon, rng=rng)
-        nmda_connector = sim.FixedProbabilityConnector(p_connect=epsilon, rng=rng)
+                 ampa_synapse, nmda_synapse, seed, weight_frac_bits=None,
+                 connection_lists=None):
+        # Build connectors
+        if connection_lists is None:
+            ampa_connector = sim.FixedProbabilityConnector(
+                p_connect=epsilon, rng=get_stream_rng(seed, "connection", pre_hcu.name, post_hcu.name, "ampa"))
+            nmda_connector = sim.FixedProbabilityConnector(
+                p_connect=epsilon, rng=get_stream_rng(seed, "connection", pre_hcu.name, post_hcu.name, "nmda"))
+        else:
+            ampa_connector = sim.FromListConnector(connection_list_columns(connection_lists[0]))
+            nmda_connector = sim.FromListConnector(connection_list_columns(connection_lists[1]))
 
         return cls(sim=sim,
                    pre_hcu=pre_hcu, post_hcu=post_hcu,
                    ampa_connector=ampa_connector, nmda_connector=nmda_connector,
                    ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse,
-                   record_ampa=True, record_nmda=True)
+                   record_ampa=True, record_nmda=True, weight_frac_bits=weight_frac_bits)
 
-    # Creates an HCU connection for testing:
-    # AMPA and NMDA connectivity, reconstructed from matrices
+    # Creates an HCU connection for testing: AMPA and NMDA connectivity,
+    # reconstructed from matrices or from previously converted connection lists
     @classmethod
     def testing(cls, sim,
                 pre_hcu, post_hcu,
                 ampa_gain, nmda_gain,
                 ampa_synapse, nmda_synapse,
-                connection_weight_filename, delay):
+                connection_weight_filename, delay, connection_lists=None):
         # Build connectors
-        ampa_connector = sim.FromListConnector(convert_weights_to_list(connection_weight_filename[0], delay, ampa_gain))
-        nmda_connector = sim.FromListConnector(convert_weights_to_list(connection_weight_filename[1], delay, nmda_gain))
+        if connection_lists is None:
+            ampa_list = convert_weights_to_list(connection_weight_filename[0], delay, ampa_gain)
+            nmda_list = convert_weights_to_list(connection_weight_filename[1], delay, nmda_gain)
+        else:
+            ampa_list, nmda_list = connection_lists
+        ampa_connector = sim.FromListConnector(connection_list_columns(ampa_list))
+        nmda_connector = sim.FromListConnector(connection_list_columns(nmda_list))
 
         return cls(sim=sim,
                    pre_hcu=pre_hcu, post_hcu=post_hcu,
@@ -432,37 +1302,321 @@ class HCUConnection(object):
                    ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse,
                    record_ampa=False, record_nmda=False)
 
+#------------------------------------------------------------------------------
+# HCUConnectionGroup
+#------------------------------------------------------------------------------
+# All the HCU connections which share a delay, merged into single AMPA and
+# NMDA projections between assemblies of the pre and postsynaptic HCUs or,
+# if hcus is an HCUGrid, between its grid-wide excitatory population
+class HCUConnectionGroup(object):
+    def __init__(self, sim, hcus, pairs, num_excitatory,
+                 ampa_lists, nmda_lists,
+                 ampa_synapse, nmda_synapse,
+                 record_ampa, record_nmda, weight_frac_bits=None):
+
+        self.sim = sim
+        self.pairs = pairs
+        self.num_excitatory = num_excitatory
+        self.record_ampa = record_ampa
+        self.record_nmda = record_nmda
+        self.weight_frac_bits = weight_frac_bits
+
+        # Determine which HCUs are connected by group
+        pre_hcus = sorted(set(i_pre for i_pre, _ in pairs))
+        post_hcus = sorted(set(i_post for _, i_post in pairs))
+
+        # If HCUs are in a grid, they are already at their own position in its population
+        if isinstance(hcus, HCUGrid):
+            self.pre_positions = {h: h for h in pre_hcus}
+            self.post_positions = {h: h for h in post_hcus}
+            pre_assembly = hcus.e_cells
+            post_assembly = hcus.e_cells
+        # Otherwise, build assemblies of connected HCUs and determine their position in them
+        else:
+            self.pre_positions = {h: i for i, h in enumerate(pre_hcus)}
+            self.post_positions = {h: i for i, h in enumerate(post_hcus)}
+            pre_assembly = sim.Assembly(*[hcus[h].e_cells for h in pre_hcus])
+            post_assembly = sim.Assembly(*[hcus[h].e_cells for h in post_hcus])
+
+        logger.debug("Merging %u HCU connections into projection from %u to %u HCUs",
+                     len(pairs), len(pre_hcus), len(post_hcus))
+
+        # Create connections
+        label = "%s->%s" % (",".join("%u" % h for h in pre_hcus), ",".join("%u" % h for h in post_hcus))
+        self.ampa_connection = sim.Projection(pre_assembly, post_assembly,
+                                              sim.FromListConnector(self._merge_lists(ampa_lists)),
+                                              ampa_synapse,
+                                              receptor_type="excitatory",
+                                              label="%s (AMPA)" % label)
+
+        self.nmda_connection = sim.Projection(pre_assembly, post_assembly,
+                                              sim.FromListConnector(self._merge_lists(nmda_lists)),
+                                              nmda_synapse,
+                                              receptor_type="excitatory2",
+                                              label="%s (NMDA)" % label)
+
+        # Weights are read back and split into HCU pairs lazily, once per
+        # projection and again whenever simulation has advanced since.
+        # Writers may be called from multiple threads so lock readback
+        self._ampa_weights = None
+        self._nmda_weights = None
+        self._weights_time = None
+        self._weights_lock = threading.Lock()
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # Returns dictionary of result writers for each (pre, post) HCU pair
+    def read_results(self):
+        results = {}
+        for pair in self.pairs:
+            pair_results = ()
+            if self.record_ampa:
+                ampa_writer = lambda filename, pair=pair: save_sparse_weights(filename, self._get_ampa_weights()[pair],
+                                                                              self.weight_frac_bits)
+                pair_results += (ampa_writer,)
+
+            if self.record_nmda:
+                nmda_writer = lambda filename, pair=pair: save_sparse_weights(filename, self._get_nmda_weights()[pair],
+                                                                              self.weight_frac_bits)
+                pair_results += (nmda_writer,)
+
+            results[pair] = pair_results
+
+        return results
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _merge_lists(self, lists):
+        merged = numpy.concatenate(lists)
+
+        # Offset HCU-relative neuron indices to their position in the assemblies
+        offset = 0
+        for (i_pre, i_post), l in zip(self.pairs, lists):
+            merged_pair = merged[offset:offset + len(l)]
+            merged_pair["pre"] += self.pre_positions[i_pre] * self.num_excitatory
+            merged_pair["post"] += self.post_positions[i_post] * self.num_excitatory
+            offset += len(l)
+
+        return connection_list_columns(merged)
+
+    def _invalidate_stale_weights(self):
+        time = self.sim.get_current_time()
+        if time != self._weights_time:
+            self._ampa_weights = None
+            self._nmda_weights = None
+            self._weights_time = time
+
+    def _get_ampa_weights(self):
+        with self._weights_lock:
+            self._invalidate_stale_weights()
+            if self._ampa_weights is None:
+                self._ampa_weights = self._split_pair_weights(self.ampa_connection.get("weight", format="list"))
+            return self._ampa_weights
+
+    def _get_nmda_weights(self):
+        with self._weights_lock:
+            self._invalidate_stale_weights()
+            if self._nmda_weights is None:
+                self._nmda_weights = self._split_pair_weights(self.nmda_connection.get("weight", format="list"))
+            return self._nmda_weights
+
+    # Split merged weight list into dictionary of sparse weights for each (pre, post) HCU pair
+    def _split_pair_weights(self, weight_list):
+        weights = get_sparse_weights_from_list(weight_list)
+
+        # Sort weights, once, by the block of the merged projection they fall in, retaining
+        # their (pre, post) order within it, and find where each block starts
+        num_post_blocks = max(self.post_positions.values()) + 1
+        num_blocks = (max(self.pre_positions.values()) + 1) * num_post_blocks
+        block = ((weights["pre"] // self.num_excitatory) * num_post_blocks) + (weights["post"] // self.num_excitatory)
+        block_order = numpy.argsort(block, kind="mergesort")
+        weights = weights[block_order]
+        block_starts = numpy.searchsorted(block[block_order], numpy.arange(num_blocks + 1))
+
+        pair_weights = {}
+        for i_pre, i_post in self.pairs:
+            # Slice out pair's block
+            pre_position = self.pre_positions[i_pre]
+            post_position = self.post_positions[i_post]
+            b = (pre_position * num_post_blocks) + post_position
+            block_weights = weights[block_starts[b]:block_starts[b + 1]]
+
+            # Convert indices back to be HCU-relative
+            block_weights["pre"] -= pre_position * self.num_excitatory
+            block_weights["post"] -= post_position * self.num_excitatory
+            pair_weights[(i_pre, i_post)] = block_weights
+
+        return pair_weights
+
+    #-------------------------------------------------------------------
+    # Class methods
+    #-------------------------------------------------------------------
+    # Creates a group of HCU connections for training
+    @classmethod
+    def training(cls, sim, hcus, pairs, num_excitatory,
+                 ampa_synapse, nmda_synapse, delay, seed, weight_frac_bits=None,
+                 connection_lists=None):
+        # Unless they are pregenerated, draw fixed probability
+        # connectivity for each pair from the pair's own streams
+        if connection_lists is None:
+            connection_lists = [generate_hcu_connection_lists(seed, i_pre, i_post, num_excitatory, delay)
+                                for i_pre, i_post in pairs]
+        ampa_lists = [l[0] for l in connection_lists]
+        nmda_lists = [l[1] for l in connection_lists]
+
+        return cls(sim=sim, hcus=hcus, pairs=pairs, num_excitatory=num_excitatory,
+                   ampa_lists=ampa_lists, nmda_lists=nmda_lists,
+                   ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse,
+                   record_ampa=True, record_nmda=True, weight_frac_bits=weight_frac_bits)
+
+    # Creates a group of HCU connections for testing: AMPA and NMDA connectivity,
+    # reconstructed from matrices or from previously converted connection lists
+    @classmethod
+    def testing(cls, sim, hcus, pairs, num_excitatory,
+                ampa_gain, nmda_gain,
+                ampa_synapse, nmda_synapse,
+                connection_weight_filenames, delay, connection_lists=None):
+        # Unless they are already converted, build connection lists for each pair
+        if connection_lists is None:
+            connection_lists = [(convert_weights_to_list(f[0], delay, ampa_gain),
+                                 convert_weights_to_list(f[1], delay, nmda_gain))
+                                for f in connection_weight_filenames]
+        ampa_lists = [l[0] for l in connection_lists]
+        nmda_lists = [l[1] for l in connection_lists]
+
+        return cls(sim=sim, hcus=hcus, pairs=pairs, num_excitatory=num_excitatory,
+                   ampa_lists=ampa_lists, nmda_lists=nmda_lists,
+                   ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse,
+                   record_ampa=False, record_nmda=False)
+
 #------------------------------------------------------------------------------
 # Train
 #------------------------------------------------------------------------------
 def train_discrete(ampa_tau_zi, ampa_tau_zj, nmda_tau_zi, nmda_tau_zj, tau_p,
                    stim_minicolumns, training_simtime, delay_model,
-                   num_hcu, num_mcu_per_hcu, num_mcu_neurons, **setup_kwargs):
+                   num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                   stim_seed=None, stim_cache=None, merge_delays=False,
+                   segment_duration=None, checkpoint_folder=None,
+                   convergence_tolerance=None, spike_store=None,
+                   weight_frac_bits=None, bias_sampling_interval=None,
+                   profile=None, connectivity_seed=1, connection_lists=None,
+                   backend=None, e_cell_max_cluster_width=None, grid_populations=False,
+                   background_mode="poisson", background_pool_size=100, network_archive=None, **setup_kwargs):
+
+    assert convergence_tolerance is None or checkpoint_folder is not None, "Convergence can only be tested when checkpointing"
+    assert network_archive is None or connection_lists is None, "Networks can either be archived or built from pregenerated connection lists"
+
+    # If a checkpoint of complete training exists, return its results
+    checkpoint = None
+    if checkpoint_folder is not None:
+        if not os.path.exists(checkpoint_folder):
+            os.makedirs(checkpoint_folder)
+
+        checkpoint = training_checkpoint.load_checkpoint(checkpoint_folder)
+        if checkpoint is not None and (checkpoint["time"] >= training_simtime or checkpoint.get("converged", False)):
+            logger.info("Training already complete in checkpoint")
+            hcu_results, connection_results = training_checkpoint.get_checkpoint_results(checkpoint_folder, checkpoint, num_hcu)
+            return hcu_results, connection_results, lambda: None
+
+    # Unless a coarse schedule is specified, sample the bias at every segment boundary.
+    # Interval must also divide the run so the final state is sampled
+    if segment_duration is None:
+        segment_duration = training_simtime
+    if bias_sampling_interval is None:
+        bias_sampling_interval = dt * _get_gcd(int(round(segment_duration / dt)),
+                                               int(round(training_simtime / dt)))
+
+    # Import simulator
+    ensure_backend(backend)
+
+    # Training can only be checkpointed part way through, and resumed, if the
+    # backend can save and restore the traces weights and biases are derived from.
+    # Otherwise, training is checkpointed once it's complete or has converged
+    resumable = hasattr(sim, "save_state")
+    resume_time = 0.0
+    if checkpoint is not None:
+        if resumable and "state" in checkpoint:
+            resume_time = checkpoint["time"]
+            logger.info("Resuming training from checkpoint at %gms" % resume_time)
+        else:
+            logger.info("Checkpoint of partial training at %gms can't be resumed - restarting training" % checkpoint["time"])
+            checkpoint = None
+
+    # Profile phases of run, counting populations and projections built through
+    # the profiled simulator. Callers which pass a profile write its report
+    if profile is None:
+        profile = RunProfile()
+    profiled_sim = profile.wrap_simulator(sim)
 
     # Scale parameters to obtain HCU size and synaptic stringth
     num_excitatory, num_inhibitory, JE, JI = scale_parameters(num_mcu_per_hcu, num_mcu_neurons)
 
-    # Setup simulator and seed RNG
-    sim.setup(timestep=dt, min_delay=dt, max_delay=7.0 * dt, **setup_kwargs)
-    rng = NumpyRNG(seed=1)
+    # Setup simulator
+    with profile.phase("setup"):
+        sim.setup(timestep=dt, min_delay=dt, max_delay=7.0 * dt, **setup_kwargs)
 
     # Calculate mean firing rate
     e_cell_mean_firing_rate = 4.0#(float(num_mcu_neurons) / float(num_excitatory)) * 20.0
 
-    # Build HCUs configured for training
-    hcus = [HCU.training(name="%u" % h, sim=sim, rng=rng, simtime=training_simtime,
-                         num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
-                         intrinsic_tau_z=ampa_tau_zj, intrinsic_tau_p=tau_p,
-                         e_cell_mean_firing_rate=e_cell_mean_firing_rate,
-                         stim_spike_times=generate_discrete_hcu_stimuli(stim_minicolumns, num_excitatory, num_mcu_per_hcu)) for h in range(num_hcu)]
-
-    # Loop through all hcu products
-    connections = []
-    for (i_pre, hcu_pre), (i_post, hcu_post) in itertools.product(enumerate(hcus), repeat=2):
-        # Use delay model to calculate delay
-        hcu_delay = delay_model(i_pre, i_post)
-
-         # Build BCPNN models
+    # If network is archived, rebuild it from archive, exporting it first if necessary
+    archive = None
+    if network_archive is not None:
+        with profile.phase("network_archive"):
+            archive = get_training_archive(network_archive, stim_minicolumns, delay_model,
+                                           num_hcu, num_mcu_per_hcu, num_mcu_neurons,
+                                           stim_seed, stim_cache, connectivity_seed,
+                                           parameters={"tau_p": tau_p, "training_simtime": training_simtime,
+                                                       "background_mode": background_mode,
+                                                       "background_pool_size": background_pool_size})
+            if archive is not None:
+                connection_lists = archive.get_connection_lists()
+
+    # Generate stimuli for all HCUs
+    with profile.phase("stimulus_generation"):
+        if archive is None:
+            stim_offsets, stim_times = get_discrete_stimuli(stim_minicolumns, num_hcu,
+                                                            num_excitatory, num_mcu_per_hcu,
+                                                            stim_seed, stim_cache)
+        else:
+            stim_offsets, stim_times = archive.get_stimuli()
+
+        # If training is resumed, only stimuli from then on are required
+        if checkpoint is not None:
+            stim_offsets, stim_times = window_stimuli(stim_offsets, stim_times, resume_time)
+    profile.count("stimulus_spikes", len(stim_times))
+
+    # Build HCUs configured for training, either individually or as a grid
+    with profile.phase("hcu_construction"):
+        if grid_populations:
+            hcus = HCUGrid.training(sim=profiled_sim, seed=connectivity_seed, num_hcu=num_hcu,
+                                    simtime=training_simtime,
+                                    num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                                    intrinsic_tau_z=ampa_tau_zj, intrinsic_tau_p=tau_p,
+                                    e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                                    stim_spike_times=get_hcu_stimuli(stim_offsets, stim_times, 0, num_hcu * num_excitatory),
+                                    bias_sampling_interval=bias_sampling_interval,
+                                    e_cell_max_cluster_width=e_cell_max_cluster_width,
+                                    background_mode=background_mode, background_pool_size=background_pool_size)
+            spike_recorders = [hcus]
+        else:
+            hcus = [HCU.training(name="%u" % h, sim=profiled_sim, seed=connectivity_seed, simtime=training_simtime,
+                                 num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                                 intrinsic_tau_z=ampa_tau_zj, intrinsic_tau_p=tau_p,
+                                 e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                                 stim_spike_times=get_hcu_stimuli(stim_offsets, stim_times, h, num_excitatory),
+                                 bias_sampling_interval=bias_sampling_interval,
+                                 e_cell_max_cluster_width=e_cell_max_cluster_width,
+                                 background_mode=background_mode, background_pool_size=background_pool_size) for h in range(num_hcu)]
+            spike_recorders = hcus
+
+    # Report savings of background mode
+    report_background_traffic(profile, num_hcu, num_excitatory, num_inhibitory, False, background_rate,
+                              background_mode, background_pool_size)
+
+    # Build BCPNN models for connections with given delay
+    def build_bcpnn_synapses(hcu_delay):
         ampa_synapse = bcpnn.BCPNNSynapse(
             tau_zi=ampa_tau_zi,
             tau_zj=ampa_tau_zj,
@@ -485,50 +1639,218 @@ def train_discrete(ampa_tau_zi, ampa_tau_zj, nmda_tau_zi, nmda_tau_zj, tau_p,
             weight=0.0,
             delay=hcu_delay)
 
-        logger.info("Connecting HCU %u->%u with delay %ums" % (i_pre, i_post, hcu_delay))
-        connections.append(HCUConnection.training(
-            sim=sim, pre_hcu=hcu_pre, post_hcu=hcu_post,
-            ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse, rng=rng))
-
-    # Run simulation
-    sim.run(training_simtime)
-
-    # Read results from HCUs
-    hcu_results = [hcu.read_results() for hcu in hcus]
-
-    # Read results from inter-hcu connections
-    connection_results = [c.read_results() for c in connections]
+        return ampa_synapse, nmda_synapse
+
+    # If connections should be merged - as they always are between HCUs in a grid
+    with profile.phase("connection_construction"):
+        if merge_delays or grid_populations:
+            # Loop through groups of hcu products which share a delay
+            groups = []
+            for hcu_delay, pairs in group_hcu_pairs_by_delay(num_hcu, delay_model):
+                # Build BCPNN models
+                ampa_synapse, nmda_synapse = build_bcpnn_synapses(hcu_delay)
+
+                logger.info("Connecting %u HCU pairs with delay %ums" % (len(pairs), hcu_delay))
+                groups.append(HCUConnectionGroup.training(
+                    sim=profiled_sim, hcus=hcus, pairs=pairs, num_excitatory=num_excitatory,
+                    ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse,
+                    delay=hcu_delay, seed=connectivity_seed, weight_frac_bits=weight_frac_bits,
+                    connection_lists=(None if connection_lists is None
+                                      else [connection_lists[(i_pre * num_hcu) + i_post] for i_pre, i_post in pairs])))
+
+            # Get result writers from groups and order them like unmerged connections
+            pair_results = {}
+            for g in groups:
+                pair_results.update(g.read_results())
+            connection_results = [pair_results[p] for p in itertools.product(range(num_hcu), repeat=2)]
+        else:
+            # Loop through all hcu products
+            connections = []
+            for (i_pre, hcu_pre), (i_post, hcu_post) in itertools.product(enumerate(hcus), repeat=2):
+                # Use delay model to calculate delay
+                hcu_delay = delay_model(i_pre, i_post)
+
+                # Build BCPNN models
+                ampa_synapse, nmda_synapse = build_bcpnn_synapses(hcu_delay)
+
+                logger.info("Connecting HCU %u->%u with delay %ums" % (i_pre, i_post, hcu_delay))
+                connections.append(HCUConnection.training(
+                    sim=profiled_sim, pre_hcu=hcu_pre, post_hcu=hcu_post,
+                    ampa_synapse=ampa_synapse, nmda_synapse=nmda_synapse, seed=connectivity_seed,
+                    weight_frac_bits=weight_frac_bits,
+                    connection_lists=(None if connection_lists is None
+                                      else connection_lists[(i_pre * num_hcu) + i_post])))
+
+            # Get result writers from inter-hcu connections
+            connection_results = [c.read_results() for c in connections]
+
+    # Network has been built so close any archive it was built from
+    if archive is not None:
+        archive.close()
+
+    # Get result writers from HCUs
+    hcu_results = hcus.read_results() if grid_populations else [hcu.read_results() for hcu in hcus]
+
+    # If training is resumed, restore simulation to the checkpointed
+    # state and flush spikes recorded from then on. Otherwise start from zero
+    segment = 0
+    if checkpoint is not None:
+        with profile.phase("restore"):
+            sim.load_state(os.path.join(checkpoint_folder, checkpoint["folder"], checkpoint["state"]))
+        for r in spike_recorders:
+            r.set_spike_flush_time(resume_time)
+        segment = checkpoint["segment"] + 1
+
+    # Discard any spikes recorded after the point training starts from
+    if spike_store is not None:
+        spike_store.truncate(resume_time)
+
+    # Run simulation in segments, checkpointing after each one
+    elapsed = resume_time
+    previous_weights = None
+    while elapsed < training_simtime:
+        duration = min(segment_duration, training_simtime - elapsed)
+        with profile.phase("simulation"):
+            sim.run(duration)
+        elapsed += duration
+
+        # Stream spikes recorded during segment to store
+        if spike_store is not None:
+            with profile.phase("spike_flush"):
+                for r in spike_recorders:
+                    r.flush_spikes(spike_store)
+
+        # Test whether no weight has changed by more than tolerance during segment
+        converged = False
+        if convergence_tolerance is not None:
+            with profile.phase("convergence"):
+                weights = training_checkpoint.read_weights(connection_results)
+
+            if previous_weights is not None:
+                weight_change = training_checkpoint.get_max_weight_change(weights, previous_weights)
+                logger.info("Maximum weight change during segment %u: %g" % (segment, weight_change))
+                converged = weight_change < convergence_tolerance
+            previous_weights = weights
+
+        # Checkpoint simulator state if training can be resumed and,
+        # once it is complete or has converged, its results
+        if checkpoint_folder is not None:
+            finished = converged or elapsed >= training_simtime
+            if finished or resumable:
+                with profile.phase("checkpoint"):
+                    training_checkpoint.write_checkpoint(checkpoint_folder, segment, elapsed,
+                                                         hcu_results if finished else None,
+                                                         connection_results if finished else None,
+                                                         sim.save_state if resumable else None)
+
+        # Stop early if weights have converged
+        if converged:
+            logger.info("Weights converged after %gms of training" % (elapsed))
+            training_checkpoint.mark_converged(checkpoint_folder)
+            break
+
+        segment += 1
+
+    profile.count_synapses()
 
     return hcu_results, connection_results, sim.end
 
 #------------------------------------------------------------------------------
 # Test
 #------------------------------------------------------------------------------
+# If a SpikeStore is provided, spikes are streamed to it every chunk_duration ms
+# and the test stops early if stop_condition(spike_store, time) returns True
 def test_discrete(connection_weight_filenames, hcu_biases,
                   ampa_gain, nmda_gain, tau_ca2, i_alpha,
                   stim_minicolumns, testing_simtime, delay_model,
-                  num_hcu, num_mcu_per_hcu, num_mcu_neurons, record_membrane, **setup_kwargs):
+                  num_hcu, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
+                  stim_seed=None, stim_cache=None, merge_delays=False,
+                  profile=None, connectivity_seed=1,
+                  reset_spike_times=None, reset_weight=None, backend=None,
+                  e_cell_max_cluster_width=None, grid_populations=False,
+                  background_mode="poisson", background_pool_size=100,
+                  spike_store=None, chunk_duration=None, stop_condition=None,
+                  network_archive=None, **setup_kwargs):
 
     assert len(hcu_biases) == num_hcu, "An array of biases must be provided for each HCU"
-    assert len(connection_weight_filenames) == (num_hcu ** 2), "A tuple of weight matrix filenames must be provided for each HCU->HCU product"
+    assert stop_condition is None or spike_store is not None, "Stop conditions can only be evaluated when streaming spikes to a store"
+    assert len(connection_weight_filenames) == (num_hcu ** 2), "A tuple of weight filenames or archive blocks must be provided for each HCU->HCU product"
+
+    # Import simulator
+    ensure_backend(backend)
+
+    # Profile phases of run, counting populations and projections built through
+    # the profiled simulator. Callers which pass a profile write its report
+    if profile is None:
+        profile = RunProfile()
+    profiled_sim = profile.wrap_simulator(sim)
 
     # Scale parameters to obtain HCU size and synaptic stringth
     num_excitatory, num_inhibitory, JE, JI = scale_parameters(num_mcu_per_hcu, num_mcu_neurons)
 
-    # Setup simulator and seed RNG
-    sim.setup(timestep=dt, min_delay=dt, max_delay=7.0 * dt, **setup_kwargs)
-    rng = NumpyRNG(seed=1)
+    # Setup simulator
+    with profile.phase("setup"):
+        sim.setup(timestep=dt, min_delay=dt, max_delay=7.0 * dt, **setup_kwargs)
 
     # Calculate mean firing rate
     e_cell_mean_firing_rate = (num_mcu_neurons / num_excitatory) * 20.0
 
-    # Build HCUs configured for testing
-    hcus = [HCU.testing_adaptive(name="%u" % i, sim=sim, rng=rng,
-                                 num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
-                                 bias=bias, tau_ca2=tau_ca2, i_alpha=i_alpha,
-                                 e_cell_mean_firing_rate=e_cell_mean_firing_rate,
-                                 simtime=testing_simtime, record_membrane=record_membrane,
-                                 stim_spike_times=generate_discrete_hcu_stimuli(stim_minicolumns, num_excitatory, num_mcu_per_hcu)) for i, bias in enumerate(hcu_biases)]
+    # By default, reset spikes inhibit excitatory neurons like an inhibitory neuron
+    if reset_weight is None:
+        reset_weight = JI
+
+    # If network is archived, rebuild it from archive, exporting it first if necessary
+    connection_lists = None
+    archive = None
+    if network_archive is not None:
+        with profile.phase("network_archive"):
+            archive = get_testing_archive(network_archive, connection_weight_filenames, hcu_biases,
+                                          ampa_gain, nmda_gain, stim_minicolumns, delay_model,
+                                          num_hcu, num_mcu_per_hcu, num_mcu_neurons, stim_seed, stim_cache,
+                                          parameters={"tau_ca2": tau_ca2, "i_alpha": i_alpha,
+                                                      "testing_simtime": testing_simtime,
+                                                      "connectivity_seed": connectivity_seed,
+                                                      "background_mode": background_mode,
+                                                      "background_pool_size": background_pool_size})
+            if archive is not None:
+                connection_lists = archive.get_connection_lists()
+
+    # Generate stimuli for all HCUs
+    with profile.phase("stimulus_generation"):
+        if archive is None:
+            stim_offsets, stim_times = get_discrete_stimuli(stim_minicolumns, num_hcu,
+                                                            num_excitatory, num_mcu_per_hcu,
+                                                            stim_seed, stim_cache)
+        else:
+            stim_offsets, stim_times = archive.get_stimuli()
+    profile.count("stimulus_spikes", len(stim_times))
+
+    # Build HCUs configured for testing, either individually or as a grid
+    with profile.phase("hcu_construction"):
+        if grid_populations:
+            hcus = HCUGrid.testing_adaptive(sim=profiled_sim, seed=connectivity_seed, num_hcu=num_hcu,
+                                            num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                                            biases=hcu_biases, tau_ca2=tau_ca2, i_alpha=i_alpha,
+                                            e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                                            simtime=testing_simtime, record_membrane=record_membrane,
+                                            reset_spike_times=reset_spike_times, reset_weight=reset_weight,
+                                            e_cell_max_cluster_width=e_cell_max_cluster_width,
+                                            background_mode=background_mode, background_pool_size=background_pool_size,
+                                            stim_spike_times=get_hcu_stimuli(stim_offsets, stim_times, 0, num_hcu * num_excitatory))
+        else:
+            hcus = [HCU.testing_adaptive(name="%u" % i, sim=profiled_sim, seed=connectivity_seed,
+                                         num_excitatory=num_excitatory, num_inhibitory=num_inhibitory, JE=JE, JI=JI,
+                                         bias=bias, tau_ca2=tau_ca2, i_alpha=i_alpha,
+                                         e_cell_mean_firing_rate=e_cell_mean_firing_rate,
+                                         simtime=testing_simtime, record_membrane=record_membrane,
+                                         reset_spike_times=reset_spike_times, reset_weight=reset_weight,
+                                         e_cell_max_cluster_width=e_cell_max_cluster_width,
+                                         background_mode=background_mode, background_pool_size=background_pool_size,
+                                         stim_spike_times=get_hcu_stimuli(stim_offsets, stim_times, i, num_excitatory)) for i, bias in enumerate(hcu_biases)]
+
+    # Report savings of background mode
+    report_background_traffic(profile, num_hcu, num_excitatory, num_inhibitory, True, background_rate,
+                              background_mode, background_pool_size)
 
     # **HACK** not actually plastic - just used to force signed weights
     bcpnn_synapse = bcpnn.BCPNNSynapse(
@@ -540,25 +1862,105 @@ def test_discrete(connection_weight_filenames, hcu_biases,
         weights_enabled=True,
         plasticity_enabled=False)
 
-    # Loop through all hcu products and their corresponding connection weight
-    for connection_weight_filename, ((i_pre, hcu_pre), (i_post, hcu_post)) in zip(connection_weight_filenames, itertools.product(enumerate(hcus), repeat=2)):
-        # Use delay model to calculate delay
-        hcu_delay = delay_model(i_pre, i_post)
-
-        logger.info("Connecting HCU %u->%u with delay %ums" % (i_pre, i_post, hcu_delay))
-
-        # Build connections
-        HCUConnection.testing(
-            sim=sim,
-            pre_hcu=hcu_pre, post_hcu=hcu_post,
-            ampa_gain=ampa_gain, nmda_gain=nmda_gain,
-            ampa_synapse=bcpnn_synapse, nmda_synapse=bcpnn_synapse,
-            connection_weight_filename=connection_weight_filename, delay=hcu_delay)
-
-    # Run simulation
-    sim.run(testing_simtime)
+    # If connections should be merged - as they always are between HCUs in a grid
+    with profile.phase("connection_construction"):
+        if merge_delays or grid_populations:
+            # Loop through groups of hcu products which share a delay
+            for hcu_delay, pairs in group_hcu_pairs_by_delay(num_hcu, delay_model):
+                logger.info("Connecting %u HCU pairs with delay %ums" % (len(pairs), hcu_delay))
+
+                # Build connections using weight matrices of each pair
+                HCUConnectionGroup.testing(
+                    sim=profiled_sim, hcus=hcus, pairs=pairs, num_excitatory=num_excitatory,
+                    ampa_gain=ampa_gain, nmda_gain=nmda_gain,
+                    ampa_synapse=bcpnn_synapse, nmda_synapse=bcpnn_synapse,
+                    connection_weight_filenames=[connection_weight_filenames[(i_pre * num_hcu) + i_post]
+                                                 for i_pre, i_post in pairs],
+                    delay=hcu_delay,
+                    connection_lists=(None if connection_lists is None
+                                      else [connection_lists[(i_pre * num_hcu) + i_post] for i_pre, i_post in pairs]))
+        else:
+            # Loop through all hcu products and their corresponding connection weight
+            for connection_weight_filename, ((i_pre, hcu_pre), (i_post, hcu_post)) in zip(connection_weight_filenames, itertools.product(enumerate(hcus), repeat=2)):
+                # Use delay model to calculate delay
+                hcu_delay = delay_model(i_pre, i_post)
+
+                logger.info("Connecting HCU %u->%u with delay %ums" % (i_pre, i_post, hcu_delay))
+
+                # Build connections
+                HCUConnection.testing(
+                    sim=profiled_sim,
+                    pre_hcu=hcu_pre, post_hcu=hcu_post,
+                    ampa_gain=ampa_gain, nmda_gain=nmda_gain,
+                    ampa_synapse=bcpnn_synapse, nmda_synapse=bcpnn_synapse,
+                    connection_weight_filename=connection_weight_filename, delay=hcu_delay,
+                    connection_lists=(None if connection_lists is None
+                                      else connection_lists[(i_pre * num_hcu) + i_post]))
+
+    # Network has been built so close any archive it was built from
+    if archive is not None:
+        archive.close()
 
     # Read results from HCUs
-    results = [hcu.read_results() for hcu in hcus]
+    results = hcus.read_results() if grid_populations else [hcu.read_results() for hcu in hcus]
+    spike_recorders = [hcus] if grid_populations else hcus
+
+    # Discard any spikes previously recorded to store
+    if spike_store is not None:
+        spike_store.truncate(0.0)
+
+    # Run simulation in chunks, streaming spikes to any store after each
+    # one so stop condition can decide whether simulation can end early
+    if chunk_duration is None:
+        chunk_duration = testing_simtime
+    elapsed = 0.0
+    while elapsed < testing_simtime:
+        duration = min(chunk_duration, testing_simtime - elapsed)
+        with profile.phase("simulation"):
+            sim.run(duration)
+        elapsed += duration
+
+        if spike_store is not None:
+            with profile.phase("spike_flush"):
+                for r in spike_recorders:
+                    r.flush_spikes(spike_store)
+
+        if stop_condition is not None and elapsed < testing_simtime:
+            with profile.phase("stop_condition"):
+                stop = stop_condition(spike_store, elapsed)
+
+            if stop:
+                logger.info("Stopping test early after %gms of %gms" % (elapsed, testing_simtime))
+                break
+
+    profile.count("simulated_time", elapsed)
+    profile.count_synapses()
 
     return results, sim.end
+
+# Test recall of many cues in one simulation of a single network. Each cue
+# is presented in its own trial, followed by a quiescent reset window during
+# which, if reset_rate is specified, excitatory neurons are also inhibited
+# by reset spikes. Returns result writers, [start, stop) time of each
+# trial, which can be used to slice recorded spikes, and end function
+def test_discrete_batch(connection_weight_filenames, hcu_biases,
+                        ampa_gain, nmda_gain, tau_ca2, i_alpha,
+                        cue_minicolumns, trial_duration, reset_duration, delay_model,
+                        num_hcu, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
+                        cue_time=100.0, cue_frequency=20.0, cue_duration=50.0,
+                        reset_rate=None, reset_weight=None, **kwargs):
+    # Schedule cues and any reset spikes
+    stim_minicolumns, trials = get_cue_schedule(cue_minicolumns, trial_duration, reset_duration,
+                                                cue_time, cue_frequency, cue_duration)
+    reset_spike_times = (None if reset_rate is None
+                         else get_reset_spike_times(trials, reset_duration, reset_rate))
+
+    logger.info("Testing %u cues in %u trials of %gms" % (len(cue_minicolumns), len(trials), trial_duration))
+
+    results, end_simulation = test_discrete(connection_weight_filenames, hcu_biases,
+                                            ampa_gain, nmda_gain, tau_ca2, i_alpha,
+                                            stim_minicolumns, trials[-1][1] + reset_duration, delay_model,
+                                            num_hcu, num_mcu_per_hcu, num_mcu_neurons, record_membrane,
+                                            reset_spike_times=reset_spike_times, reset_weight=reset_weight,
+                                            **kwargs)
+    return results, trials, end_simulation
@@ -0,0 +1,207 @@
+import hashlib
+import itertools
+import json
+import logging
+import numpy
+import os
+import tempfile
+
+from weight_archive import WeightArchive
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# NetworkArchive
+#------------------------------------------------------------------------------
+# Single-file description of a built network: a JSON description of its
+# geometry, delays and build parameters alongside the CSR-format stimuli of
+# all HCUs, any HCU biases and the AMPA and NMDA connection lists, with delays
+# and scaled weights, of every HCU->HCU product. Stored in a WeightArchive
+# so networks can be rebuilt from memory-mapped blocks rather than by
+# regenerating stimuli and reloading and converting every weight file
+class NetworkArchive(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self._archive = WeightArchive(filename)
+
+        self.description = json.loads(self._archive.get("description").tobytes().decode("utf-8"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def get_stimuli(self):
+        return self._archive.get("stimulus_offsets"), self._archive.get("stimulus_times")
+
+    # Get list of AMPA and NMDA connection lists for each HCU->HCU product
+    def get_connection_lists(self):
+        num_hcu = self.description["num_hcu"]
+        return [(self._archive.get("connection_%u_%u_ampa" % (i_pre, i_post)),
+                 self._archive.get("connection_%u_%u_nmda" % (i_pre, i_post)))
+                for i_pre, i_post in itertools.product(range(num_hcu), repeat=2)]
+
+    # Get biases of each HCU or None if network was archived without them
+    def get_hcu_biases(self):
+        if "hcu_0_bias" not in self._archive.index:
+            return None
+
+        return [self._archive.get("hcu_%u_bias" % h) for h in range(self.description["num_hcu"])]
+
+    def get_names(self):
+        return [n for n in self._archive.get_names() if n != "description"]
+
+    def get(self, name):
+        return self._archive.get(name)
+
+    # Close archive - blocks already read from it remain valid
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    #-------------------------------------------------------------------
+    # Class methods
+    #-------------------------------------------------------------------
+    # Write network to archive. connection_lists can be an iterator over the AMPA and
+    # NMDA connection lists of each HCU->HCU product so they are generated, written
+    # and freed one product at a time. Archive is written to a temporary file and
+    # renamed so an interrupted export never leaves a partial archive behind
+    @classmethod
+    def write(cls, filename, description, stim_offsets, stim_times, connection_lists, hcu_biases=None):
+        num_hcu = description["num_hcu"]
+
+        folder = os.path.dirname(os.path.abspath(filename))
+        handle, temp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        os.close(handle)
+
+        try:
+            with WeightArchive(temp_filename, "w") as archive:
+                archive.add("description", numpy.frombuffer(json.dumps(description, sort_keys=True).encode("utf-8"),
+                                                            dtype=numpy.uint8))
+                archive.add("stimulus_offsets", stim_offsets)
+                archive.add("stimulus_times", stim_times)
+
+                if hcu_biases is not None:
+                    for h, bias in enumerate(hcu_biases):
+                        archive.add("hcu_%u_bias" % h, numpy.asarray(bias, dtype=numpy.float64))
+
+                for (i_pre, i_post), (ampa_list, nmda_list) in zip(itertools.product(range(num_hcu), repeat=2),
+                                                                   connection_lists):
+                    archive.add("connection_%u_%u_ampa" % (i_pre, i_post), ampa_list)
+                    archive.add("connection_%u_%u_nmda" % (i_pre, i_post), nmda_list)
+
+            os.rename(temp_filename, filename)
+        except Exception:
+            os.remove(temp_filename)
+            raise
+
+        logger.info("Archived network to %s" % filename)
+        return cls(filename)
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Build key identifying a network from the JSON-serialisable inputs which determine its archived arrays
+def get_network_key(inputs):
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Hash arrays, such as HCU biases, so they can be included in network inputs
+def get_array_hash(arrays):
+    array_hash = hashlib.sha1()
+    for a in arrays:
+        array_hash.update(numpy.ascontiguousarray(a, dtype=numpy.float64).tobytes())
+    return array_hash.hexdigest()
+
+# Open archived network if it exists and was built from inputs with key, otherwise return None
+def open_network(filename, key):
+    if not os.path.exists(filename):
+        logger.info("No network archived in %s" % filename)
+        return None
+
+    archive = NetworkArchive(filename)
+    if archive.description.get("key") != key:
+        logger.info("Network archived in %s was built from different inputs" % filename)
+        archive.close()
+        return None
+
+    logger.info("Rebuilding network from %s" % filename)
+    return archive
+
+# Compare two archived networks, returning a list of their differences
+def diff_networks(archive_a, archive_b):
+    differences = []
+
+    # Compare descriptions
+    description_a = archive_a.description
+    description_b = archive_b.description
+    for name in sorted(set(description_a) | set(description_b)):
+        if name == "key":
+            continue
+
+        value_a = description_a.get(name)
+        value_b = description_b.get(name)
+        if value_a != value_b:
+            differences.append("%s: %s != %s" % (name, _summarise_value(value_a), _summarise_value(value_b)))
+
+    # Compare blocks present in both archives
+    names_a = set(archive_a.get_names())
+    names_b = set(archive_b.get_names())
+    for name in sorted(names_a ^ names_b):
+        differences.append("%s: only in %s" % (name, archive_a.filename if name in names_a else archive_b.filename))
+
+    for name in sorted(names_a & names_b):
+        difference = _diff_arrays(archive_a.get(name), archive_b.get(name))
+        if difference is not None:
+            differences.append("%s: %s" % (name, difference))
+
+    return differences
+
+def _summarise_value(value):
+    if isinstance(value, list) and len(value) > 8:
+        return "[%u values]" % len(value)
+    else:
+        return json.dumps(value, sort_keys=True)
+
+# Describe how two arrays differ or return None if they are identical
+def _diff_arrays(a, b):
+    if a.dtype != b.dtype:
+        return "dtype %s != %s" % (a.dtype, b.dtype)
+    elif a.shape != b.shape:
+        return "%u != %u entries" % (len(a), len(b))
+
+    # Compare each field of records or values themselves, reporting how many differ and by how much
+    fields = a.dtype.names if a.dtype.names is not None else [None]
+    field_differences = []
+    for f in fields:
+        field_a = a if f is None else a[f]
+        field_b = b if f is None else b[f]
+        different = (field_a != field_b)
+        num_different = numpy.count_nonzero(different)
+        if num_different > 0:
+            max_difference = numpy.amax(numpy.abs(field_a[different].astype(numpy.float64) -
+                                                  field_b[different].astype(numpy.float64)))
+            field_differences.append("%s%u/%u differ by up to %g" % ("" if f is None else "%s " % f,
+                                                                    num_different, a.size, max_difference))
+
+    return ", ".join(field_differences) if len(field_differences) > 0 else None
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two archived network realizations")
+    parser.add_argument("archive_a", nargs=1, help="First network archive")
+    parser.add_argument("archive_b", nargs=1, help="Second network archive")
+    args = parser.parse_args()
+
+    with NetworkArchive(args.archive_a[0]) as archive_a, NetworkArchive(args.archive_b[0]) as archive_b:
+        differences = diff_networks(archive_a, archive_b)
+    for d in differences:
+        print(d)
+
+    if len(differences) == 0:
+        print("Networks are identical")
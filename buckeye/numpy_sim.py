@@ -0,0 +1,1021 @@
+# Pure-NumPy reference implementation of the subset of the PyNN API (and
+# the pynn_spinnaker_bcpnn extensions) used by network.py. All neurons of all
+# populations are updated together each timestep, synaptic input is delivered
+# through per receptor and delay CSR matrices and BCPNN synapses are updated
+# in an event-driven manner using the closed-form solution of their traces.
+# This module provides both the simulator and the BCPNN model namespaces so can
+# be used as network.set_backend(numpy_sim, numpy_sim) or network.select_backend("numpy")
+import logging
+import numpy
+import pickle
+
+logger = logging.getLogger()
+
+# Receptor types supported by all neuron models
+receptor_types = ("excitatory", "inhibitory", "excitatory2")
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Contribution to a P trace, driven by a Z trace which is z at the start
+# of an interval of duration delta, decaying with time constant tau_z
+def bcpnn_p_kernel(delta, tau_z, tau_p):
+    decay_z = numpy.exp(-delta / tau_z)
+    decay_p = numpy.exp(-delta / tau_p)
+
+    # If time constants are equal, limit is delta * e^(-delta / tau)
+    if numpy.isclose(tau_z, tau_p):
+        return (delta / tau_p) * decay_p
+    else:
+        return (decay_z - decay_p) * (tau_z / (tau_z - tau_p))
+
+# Get indices of all entries in the selected rows of a CSR structure
+def csr_gather(indptr, rows):
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = counts.sum()
+
+    # Build ranges [start, start + count) for each row
+    return (numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) +
+            numpy.arange(total))
+
+# Build CSR row pointer from sorted row indices
+def csr_indptr(sorted_rows, num_rows):
+    indptr = numpy.zeros(num_rows + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sorted_rows, minlength=num_rows), out=indptr[1:])
+    return indptr
+
+# Draw uniform random numbers from a PyNN RNG, a NumPy RandomState or,
+# if neither are provided, the simulator's own generator
+def _uniform(rng, n):
+    if rng is None:
+        return _state.rng.uniform(size=n)
+    elif hasattr(rng, "next"):
+        return rng.next(n, "uniform", {"low": 0.0, "high": 1.0})
+    else:
+        return rng.uniform(size=n)
+
+# Resolve a parameter or initial value into an array of a population's size
+def _resolve_values(value, size):
+    # If value is a random distribution, draw values from it
+    if hasattr(value, "next"):
+        return numpy.asarray(value.next(size), dtype=float).reshape(size)
+    else:
+        return numpy.array(numpy.broadcast_to(numpy.asarray(value, dtype=float), (size,)))
+
+#------------------------------------------------------------------------------
+# Cell types
+#------------------------------------------------------------------------------
+class _CellType(object):
+    default_parameters = {}
+
+    def __init__(self, **parameters):
+        unknown = set(parameters) - set(self.default_parameters)
+        if len(unknown) > 0:
+            raise ValueError("%s has no parameters %s" % (type(self).__name__,
+                                                          ", ".join(sorted(unknown))))
+
+        self.parameters = dict(self.default_parameters)
+        self.parameters.update(parameters)
+
+class IF_curr_exp(_CellType):
+    is_neuron = True
+    default_parameters = {"cm": 1.0, "tau_m": 20.0, "tau_refrac": 0.1,
+                          "tau_syn_E": 5.0, "tau_syn_I": 5.0, "v_rest": -65.0,
+                          "v_reset": -65.0, "v_thresh": -50.0, "i_offset": 0.0}
+
+class IF_curr_dual_exp(IF_curr_exp):
+    default_parameters = dict(IF_curr_exp.default_parameters,
+                              tau_syn_E2=5.0, tau_z=5.0, tau_p=1000.0,
+                              phi=0.05, f_max=20.0, bias_enabled=True,
+                              plasticity_enabled=False)
+
+class IF_curr_ca2_adaptive_dual_exp(IF_curr_dual_exp):
+    default_parameters = dict(IF_curr_dual_exp.default_parameters,
+                              tau_ca2=50.0, i_alpha=0.0)
+
+class SpikeSourcePoisson(_CellType):
+    is_neuron = False
+    default_parameters = {"rate": 1.0, "start": 0.0, "duration": 1.0E10}
+
+class SpikeSourceArray(_CellType):
+    is_neuron = False
+    default_parameters = {"spike_times": []}
+
+#------------------------------------------------------------------------------
+# Synapse types
+#------------------------------------------------------------------------------
+class StaticSynapse(object):
+    def __init__(self, weight=0.0, delay=None):
+        self.weight = weight
+        self.delay = delay
+
+class BCPNNSynapse(object):
+    def __init__(self, tau_zi=5.0, tau_zj=5.0, tau_p=1000.0, f_max=20.0,
+                 w_max=1.0, weights_enabled=True, plasticity_enabled=True,
+                 weight=0.0, delay=None):
+        self.tau_zi = tau_zi
+        self.tau_zj = tau_zj
+        self.tau_p = tau_p
+        self.f_max = f_max
+        self.w_max = w_max
+        self.weights_enabled = weights_enabled
+        self.plasticity_enabled = plasticity_enabled
+        self.weight = weight
+        self.delay = delay
+
+#------------------------------------------------------------------------------
+# Connectors
+#------------------------------------------------------------------------------
+# Connectors return arrays of pre and postsynaptic indices and
+# either arrays of weights and delays or None to use the synapse's
+class OneToOneConnector(object):
+    def connect(self, num_pre, num_post):
+        assert num_pre == num_post
+        indices = numpy.arange(num_pre)
+        return indices, indices, None, None
+
+class AllToAllConnector(object):
+    def __init__(self, allow_self_connections=True):
+        self.allow_self_connections = allow_self_connections
+
+    def connect(self, num_pre, num_post):
+        pre = numpy.repeat(numpy.arange(num_pre), num_post)
+        post = numpy.tile(numpy.arange(num_post), num_pre)
+
+        if not self.allow_self_connections:
+            pre, post = pre[pre != post], post[pre != post]
+
+        return pre, post, None, None
+
+class FixedProbabilityConnector(object):
+    def __init__(self, p_connect, allow_self_connections=True, rng=None):
+        self.p_connect = p_connect
+        self.allow_self_connections = allow_self_connections
+        self.rng = rng
+
+    def connect(self, num_pre, num_post):
+        connected = _uniform(self.rng, num_pre * num_post) < self.p_connect
+        indices = numpy.flatnonzero(connected)
+        pre = indices // num_post
+        post = indices % num_post
+
+        if not self.allow_self_connections:
+            pre, post = pre[pre != post], post[pre != post]
+
+        return pre, post, None, None
+
+class FixedNumberPreConnector(object):
+    def __init__(self, n, allow_self_connections=True, with_replacement=False, rng=None):
+        self.n = n
+        self.allow_self_connections = allow_self_connections
+        self.with_replacement = with_replacement
+        self.rng = rng
+
+    def connect(self, num_pre, num_post):
+        assert self.with_replacement or self.n <= num_pre
+        pre = numpy.floor(_uniform(self.rng, num_post * self.n) * num_pre).astype(numpy.int64)
+        pre = pre.reshape(num_post, self.n)
+
+        # Redraw duplicate presynaptic neurons until each row contains n distinct ones
+        while not self.with_replacement:
+            pre.sort(axis=1)
+            duplicate = numpy.zeros(pre.shape, dtype=bool)
+            duplicate[:,1:] = pre[:,1:] == pre[:,:-1]
+            num_duplicates = numpy.count_nonzero(duplicate)
+            if num_duplicates == 0:
+                break
+
+            pre[duplicate] = numpy.floor(_uniform(self.rng, num_duplicates) * num_pre).astype(numpy.int64)
+
+        post = numpy.repeat(numpy.arange(num_post), self.n)
+        pre = pre.flatten()
+
+        if not self.allow_self_connections:
+            pre, post = pre[pre != post], post[pre != post]
+
+        return pre, post, None, None
+
+class FromListConnector(object):
+    def __init__(self, conn_list):
+        self.conn_list = conn_list
+
+    def connect(self, num_pre, num_post):
+        conn_list = numpy.asarray(self.conn_list)
+
+        # Structured connection lists have named columns
+        if conn_list.dtype.names is not None:
+            columns = [conn_list[n] for n in conn_list.dtype.names]
+        else:
+            columns = list(conn_list.reshape(len(conn_list), -1).T)
+
+        pre = numpy.asarray(columns[0], dtype=numpy.int64)
+        post = numpy.asarray(columns[1], dtype=numpy.int64)
+        weight = numpy.asarray(columns[2], dtype=float) if len(columns) > 2 else None
+        delay = numpy.asarray(columns[3], dtype=float) if len(columns) > 3 else None
+        return pre, post, weight, delay
+
+#------------------------------------------------------------------------------
+# Current sources
+#------------------------------------------------------------------------------
+# Gaussian noise current, redrawn every dt between start and stop
+class NoisyCurrentSource(object):
+    def __init__(self, mean=0.0, stdev=1.0, start=0.0, stop=None, dt=None):
+        self.mean = mean
+        self.stdev = stdev
+        self.start = start
+        self.stop = stop
+        self.dt = dt
+
+    def inject_into(self, cells):
+        cells.inject(self)
+
+#------------------------------------------------------------------------------
+# SpiNNakerConfig
+#------------------------------------------------------------------------------
+# Accepts the pynn_spinnaker mapping hints so models can set them unchanged
+class SpiNNakerConfig(object):
+    def __init__(self):
+        self.mean_firing_rate = None
+        self.max_cluster_width = None
+        self.flush_time = None
+
+#------------------------------------------------------------------------------
+# Population
+#------------------------------------------------------------------------------
+class Population(object):
+    def __init__(self, size, cellclass, cellparams=None, label=None):
+        # Support both cell type instances and classes with parameter dictionaries
+        if isinstance(cellclass, type):
+            cellclass = cellclass(**(cellparams or {}))
+
+        self.size = size
+        self.celltype = cellclass
+        self.label = label
+        self.spinnaker_config = SpiNNakerConfig()
+
+        self.initial_values = {}
+        self.recorded = {}
+
+        # Add to simulator, assigning a range of global IDs
+        self.first_id = _state.add_population(self)
+
+    def __len__(self):
+        return self.size
+
+    def __add__(self, other):
+        return Assembly(self, other)
+
+    def __getitem__(self, selector):
+        return PopulationView(self, selector)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def initialize(self, **initial_values):
+        for variable, value in initial_values.items():
+            self.initial_values[variable] = _resolve_values(value, self.size)
+
+    def inject(self, current_source):
+        _state.add_current_source(self, current_source)
+
+    def record(self, variables, sampling_interval=None, to_file=None):
+        if isinstance(variables, str):
+            variables = [variables]
+
+        for v in variables:
+            self.recorded[v] = sampling_interval
+
+        # Recording from file is not supported
+        assert to_file is None
+
+    def get_data(self, variables="all", clear=False):
+        return _state.get_data(self, variables, clear)
+
+    def write_data(self, io, variables="all", clear=False):
+        block = self.get_data(variables, clear)
+        with open(io, "wb") as f:
+            pickle.dump(block, f)
+
+    #-------------------------------------------------------------------
+    # Properties
+    #-------------------------------------------------------------------
+    @property
+    def all_ids(self):
+        return numpy.arange(self.first_id, self.first_id + self.size)
+
+#------------------------------------------------------------------------------
+# PopulationView
+#------------------------------------------------------------------------------
+# Subset of a population's neurons selected by a slice or array of indices
+class PopulationView(object):
+    def __init__(self, parent, selector, label=None):
+        self.parent = parent
+        self.mask = numpy.arange(parent.size)[selector]
+        self.size = len(self.mask)
+        self.label = label if label is not None else "view of %s" % parent.label
+
+    def __len__(self):
+        return self.size
+
+    def __add__(self, other):
+        return Assembly(self, other)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # **NOTE** recordings are shared with the parent
+    # so can't be cleared through individual views
+    def get_data(self, variables="all", clear=False):
+        assert not clear, "Recorded data cannot be cleared through a view"
+        return _state.get_data(self.parent, variables, False, self.mask)
+
+    def write_data(self, io, variables="all", clear=False):
+        block = self.get_data(variables, clear)
+        with open(io, "wb") as f:
+            pickle.dump(block, f)
+
+    #-------------------------------------------------------------------
+    # Properties
+    #-------------------------------------------------------------------
+    @property
+    def all_ids(self):
+        return self.parent.all_ids[self.mask]
+
+#------------------------------------------------------------------------------
+# Assembly
+#------------------------------------------------------------------------------
+class Assembly(object):
+    def __init__(self, *populations, **kwargs):
+        self.populations = list(populations)
+        self.label = kwargs.get("label", None)
+        self.size = sum(len(p) for p in self.populations)
+
+    def __len__(self):
+        return self.size
+
+    def __add__(self, other):
+        return Assembly(*(self.populations + [other]))
+
+    @property
+    def all_ids(self):
+        return numpy.concatenate([p.all_ids for p in self.populations])
+
+#------------------------------------------------------------------------------
+# Projection
+#------------------------------------------------------------------------------
+class Projection(object):
+    def __init__(self, presynaptic_population, postsynaptic_population,
+                 connector, synapse_type=None, receptor_type="excitatory",
+                 label=None):
+        if receptor_type not in receptor_types:
+            raise ValueError("Unknown receptor type '%s'" % receptor_type)
+
+        self.pre = presynaptic_population
+        self.post = postsynaptic_population
+        self.synapse_type = synapse_type if synapse_type is not None else StaticSynapse()
+        self.receptor_type = receptor_type
+        self.label = label
+
+        # Build connectivity
+        pre, post, weight, delay = connector.connect(len(self.pre), len(self.post))
+        self.pre_indices = numpy.asarray(pre, dtype=numpy.int64)
+        self.post_indices = numpy.asarray(post, dtype=numpy.int64)
+
+        # Use synapse's weights and delays if connector doesn't provide them
+        num_synapses = len(self.pre_indices)
+        if weight is None:
+            weight = self.synapse_type.weight
+        if delay is None:
+            delay = (self.synapse_type.delay if self.synapse_type.delay is not None
+                     else _state.min_delay)
+        self.weights = _resolve_values(weight, num_synapses)
+        self.delay_steps = numpy.round(_resolve_values(delay, num_synapses) / _state.dt).astype(int)
+
+        # If synapses are plastic, create trace state
+        self.plastic = isinstance(self.synapse_type, BCPNNSynapse) and self.synapse_type.plasticity_enabled
+        if self.plastic:
+            self.bcpnn = _BCPNNState(self)
+
+        _state.projections.append(self)
+
+    def __len__(self):
+        return len(self.pre_indices)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def size(self):
+        return len(self.pre_indices)
+
+    def get(self, attribute_names, format="list", with_address=True):
+        assert attribute_names in ("weight", ["weight"]), "Only weights can be read"
+
+        weights = self._get_weights()
+        if format == "array":
+            # Unconnected entries are NaN
+            matrix = numpy.empty((len(self.pre), len(self.post)))
+            matrix.fill(numpy.nan)
+            matrix[self.pre_indices, self.post_indices] = weights
+            return matrix
+        elif format == "list":
+            if with_address:
+                return list(zip(self.pre_indices, self.post_indices, weights))
+            else:
+                return list(weights)
+        else:
+            raise ValueError("Unsupported format '%s'" % format)
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _get_weights(self):
+        # Plastic weights are calculated from the BCPNN traces
+        if self.plastic:
+            return self.bcpnn.get_weights(_state.t)
+        else:
+            return self.weights
+
+#------------------------------------------------------------------------------
+# _BCPNNState
+#------------------------------------------------------------------------------
+# Traces of a plastic BCPNN projection. Z traces decay exponentially between
+# spikes and P traces are low-pass filtered Z traces. Rather than integrating
+# every synapse's P trace each timestep, synapses are only updated when their
+# pre or postsynaptic neuron spikes, using the closed-form solution between
+class _BCPNNState(object):
+    # Traces which evolve during simulation
+    state_names = ("z_i", "t_i", "z_j", "t_j", "p_i", "t_p_i", "p_j", "t_p_j", "p_ij", "t_p_ij")
+
+    def __init__(self, projection):
+        synapse = projection.synapse_type
+        self.tau_zi = synapse.tau_zi
+        self.tau_zj = synapse.tau_zj
+        self.tau_p = synapse.tau_p
+        self.w_max = synapse.w_max
+
+        # Z traces are incremented such that they are 1 at f_max
+        self.z_i_spike = 1000.0 / (synapse.f_max * self.tau_zi)
+        self.z_j_spike = 1000.0 / (synapse.f_max * self.tau_zj)
+        self.epsilon = 1000.0 / (synapse.f_max * self.tau_p)
+
+        # Product of Z traces decays with combined time constant
+        self.tau_zij = 1.0 / ((1.0 / self.tau_zi) + (1.0 / self.tau_zj))
+
+        # Plastic synapses have a single delay
+        delays = numpy.unique(projection.delay_steps)
+        assert len(delays) <= 1, "Plastic projections must have uniform delays"
+        self.delay_steps = delays[0] if len(delays) == 1 else 1
+
+        num_pre = len(projection.pre)
+        num_post = len(projection.post)
+        num_synapses = len(projection.pre_indices)
+
+        # Build CSR structures to find synapses of each pre and postsynaptic neuron
+        self.pre_indices = projection.pre_indices
+        self.post_indices = projection.post_indices
+        self.pre_order = numpy.argsort(self.pre_indices, kind="mergesort")
+        self.post_order = numpy.argsort(self.post_indices, kind="mergesort")
+        self.pre_indptr = csr_indptr(self.pre_indices[self.pre_order], num_pre)
+        self.post_indptr = csr_indptr(self.post_indices[self.post_order], num_post)
+
+        # Neuron state: Z trace immediately after last spike and its time
+        self.z_i = numpy.zeros(num_pre)
+        self.t_i = numpy.zeros(num_pre)
+        self.z_j = numpy.zeros(num_post)
+        self.t_j = numpy.zeros(num_post)
+
+        # Neuron P traces and time they were last updated
+        self.p_i = numpy.zeros(num_pre)
+        self.t_p_i = numpy.zeros(num_pre)
+        self.p_j = numpy.zeros(num_post)
+        self.t_p_j = numpy.zeros(num_post)
+
+        # Synapse P traces and time they were last updated
+        self.p_ij = numpy.zeros(num_synapses)
+        self.t_p_ij = numpy.zeros(num_synapses)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def process_spikes(self, t, pre_spikes, post_spikes):
+        # Find synapses affected by spikes
+        affected = numpy.concatenate((self.pre_order[csr_gather(self.pre_indptr, pre_spikes)],
+                                      self.post_order[csr_gather(self.post_indptr, post_spikes)]))
+        affected = numpy.unique(affected)
+
+        # Bring their P traces and those of spiking neurons up to date
+        self._update_synapses(t, affected)
+        self.p_i[pre_spikes] = self._update_neurons(t, pre_spikes, self.z_i, self.t_i,
+                                                    self.p_i, self.t_p_i, self.tau_zi)
+        self.p_j[post_spikes] = self._update_neurons(t, post_spikes, self.z_j, self.t_j,
+                                                     self.p_j, self.t_p_j, self.tau_zj)
+
+        # Add spikes to Z traces
+        self.z_i[pre_spikes] = self._get_z(t, pre_spikes, self.z_i, self.t_i, self.tau_zi) + self.z_i_spike
+        self.t_i[pre_spikes] = t
+        self.z_j[post_spikes] = self._get_z(t, post_spikes, self.z_j, self.t_j, self.tau_zj) + self.z_j_spike
+        self.t_j[post_spikes] = t
+
+    def get_weights(self, t):
+        # Bring all traces up to date
+        all_pre = numpy.arange(len(self.z_i))
+        all_post = numpy.arange(len(self.z_j))
+        self._update_synapses(t, numpy.arange(len(self.p_ij)))
+        self.p_i[:] = self._update_neurons(t, all_pre, self.z_i, self.t_i,
+                                           self.p_i, self.t_p_i, self.tau_zi)
+        self.p_j[:] = self._update_neurons(t, all_post, self.z_j, self.t_j,
+                                           self.p_j, self.t_p_j, self.tau_zj)
+
+        # Calculate weights
+        p_i = self.p_i[self.pre_indices] + self.epsilon
+        p_j = self.p_j[self.post_indices] + self.epsilon
+        p_ij = self.p_ij + (self.epsilon ** 2)
+        return self.w_max * numpy.log(p_ij / (p_i * p_j))
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _get_z(self, t, neurons, z, t_z, tau_z):
+        return z[neurons] * numpy.exp(-(t - t_z[neurons]) / tau_z)
+
+    def _update_neurons(self, t, neurons, z, t_z, p, t_p, tau_z):
+        # Z trace at time of last P update
+        z_last = self._get_z(t_p[neurons], neurons, z, t_z, tau_z)
+
+        # Advance P trace to t
+        delta = t - t_p[neurons]
+        t_p[neurons] = t
+        return ((p[neurons] * numpy.exp(-delta / self.tau_p)) +
+                (z_last * bcpnn_p_kernel(delta, tau_z, self.tau_p)))
+
+    def _update_synapses(self, t, synapses):
+        pre = self.pre_indices[synapses]
+        post = self.post_indices[synapses]
+        t_last = self.t_p_ij[synapses]
+
+        # Z traces at time of last P update
+        z_i = self.z_i[pre] * numpy.exp(-(t_last - self.t_i[pre]) / self.tau_zi)
+        z_j = self.z_j[post] * numpy.exp(-(t_last - self.t_j[post]) / self.tau_zj)
+
+        # Advance P trace to t
+        delta = t - t_last
+        self.p_ij[synapses] = ((self.p_ij[synapses] * numpy.exp(-delta / self.tau_p)) +
+                               (z_i * z_j * bcpnn_p_kernel(delta, self.tau_zij, self.tau_p)))
+        self.t_p_ij[synapses] = t
+
+#------------------------------------------------------------------------------
+# _Simulator
+#------------------------------------------------------------------------------
+class _Simulator(object):
+    # State of neurons which evolves during simulation
+    _neuron_state_names = ("v", "i_ca2", "refrac", "z", "p", "bias", "i_noise")
+
+    def __init__(self, timestep, min_delay, max_delay, seed):
+        self.dt = timestep
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.rng = numpy.random.RandomState(seed)
+
+        self.populations = []
+        self.projections = []
+        self.current_sources = []
+        self.num_ids = 0
+        self.step = 0
+        self.built = False
+
+    @property
+    def t(self):
+        return self.step * self.dt
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def add_population(self, population):
+        assert not self.built, "Populations cannot be added after simulation has started"
+        self.populations.append(population)
+
+        first_id = self.num_ids
+        self.num_ids += population.size
+        return first_id
+
+    def add_current_source(self, population, current_source):
+        assert not self.built, "Current sources cannot be added after simulation has started"
+        self.current_sources.append((population, current_source))
+
+    def run(self, simtime):
+        if not self.built:
+            self._build()
+
+        num_steps = int(round(simtime / self.dt))
+        logger.info("Simulating %u timesteps" % num_steps)
+        for _ in range(num_steps):
+            self._step()
+
+        return self.t
+
+    # Save dynamic state of simulation, including that of plastic synapses and the
+    # random number generator, so an identically built network can be restored to it.
+    # Spike sources may differ e.g. if stimuli are windowed when restoring so only the
+    # history of spikes emitted by neurons, on their way to plastic synapses, is saved
+    def save_state(self, filename):
+        assert self.built, "Only simulations which have started can be saved"
+        assert all(numpy.all(self.neuron_index[p.pre_ids] >= 0) for p in self.plastic_projections), \
+            "Only simulations whose plastic synapses are driven by neurons can be saved"
+
+        state = {"step": self.step, "rng": self.rng.get_state(),
+                 "neurons": {n: getattr(self, n) for n in self._neuron_state_names},
+                 "spike_history": self.spike_history[:,self.neuron_ids],
+                 "i_syn": self.i_syn, "input_ring": self.input_ring,
+                 "plastic_projections": [{n: getattr(p.bcpnn, n) for n in _BCPNNState.state_names}
+                                         for p in self.plastic_projections]}
+        with open(filename, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Restore dynamic state saved by save_state, building the network if necessary. Recordings
+    # are discarded and, like those of a new simulation, restart from the restored time
+    def load_state(self, filename):
+        if not self.built:
+            self._build()
+
+        with open(filename, "rb") as f:
+            state = pickle.load(f)
+
+        assert len(state["plastic_projections"]) == len(self.plastic_projections), \
+            "Saved state has %u plastic projections" % len(state["plastic_projections"])
+
+        self.step = state["step"]
+        self.rng.set_state(state["rng"])
+        self.i_syn = state["i_syn"]
+        self.input_ring = state["input_ring"]
+        self.spike_history[:] = False
+        self.spike_history[:,self.neuron_ids] = state["spike_history"]
+        for n, value in state["neurons"].items():
+            assert value.shape == getattr(self, n).shape, "Saved state of '%s' doesn't match network" % n
+            setattr(self, n, value)
+        for p, projection_state in zip(self.plastic_projections, state["plastic_projections"]):
+            for n, value in projection_state.items():
+                assert value.shape == getattr(p.bcpnn, n).shape, "Saved state of '%s' doesn't match network" % n
+                setattr(p.bcpnn, n, value)
+
+        self._reset_recordings()
+
+    # Get data recorded from population, optionally only from the neurons it indexes
+    def get_data(self, population, variables, clear, neurons=None):
+        import neo
+        import quantities as pq
+
+        if variables == "all":
+            variables = list(population.recorded.keys())
+        elif isinstance(variables, str):
+            variables = [variables]
+
+        segment = neo.Segment(name="segment000")
+        recording = self.recordings.get(population, {}) if self.built else {}
+
+        # Add a spike train for each neuron
+        if "spikes" in variables and "spikes" in recording:
+            spike_steps, spike_ids = recording["spikes"]
+            steps = (numpy.concatenate(spike_steps) if len(spike_steps) > 0
+                     else numpy.empty(0, dtype=int))
+            ids = (numpy.concatenate(spike_ids) if len(spike_ids) > 0
+                   else numpy.empty(0, dtype=int))
+            order = numpy.lexsort((steps, ids))
+            offsets = csr_indptr(ids[order], population.size)
+            times = steps[order] * self.dt
+            if neurons is None:
+                neurons = numpy.arange(population.size)
+
+            # **NOTE** source indices are relative to the neurons selected
+            for i, n in enumerate(neurons):
+                neuron_times = times[offsets[n]:offsets[n + 1]]
+                segment.spiketrains.append(
+                    neo.SpikeTrain(neuron_times, units="ms", t_start=0.0,
+                                   t_stop=max(self.t, neuron_times[-1] + self.dt) if len(neuron_times) > 0 else self.t,
+                                   source_population=population.label,
+                                   source_index=i))
+
+            if clear:
+                del spike_steps[:]
+                del spike_ids[:]
+
+        # Add an analog signal for each sampled state variable
+        for v in variables:
+            if v == "spikes" or v not in recording:
+                continue
+
+            # Samples are evenly spaced from the first one retained
+            sample_steps, samples = recording[v]
+            signal = (numpy.vstack(samples) if len(samples) > 0
+                      else numpy.empty((0, population.size)))
+            if neurons is not None:
+                signal = signal[:,neurons]
+            units = "mV" if v == "v" else "nA"
+            sampling_interval = population.recorded[v] or self.dt
+            t_start = sample_steps[0] * self.dt if len(sample_steps) > 0 else 0.0
+            segment.analogsignals.append(
+                neo.AnalogSignal(signal, units=units, name=v, t_start=t_start * pq.ms,
+                                 sampling_period=sampling_interval * pq.ms))
+            if clear:
+                del sample_steps[:]
+                del samples[:]
+
+        block = neo.Block(name=population.label)
+        block.segments.append(segment)
+        return block
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _get_population_params(self, populations, name, default):
+        return numpy.concatenate([_resolve_values(p.celltype.parameters.get(name, default), p.size)
+                                  for p in populations])
+
+    def _build(self):
+        logger.info("Building %u populations and %u projections" % (len(self.populations), len(self.projections)))
+        self.built = True
+        dt = self.dt
+
+        neuron_pops = [p for p in self.populations if p.celltype.is_neuron]
+        poisson_pops = [p for p in self.populations if isinstance(p.celltype, SpikeSourcePoisson)]
+        array_pops = [p for p in self.populations if isinstance(p.celltype, SpikeSourceArray)]
+
+        # Build mapping from global IDs to neuron indices
+        self.neuron_ids = (numpy.concatenate([p.all_ids for p in neuron_pops])
+                           if len(neuron_pops) > 0 else numpy.empty(0, dtype=int))
+        self.num_neurons = len(self.neuron_ids)
+        self.neuron_index = numpy.empty(self.num_ids, dtype=numpy.int64)
+        self.neuron_index.fill(-1)
+        self.neuron_index[self.neuron_ids] = numpy.arange(self.num_neurons)
+
+        # Gather neuron parameters
+        param = lambda name, default: self._get_population_params(neuron_pops, name, default)
+        self.v_rest = param("v_rest", -65.0)
+        self.v_reset = param("v_reset", -65.0)
+        self.v_thresh = param("v_thresh", -50.0)
+        self.i_offset = param("i_offset", 0.0)
+        self.r_membrane = param("tau_m", 20.0) / param("cm", 1.0)
+        self.decay_m = numpy.exp(-dt / param("tau_m", 20.0))
+        self.refrac_steps = numpy.round(param("tau_refrac", 0.1) / dt).astype(int)
+        self.decay_syn = {"excitatory": numpy.exp(-dt / param("tau_syn_E", 5.0)),
+                          "inhibitory": numpy.exp(-dt / param("tau_syn_I", 5.0)),
+                          "excitatory2": numpy.exp(-dt / param("tau_syn_E2", 5.0))}
+        self.decay_ca2 = numpy.exp(-dt / param("tau_ca2", 50.0))
+        self.i_alpha = param("i_alpha", 0.0)
+
+        # Gather intrinsic plasticity parameters
+        tau_z = param("tau_z", 5.0)
+        tau_p = param("tau_p", 1000.0)
+        f_max = param("f_max", 20.0)
+        self.phi = param("phi", 0.05)
+        self.bias_enabled = param("bias_enabled", False).astype(bool)
+        self.intrinsic_enabled = param("plasticity_enabled", False).astype(bool)
+        self.decay_z = numpy.exp(-dt / tau_z)
+        self.decay_p = numpy.exp(-dt / tau_p)
+        self.z_spike = 1000.0 / (f_max * tau_z)
+        self.p_kernel = numpy.asarray([bcpnn_p_kernel(dt, z, p) for z, p in zip(tau_z, tau_p)])
+        self.bias_epsilon = 1000.0 / (f_max * tau_p)
+
+        # Initialise neuron state
+        self.v = numpy.concatenate([p.initial_values.get("v", _resolve_values(p.celltype.parameters.get("v_rest", -65.0), p.size))
+                                    for p in neuron_pops]) if len(neuron_pops) > 0 else numpy.empty(0)
+        self.i_syn = {r: numpy.zeros(self.num_neurons) for r in receptor_types}
+        self.i_ca2 = numpy.zeros(self.num_neurons)
+        self.refrac = numpy.zeros(self.num_neurons, dtype=int)
+        self.z = numpy.zeros(self.num_neurons)
+        self.p = numpy.zeros(self.num_neurons)
+        self.bias = numpy.where(self.intrinsic_enabled, self.phi * numpy.log(self.bias_epsilon), 0.0)
+
+        # Gather poisson source parameters
+        self.poisson_ids = (numpy.concatenate([p.all_ids for p in poisson_pops])
+                            if len(poisson_pops) > 0 else numpy.empty(0, dtype=int))
+        self.poisson_p = self._get_population_params(poisson_pops, "rate", 1.0) * (dt / 1000.0) if len(poisson_pops) > 0 else numpy.empty(0)
+        self.poisson_start = self._get_population_params(poisson_pops, "start", 0.0) if len(poisson_pops) > 0 else numpy.empty(0)
+        self.poisson_stop = self.poisson_start + (self._get_population_params(poisson_pops, "duration", 1.0E10) if len(poisson_pops) > 0 else numpy.empty(0))
+
+        # Convert spike source array spike times into a sorted list of timestep events
+        event_steps = []
+        event_ids = []
+        for p in array_pops:
+            spike_times = p.celltype.parameters["spike_times"]
+
+            # A single sequence of spike times is shared by all neurons
+            if len(spike_times) == 0 or numpy.isscalar(spike_times[0]):
+                spike_times = [spike_times] * p.size
+
+            for i, s in enumerate(spike_times):
+                steps = numpy.round(numpy.asarray(s, dtype=float) / dt).astype(int)
+                event_steps.append(steps)
+                event_ids.append(numpy.repeat(p.first_id + i, len(steps)))
+
+        event_steps = numpy.concatenate(event_steps) if len(event_steps) > 0 else numpy.empty(0, dtype=int)
+        event_ids = numpy.concatenate(event_ids) if len(event_ids) > 0 else numpy.empty(0, dtype=int)
+        order = numpy.argsort(event_steps, kind="mergesort")
+        self.event_steps = event_steps[order]
+        self.event_ids = event_ids[order]
+
+        # Build synaptic input matrices
+        self._build_synaptic_matrices()
+
+        # Build noise current state
+        # **NOTE** each neuron should only have a single noise source injected
+        self.i_noise = numpy.zeros(self.num_neurons)
+        self.noise_sources = []
+        for p, c in self.current_sources:
+            assert isinstance(c, NoisyCurrentSource), "Only noisy current sources are supported"
+            start_step = int(round(c.start / dt))
+            stop_step = None if c.stop is None else int(round(c.stop / dt))
+            resample_steps = max(1, int(round((c.dt or dt) / dt)))
+            self.noise_sources.append((self.neuron_index[p.all_ids], c, start_step, stop_step, resample_steps))
+
+        # Build plastic projection state
+        self.plastic_projections = [p for p in self.projections if p.plastic]
+        for p in self.plastic_projections:
+            p.pre_ids = p.pre.all_ids
+            p.post_ids = p.post.all_ids
+
+        # Spike history for delivering delayed spikes to plastic synapses
+        self.history_length = max([p.bcpnn.delay_steps for p in self.plastic_projections] + [0]) + 1
+        self.spike_history = numpy.zeros((self.history_length, self.num_ids), dtype=bool)
+
+        # Build recording state and sample initial state
+        self._reset_recordings()
+
+    def _build_synaptic_matrices(self):
+        # Group non-plastic synapses by receptor and delay
+        grouped = {}
+        for p in self.projections:
+            if p.plastic:
+                # Plastic synapses which also transmit aren't used by the model
+                assert not p.synapse_type.weights_enabled, "Plastic synapses must have weights disabled"
+                continue
+
+            pre_ids = p.pre.all_ids[p.pre_indices]
+            post_neurons = self.neuron_index[p.post.all_ids[p.post_indices]]
+            assert numpy.all(post_neurons >= 0), "Projections must target neurons"
+
+            for d in numpy.unique(p.delay_steps):
+                mask = (p.delay_steps == d)
+                grouped.setdefault((p.receptor_type, d), []).append(
+                    (pre_ids[mask], post_neurons[mask], p.weights[mask]))
+
+        # Build a CSR matrix indexed by presynaptic global ID from each group
+        self.max_delay_steps = max([d for _, d in grouped] + [1])
+        self.synaptic_matrices = []
+        for (receptor, d), synapses in sorted(grouped.items()):
+            pre = numpy.concatenate([s[0] for s in synapses])
+            post = numpy.concatenate([s[1] for s in synapses])
+            weight = numpy.concatenate([s[2] for s in synapses])
+
+            order = numpy.argsort(pre, kind="mergesort")
+            self.synaptic_matrices.append((receptor, d, csr_indptr(pre[order], self.num_ids),
+                                           post[order], weight[order]))
+
+        # Ring buffers of input current for each receptor
+        self.ring_length = self.max_delay_steps + 1
+        self.input_ring = {r: numpy.zeros((self.ring_length, self.num_neurons))
+                           for r in receptor_types}
+
+    def _step(self):
+        step = self.step
+        t = self.t
+        spikes = numpy.zeros(self.num_ids, dtype=bool)
+
+        # Apply input arriving this timestep to synaptic currents
+        slot = step % self.ring_length
+        for r in receptor_types:
+            self.i_syn[r] += self.input_ring[r][slot]
+            self.input_ring[r][slot] = 0.0
+
+        # Update noise currents
+        for neurons, c, start_step, stop_step, resample_steps in self.noise_sources:
+            if step < start_step or (stop_step is not None and step >= stop_step):
+                self.i_noise[neurons] = 0.0
+            elif ((step - start_step) % resample_steps) == 0:
+                self.i_noise[neurons] = c.mean + (c.stdev * self.rng.normal(size=len(neurons)))
+
+        # Integrate membrane voltage of non-refractory neurons
+        i_total = (self.i_syn["excitatory"] + self.i_syn["inhibitory"] + self.i_syn["excitatory2"] +
+                   self.i_offset + self.i_noise - self.i_ca2)
+        i_total += numpy.where(self.bias_enabled, self.bias, 0.0)
+        v_inf = self.v_rest + (self.r_membrane * i_total)
+        self.v = numpy.where(self.refrac > 0, self.v_reset, v_inf + ((self.v - v_inf) * self.decay_m))
+        self.refrac -= 1
+
+        # Emit spikes, reset and begin refractory period
+        neuron_spikes = self.v >= self.v_thresh
+        self.v[neuron_spikes] = self.v_reset[neuron_spikes]
+        self.refrac[neuron_spikes] = self.refrac_steps[neuron_spikes]
+        spikes[self.neuron_ids] = neuron_spikes
+
+        # Decay synaptic and adaptation currents
+        for r in receptor_types:
+            self.i_syn[r] *= self.decay_syn[r]
+        self.i_ca2 *= self.decay_ca2
+        self.i_ca2 += numpy.where(neuron_spikes, self.i_alpha, 0.0)
+
+        # Update intrinsic plasticity traces, advancing them to the next timestep
+        self.z += numpy.where(neuron_spikes, self.z_spike, 0.0)
+        self.p = (self.p * self.decay_p) + (self.z * self.p_kernel)
+        self.z *= self.decay_z
+        self.bias = numpy.where(self.intrinsic_enabled, self.phi * numpy.log(self.p + self.bias_epsilon), self.bias)
+
+        # Emit poisson spikes from active sources
+        active = (t >= self.poisson_start) & (t < self.poisson_stop)
+        spikes[self.poisson_ids] = active & (self.rng.uniform(size=len(self.poisson_ids)) < self.poisson_p)
+
+        # Emit spike source array spikes
+        first, last = numpy.searchsorted(self.event_steps, [step, step + 1])
+        spikes[self.event_ids[first:last]] = True
+
+        # Deliver spikes to synaptic input ring buffers
+        spike_ids = numpy.flatnonzero(spikes)
+        for receptor, d, indptr, post, weight in self.synaptic_matrices:
+            synapses = csr_gather(indptr, spike_ids)
+            if len(synapses) > 0:
+                self.input_ring[receptor][(step + d) % self.ring_length] += numpy.bincount(
+                    post[synapses], weights=weight[synapses], minlength=self.num_neurons)
+
+        # Process spikes arriving at plastic synapses
+        self.spike_history[step % self.history_length] = spikes
+        for p in self.plastic_projections:
+            if step < p.bcpnn.delay_steps:
+                continue
+
+            pre_spikes = numpy.flatnonzero(self.spike_history[(step - p.bcpnn.delay_steps) % self.history_length][p.pre_ids])
+            post_spikes = numpy.flatnonzero(spikes[p.post_ids])
+            if len(pre_spikes) > 0 or len(post_spikes) > 0:
+                p.bcpnn.process_spikes(t, pre_spikes, post_spikes)
+
+        # Advance to next timestep and record spikes emitted during this one
+        # and, at the end of each sampling interval, the state it has reached
+        self.step += 1
+        self._record_spikes(step, spikes)
+        self._record_samples()
+
+    def _reset_recordings(self):
+        self.recordings = {}
+        for p in self.populations:
+            self.recordings[p] = {v: ([], []) for v in p.recorded}
+
+        self._record_samples()
+
+    def _record_spikes(self, step, spikes):
+        for p, recording in self.recordings.items():
+            if "spikes" in recording:
+                population_spikes = numpy.flatnonzero(spikes[p.first_id:p.first_id + p.size])
+                if len(population_spikes) > 0:
+                    recording["spikes"][0].append(numpy.repeat(step, len(population_spikes)))
+                    recording["spikes"][1].append(population_spikes)
+
+    # Sample state, as it is at the start of the current timestep, of recorded variables due a sample
+    def _record_samples(self):
+        for p, recording in self.recordings.items():
+            for v, (sample_steps, samples) in recording.items():
+                if v == "spikes":
+                    continue
+
+                # Sample state at sampling interval
+                interval_steps = max(1, int(round((p.recorded[v] or self.dt) / self.dt)))
+                if (self.step % interval_steps) != 0:
+                    continue
+
+                neurons = self.neuron_index[p.all_ids]
+                if v == "v":
+                    samples.append(self.v[neurons].copy())
+                elif v == "bias":
+                    # **NOTE** pynn_spinnaker_bcpnn records bias scaled
+                    # by 1000 so record it the same way for compatibility
+                    samples.append(self.bias[neurons] * 1000.0)
+                else:
+                    raise ValueError("Recording of '%s' is not supported" % v)
+                sample_steps.append(self.step)
+
+#------------------------------------------------------------------------------
+# Simulator control
+#------------------------------------------------------------------------------
+_state = None
+
+def setup(timestep=0.1, min_delay=0.1, max_delay=10.0, seed=None, **extra_params):
+    global _state
+    if len(extra_params) > 0:
+        logger.debug("Ignoring simulator parameters: %s" % ", ".join(sorted(extra_params)))
+
+    _state = _Simulator(timestep, min_delay, max_delay, seed)
+    return 0
+
+def run(simtime):
+    return _state.run(simtime)
+
+def end():
+    global _state
+    _state = None
+
+def get_current_time():
+    return _state.t
+
+def save_state(filename):
+    _state.save_state(filename)
+
+def load_state(filename):
+    _state.load_state(filename)
@@ -0,0 +1,252 @@
+import argparse
+import logging
+import numpy
+
+from numpy_sim import bcpnn_p_kernel, csr_gather, csr_indptr
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Convert spikes in the [index, time] format used by analyse_spikes into CSR
+# format i.e. spike times of neuron n are times[offsets[n]:offsets[n + 1]]
+def spikes_to_csr(spikes, num_neurons):
+    indices = spikes[:,0].astype(numpy.int64)
+    order = numpy.lexsort((spikes[:,1], indices))
+    return csr_indptr(indices[order], num_neurons), spikes[order,1]
+
+# Remove spikes after t_stop from spike trains in CSR format
+def truncate_spikes(spikes, t_stop):
+    offsets, times = spikes
+    neurons = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+    keep = times <= t_stop
+    return csr_indptr(neurons[keep], len(offsets) - 1), times[keep]
+
+# Calculate the value of each neuron's Z trace immediately after each of its spikes
+def get_z_after_spikes(offsets, times, tau_z, z_spike):
+    counts = numpy.diff(offsets)
+    z = numpy.empty(len(times))
+
+    # Loop through spikes in order, updating the k'th spike of all neurons at once
+    for k in range(counts.max() if len(counts) > 0 else 0):
+        neurons = numpy.flatnonzero(counts > k)
+        spike = offsets[neurons] + k
+
+        if k == 0:
+            z[spike] = z_spike
+        else:
+            z[spike] = (z[spike - 1] * numpy.exp(-(times[spike] - times[spike - 1]) / tau_z)) + z_spike
+
+    return z
+
+#------------------------------------------------------------------------------
+# ZTrace
+#------------------------------------------------------------------------------
+# Z traces of a population of neurons, evaluable at arbitrary times up to max_time
+class ZTrace(object):
+    def __init__(self, offsets, times, tau_z, f_max, max_time):
+        self.offsets = offsets
+        self.times = times
+        self.tau_z = tau_z
+        self.z_after = get_z_after_spikes(offsets, times, tau_z, 1000.0 / (f_max * tau_z))
+
+        # Build key to search for spikes of a neuron at a time
+        self.time_scale = max(max_time, times.max() if len(times) > 0 else 0.0) + 1.0
+        self.keys = (numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets)) * self.time_scale) + times
+
+    # Get value of trace of neurons immediately after t
+    def get(self, neurons, t):
+        # Find last spike at or before t
+        last = numpy.searchsorted(self.keys, (neurons * self.time_scale) + t, side="right") - 1
+
+        # If neurons haven't spiked, trace is zero
+        spiked = last >= self.offsets[neurons]
+        last = numpy.where(spiked, last, 0)
+        return numpy.where(spiked, self.z_after[last] * numpy.exp(-(t - self.times[last]) / self.tau_z), 0.0)
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Calculate P trace at simtime from a population's Z traces. Between
+# consecutive spikes, Z decays exponentially so each interval contributes
+# z(t_k) * kernel(t_k+1 - t_k) to P at t_k+1, which then decays until simtime
+def get_neuron_p(z_trace, simtime, tau_p):
+    offsets, times = z_trace.offsets, z_trace.times
+    num_neurons = len(offsets) - 1
+    neurons = numpy.repeat(numpy.arange(num_neurons), numpy.diff(offsets))
+
+    # Each spike's interval ends at the neuron's next spike or simtime
+    next_times = numpy.append(times[1:], simtime)
+    last_spike = numpy.zeros(len(times), dtype=bool)
+    last_spike[offsets[1:][numpy.diff(offsets) > 0] - 1] = True
+    next_times[last_spike] = simtime
+
+    contribution = (z_trace.z_after * bcpnn_p_kernel(next_times - times, z_trace.tau_z, tau_p) *
+                    numpy.exp(-(simtime - next_times) / tau_p))
+    return numpy.bincount(neurons, weights=contribution, minlength=num_neurons)
+
+# Calculate P trace at simtime of synapses connecting pre to post neurons.
+# Events (pre and postsynaptic spikes) are gathered and sorted for every
+# synapse and, like get_neuron_p, each interval between them contributes
+# z_i(t_k) * z_j(t_k) * kernel(t_k+1 - t_k) to the synapse's P trace
+def get_synapse_p(pre_trace, post_trace, pre, post, simtime, tau_p, chunk_size=4096):
+    tau_zij = 1.0 / ((1.0 / pre_trace.tau_z) + (1.0 / post_trace.tau_z))
+    p_ij = numpy.empty(len(pre))
+
+    # Loop through chunks of synapses
+    for start in range(0, len(pre), chunk_size):
+        chunk_pre = pre[start:start + chunk_size]
+        chunk_post = post[start:start + chunk_size]
+        chunk_synapses = numpy.arange(len(chunk_pre))
+
+        # Gather times of each synapse's pre and postsynaptic spikes
+        pre_counts = numpy.diff(pre_trace.offsets)[chunk_pre]
+        post_counts = numpy.diff(post_trace.offsets)[chunk_post]
+        event_times = numpy.concatenate((pre_trace.times[csr_gather(pre_trace.offsets, chunk_pre)],
+                                         post_trace.times[csr_gather(post_trace.offsets, chunk_post)],
+                                         numpy.repeat(simtime, len(chunk_pre))))
+        event_synapses = numpy.concatenate((numpy.repeat(chunk_synapses, pre_counts),
+                                            numpy.repeat(chunk_synapses, post_counts),
+                                            chunk_synapses))
+
+        # Sort events by synapse and then time
+        order = numpy.lexsort((event_times, event_synapses))
+        event_times = event_times[order]
+        event_synapses = event_synapses[order]
+
+        # Every event except the final one of each synapse begins an interval
+        interval = numpy.flatnonzero(event_synapses[:-1] == event_synapses[1:])
+        start_times = event_times[interval]
+        end_times = event_times[interval + 1]
+        interval_synapses = event_synapses[interval]
+
+        # Evaluate traces at start of intervals and hence contribution to P
+        z_i = pre_trace.get(chunk_pre[interval_synapses], start_times)
+        z_j = post_trace.get(chunk_post[interval_synapses], start_times)
+        contribution = (z_i * z_j * bcpnn_p_kernel(end_times - start_times, tau_zij, tau_p) *
+                        numpy.exp(-(simtime - end_times) / tau_p))
+        p_ij[start:start + len(chunk_pre)] = numpy.bincount(interval_synapses, weights=contribution,
+                                                            minlength=len(chunk_pre))
+
+    return p_ij
+
+# Calculate BCPNN weights of synapses connecting pre to post neurons
+# from recorded spike trains in CSR format. Presynaptic spikes are
+# delayed by the synaptic delay as they are processed on arrival
+def get_bcpnn_weights(pre_spikes, post_spikes, pre, post, delay,
+                      tau_zi, tau_zj, tau_p, f_max, w_max, simtime):
+    # Delay presynaptic spikes and ignore any which arrive after simtime
+    pre_offsets, pre_times = pre_spikes
+    pre_offsets, pre_times = truncate_spikes((pre_offsets, pre_times + delay), simtime)
+    post_offsets, post_times = truncate_spikes(post_spikes, simtime)
+
+    # Build Z traces
+    pre_trace = ZTrace(pre_offsets, pre_times, tau_zi, f_max, simtime)
+    post_trace = ZTrace(post_offsets, post_times, tau_zj, f_max, simtime)
+
+    # Calculate P traces
+    p_i = get_neuron_p(pre_trace, simtime, tau_p)
+    p_j = get_neuron_p(post_trace, simtime, tau_p)
+    p_ij = get_synapse_p(pre_trace, post_trace, pre, post, simtime, tau_p)
+
+    # Calculate weights
+    epsilon = 1000.0 / (f_max * tau_p)
+    return w_max * numpy.log((p_ij + (epsilon ** 2)) /
+                             ((p_i[pre] + epsilon) * (p_j[post] + epsilon)))
+
+# Calculate intrinsic bias current of neurons from recorded spike trains in CSR format
+def get_intrinsic_bias(spikes, tau_z, tau_p, f_max, phi, simtime):
+    offsets, times = truncate_spikes(spikes, simtime)
+    p_j = get_neuron_p(ZTrace(offsets, times, tau_z, f_max, simtime), simtime, tau_p)
+
+    epsilon = 1000.0 / (f_max * tau_p)
+    return phi * numpy.log(p_j + epsilon)
+
+# Recalculate a dense weight matrix, in the format HCUConnection.read_results
+# writes, using the connectivity of an existing one and recorded spike trains
+def recalculate_weight_matrix(connectivity, pre_spikes, post_spikes, delay,
+                              tau_zi, tau_zj, tau_p, f_max, w_max, simtime):
+    pre, post = numpy.where(~numpy.isnan(connectivity))
+
+    weights = numpy.empty(connectivity.shape)
+    weights.fill(numpy.nan)
+    weights[pre, post] = get_bcpnn_weights(pre_spikes, post_spikes, pre, post, delay,
+                                           tau_zi, tau_zj, tau_p, f_max, w_max, simtime)
+    return weights
+
+# Recalculate sparse weights, in the format HCUConnection.read_results
+# writes, using the connectivity of existing ones and recorded spike trains
+def recalculate_sparse_weights(connectivity, pre_spikes, post_spikes, delay,
+                               tau_zi, tau_zj, tau_p, f_max, w_max, simtime):
+    weights = numpy.copy(connectivity)
+    weights["weight"] = get_bcpnn_weights(pre_spikes, post_spikes,
+                                          connectivity["pre"], connectivity["post"], delay,
+                                          tau_zi, tau_zj, tau_p, f_max, w_max, simtime)
+    return weights
+
+if __name__ == "__main__":
+    import functools
+    import itertools
+    import network
+
+    from spike_store import SpikeStore
+    from weight_archive import WeightArchive
+    from weight_files import load_sparse_weights, save_sparse_weights
+
+    parser = argparse.ArgumentParser(description="Recalculate BCPNN weights and biases from spikes recorded during training")
+    parser.add_argument("--num_hcus", type=int, default=9, help="How many HCUs is data for")
+    parser.add_argument("--num_mcu_neurons", type=int, default=100, help="How many neurons make up an MCU")
+    parser.add_argument("--num_mcu_per_hcu", type=int, default=10, help="How many MCUs make up each HCU")
+    parser.add_argument("--distance_scale", type=float, default=0.75, help="Distance scale of euclidean HCU delay model")
+    parser.add_argument("--velocity", type=float, default=0.2, help="Velocity of euclidean HCU delay model")
+    parser.add_argument("--tau_p", type=float, default=2000.0, help="Time constant of P traces [ms]")
+    parser.add_argument("--ampa_tau_zi", type=float, default=5.0, help="Presynaptic Z trace time constant of AMPA synapses [ms]")
+    parser.add_argument("--ampa_tau_zj", type=float, default=5.0, help="Postsynaptic Z trace time constant of AMPA synapses and intrinsic plasticity [ms]")
+    parser.add_argument("--nmda_tau_zi", type=float, default=150.0, help="Presynaptic Z trace time constant of NMDA synapses [ms]")
+    parser.add_argument("--nmda_tau_zj", type=float, default=5.0, help="Postsynaptic Z trace time constant of NMDA synapses [ms]")
+    parser.add_argument("--simtime", type=float, help="Duration of training [ms], defaults to time of last spike")
+    parser.add_argument("--archive_name", default="connection_weights_asymmetrical", help="Name of weight archive to take connectivity from")
+    parser.add_argument("--nmda_filename", default="e_e_nmda_asymmetrical", help="Name of trained NMDA weight blocks to take connectivity from")
+    parser.add_argument("--suffix", default="offline", help="Suffix to append to the name of the archive of recalculated weights")
+    parser.add_argument("folder", nargs=1, help="Folder containing training data")
+    args = parser.parse_args()
+
+    folder = args.folder[0]
+    num_excitatory, _, JE, _ = network.scale_parameters(args.num_mcu_per_hcu, args.num_mcu_neurons)
+    grid_size = int(round(args.num_hcus ** 0.5))
+    delay_model = functools.partial(network.euclidean_hcu_delay, grid_size=grid_size,
+                                    distance_scale=args.distance_scale, velocity=args.velocity)
+
+    # Load spikes recorded from each HCU
+    spike_store = SpikeStore("%s/training_spikes" % folder)
+    hcu_spikes = [numpy.column_stack(spike_store.get_spikes("hcu_%u_e" % i)).astype(float)
+                  for i in range(args.num_hcus)]
+    simtime = args.simtime if args.simtime is not None else max(s[:,1].max() for s in hcu_spikes) + 1.0
+    hcu_spikes = [spikes_to_csr(s, num_excitatory) for s in hcu_spikes]
+
+    # Recalculate intrinsic biases, saving them scaled like recorded
+    # biases so they can be loaded using network.load_hcu_bias
+    for i, spikes in enumerate(hcu_spikes):
+        bias = get_intrinsic_bias(spikes, args.ampa_tau_zj, args.tau_p, 20.0, 0.05, simtime)
+        numpy.save("%s/hcu_%u_e_bias_%s.npy" % (folder, i, args.suffix), bias * 1000.0)
+
+    # Open trained weights and archive for recalculated ones
+    trained_archive = WeightArchive("%s/%s.arc" % (folder, args.archive_name))
+    offline_archive = WeightArchive("%s/%s_%s.arc" % (folder, args.archive_name, args.suffix), "w")
+
+    # Loop through HCU connections
+    for c, (i_pre, i_post) in enumerate(itertools.product(range(args.num_hcus), repeat=2)):
+        delay = delay_model(i_pre, i_post)
+        logger.info("Recalculating weights of HCU %u->%u" % (i_pre, i_post))
+
+        # Recalculate AMPA and NMDA weights
+        for name, tau_zi, tau_zj in (("e_e_ampa", args.ampa_tau_zi, args.ampa_tau_zj),
+                                     (args.nmda_filename, args.nmda_tau_zi, args.nmda_tau_zj)):
+            block_name = "connection_%u_%s" % (c, name)
+            connectivity = load_sparse_weights((trained_archive, block_name))
+            weights = recalculate_sparse_weights(connectivity, hcu_spikes[i_pre], hcu_spikes[i_post], delay,
+                                                 tau_zi, tau_zj, args.tau_p, 20.0, JE, simtime)
+            save_sparse_weights((offline_archive, block_name), weights)
+
+    offline_archive.close()
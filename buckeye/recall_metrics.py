@@ -0,0 +1,176 @@
+import numpy
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Bin excitatory spikes, in the format returned by analyse_spikes.combine_e_spikes,
+# into the firing rate [Hz] of each minicolumn during each of a number of trials,
+# given as [start, stop) times of equal duration. Returns array of rates indexed
+# by trial, time bin and minicolumn
+def get_binned_rates(e_spikes, trials, num_hcus, num_mcu_neurons, num_mcu_per_hcu, bin_size=10.0):
+    num_cells_per_mcu = num_mcu_neurons * num_hcus
+
+    trials = numpy.asarray(trials, dtype=float).reshape(-1, 2)
+    trial_duration = trials[0,1] - trials[0,0]
+    assert numpy.allclose(trials[:,1] - trials[:,0], trial_duration), "All trials must have the same duration"
+    num_bins = int(numpy.ceil(trial_duration / bin_size))
+
+    # Determine which minicolumn each spike originates from
+    minicolumn = (e_spikes[:,0] // num_cells_per_mcu).astype(int)
+    times = e_spikes[:,1]
+
+    # Determine which trial each spike is in, ignoring those between trials
+    trial = numpy.searchsorted(trials[:,0], times, side="right") - 1
+    in_trial = (trial >= 0)
+    in_trial[in_trial] = times[in_trial] < trials[trial[in_trial], 1]
+
+    trial = trial[in_trial]
+    minicolumn = minicolumn[in_trial]
+    time_bin = ((times[in_trial] - trials[trial, 0]) // bin_size).astype(int)
+
+    # Count spikes in each trial, bin and minicolumn in a single pass
+    counts = numpy.bincount((((trial * num_bins) + time_bin) * num_mcu_per_hcu) + minicolumn,
+                            minlength=len(trials) * num_bins * num_mcu_per_hcu)
+    counts = counts.reshape((len(trials), num_bins, num_mcu_per_hcu))
+
+    return counts * (1000.0 / bin_size) / float(num_cells_per_mcu)
+
+# Winner-take-all decoding of the active minicolumn in each time bin of each trial.
+# Bins where no minicolumn fires faster than min_rate [Hz] are decoded as -1
+def get_active_minicolumns(rates, min_rate=10.0):
+    active = numpy.argmax(rates, axis=-1)
+    active[numpy.amax(rates, axis=-1) < min_rate] = -1
+    return active
+
+# Split active minicolumns of each trial into runs of time bins with the same
+# active minicolumn. Returns trial, minicolumn, first bin and length of each run
+def get_runs(active):
+    num_trials, num_bins = active.shape
+
+    # Runs start at the beginning of each trial and wherever active minicolumn changes
+    run_start = numpy.ones(active.shape, dtype=bool)
+    run_start[:,1:] = active[:,1:] != active[:,:-1]
+
+    start_indices = numpy.flatnonzero(run_start)
+    lengths = numpy.diff(numpy.append(start_indices, active.size))
+
+    return (start_indices // num_bins, active.flat[start_indices],
+            start_indices % num_bins, lengths)
+
+# Get attractor states i.e. runs of an active minicolumn lasting at least min_dwell_bins.
+# Returns trial, minicolumn, first bin and length of each attractor state
+def get_attractor_states(active, min_dwell_bins=3):
+    trial, minicolumn, start, length = get_runs(active)
+
+    state = (minicolumn >= 0) & (length >= min_dwell_bins)
+    return trial[state], minicolumn[state], start[state], length[state]
+
+# Get sequence of minicolumns visited during each trial, merging repeated visits to
+# a minicolumn which were only interrupted by states too short to count. Returns array
+# with a row of visited minicolumns per trial, padded with -1
+def get_state_sequences(active, min_dwell_bins=3):
+    num_trials = active.shape[0]
+    trial, minicolumn, _, _ = get_attractor_states(active, min_dwell_bins)
+
+    # Keep states which are the first in their trial or are of a different minicolumn to the last
+    keep = numpy.ones(len(trial), dtype=bool)
+    keep[1:] = (trial[1:] != trial[:-1]) | (minicolumn[1:] != minicolumn[:-1])
+    trial = trial[keep]
+    minicolumn = minicolumn[keep]
+
+    # Calculate position of each state within its trial's sequence
+    trial_lengths = numpy.bincount(trial, minlength=num_trials)
+    trial_starts = numpy.cumsum(trial_lengths) - trial_lengths
+    position = numpy.arange(len(trial)) - trial_starts[trial]
+
+    sequences = numpy.empty((num_trials, max(1, trial_lengths.max() if num_trials > 0 else 0)), dtype=int)
+    sequences.fill(-1)
+    sequences[trial, position] = minicolumn
+    return sequences
+
+# Get mean duration [ms] of attractor states and number of transitions between them in each trial
+def get_dwell_statistics(active, bin_size=10.0, min_dwell_bins=3):
+    num_trials = active.shape[0]
+    trial, _, _, length = get_attractor_states(active, min_dwell_bins)
+
+    num_states = numpy.bincount(trial, minlength=num_trials)
+    total_dwell = numpy.bincount(trial, weights=length * bin_size, minlength=num_trials)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        mean_dwell = numpy.where(num_states > 0, total_dwell / num_states, 0.0)
+
+    return mean_dwell, numpy.maximum(num_states - 1, 0)
+
+# Build expected sequence of each cue in a network trained on
+# minicolumns activated in order, wrapping after the last minicolumn
+def get_expected_sequences(cue_minicolumns, num_mcu_per_hcu, length=None):
+    if length is None:
+        length = num_mcu_per_hcu
+
+    cue_minicolumns = numpy.asarray(cue_minicolumns, dtype=int)
+    return (cue_minicolumns[:,numpy.newaxis] + numpy.arange(length)) % num_mcu_per_hcu
+
+# Sequence recall accuracy of each trial: the fraction of its expected sequence
+# which is recalled, in order, from the start of the trial's state sequence
+def get_sequence_accuracy(sequences, expected):
+    expected = numpy.asarray(expected, dtype=int)
+    length = expected.shape[1]
+
+    # Pad sequences to expected length
+    padded = numpy.empty((sequences.shape[0], length), dtype=int)
+    padded.fill(-1)
+    compare_length = min(length, sequences.shape[1])
+    padded[:,:compare_length] = sequences[:,:compare_length]
+
+    # Count length of matching prefix
+    matches = (padded == expected)
+    return numpy.cumprod(matches, axis=1).sum(axis=1) / float(length)
+
+# Score recall in each trial of a batch test
+def score_trials(e_spikes, trials, expected, num_hcus, num_mcu_neurons, num_mcu_per_hcu,
+                 bin_size=10.0, min_rate=10.0, min_dwell_bins=3):
+    rates = get_binned_rates(e_spikes, trials, num_hcus, num_mcu_neurons, num_mcu_per_hcu, bin_size)
+    active = get_active_minicolumns(rates, min_rate)
+    sequences = get_state_sequences(active, min_dwell_bins)
+    mean_dwell, num_transitions = get_dwell_statistics(active, bin_size, min_dwell_bins)
+
+    return {"active": active, "sequences": sequences,
+            "mean_dwell_time": mean_dwell, "num_transitions": num_transitions,
+            "accuracy": get_sequence_accuracy(sequences, expected)}
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from analyse_spikes import combine_e_spikes, load_store_spikes
+    from spike_store import SpikeStore
+
+    parser = argparse.ArgumentParser(description="Score sequence recall in trials of a batch test")
+    parser.add_argument("--num_hcus", type=int, default=9, help="How many HCUs is data for")
+    parser.add_argument("--num_mcu_neurons", type=int, default=100, help="How many neurons make up an MCU")
+    parser.add_argument("--num_mcu_per_hcu", type=int, default=10, help="How many MCUs make up each HCU")
+    parser.add_argument("--bin_size", type=float, default=10.0, help="Size of time bins rates are calculated in [ms]")
+    parser.add_argument("--min_rate", type=float, default=10.0, help="Minimum rate of an active minicolumn [Hz]")
+    parser.add_argument("--min_dwell_bins", type=int, default=3, help="Minimum number of bins an attractor state lasts for")
+    parser.add_argument("--mode", default="asymmetrical", help="Suffix of batch test results")
+    parser.add_argument("folder", nargs=1, help="Folder containing batch test results")
+    args = parser.parse_args()
+
+    folder = args.folder[0]
+    with open("%s/trials_%s.json" % (folder, args.mode), "r") as f:
+        trial_info = json.load(f)
+
+    store = SpikeStore("%s/testing_spikes_batch_%s" % (folder, args.mode))
+    e_spikes = combine_e_spikes([load_store_spikes(store, "hcu_%u_e" % i) for i in range(args.num_hcus)],
+                                args.num_mcu_neurons, args.num_mcu_per_hcu)
+
+    expected = get_expected_sequences(trial_info["cue_minicolumns"], args.num_mcu_per_hcu)
+    scores = score_trials(e_spikes, trial_info["trials"], expected,
+                          args.num_hcus, args.num_mcu_neurons, args.num_mcu_per_hcu,
+                          args.bin_size, args.min_rate, args.min_dwell_bins)
+
+    for i, cue in enumerate(trial_info["cue_minicolumns"]):
+        sequence = [m for m in scores["sequences"][i] if m >= 0]
+        print("Cue %u: accuracy %.2f, mean dwell %.0fms, %u transitions, sequence %s"
+              % (cue, scores["accuracy"][i], scores["mean_dwell_time"][i],
+                 scores["num_transitions"][i], " ".join("%u" % m for m in sequence)))
+    print("Mean accuracy %.2f" % numpy.mean(scores["accuracy"]))
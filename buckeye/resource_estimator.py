@@ -0,0 +1,390 @@
+import itertools
+import logging
+import math
+
+import network
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+# **NOTE** machine and simulator costs are approximations of SpiNN-5 boards
+# running pynn_spinnaker - they should be tuned against mapping logs
+cores_per_chip = 16                     # application cores available on each chip
+chips_per_board = 48
+sdram_per_chip = 117 * 1024 * 1024      # SDRAM available to applications on each chip [bytes]
+
+# Proportion of the cores of allocated boards mapping can actually use
+core_utilisation = 0.75
+
+# Neurons and spike sources simulated on each core
+neurons_per_core = 256
+spike_sources_per_core = 256
+
+# Synaptic events each synapse core can process per second
+static_events_per_core = 2.0E6
+plastic_events_per_core = 0.5E6
+
+# Size of synaptic matrix rows and the synapses within them [bytes]
+# **NOTE** plastic rows also contain the presynaptic BCPNN traces
+static_row_header_bytes = 12
+plastic_row_header_bytes = 28
+static_synapse_bytes = 4
+plastic_synapse_bytes = 8
+
+# Longest delay synaptic rows can represent directly [ms] - spikes with
+# longer delays are re-sent from the synapse core's delay buffer as sub-rows
+max_row_delay = 7.0 * network.dt
+
+# Inhibitory cells generally fire at a low rate
+i_cell_mean_firing_rate = 5.0
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Estimate resources required to train a network as network.train_discrete does.
+# simtime is the duration of each run i.e. of a segment if training is segmented and
+# stim_minicolumns are the same minicolumn stimuli passed to network.train_discrete
+def estimate_training(num_hcu, num_mcu_per_hcu, num_mcu_neurons, delay_model,
+                      simtime, stim_minicolumns, e_cell_mean_firing_rate=4.0,
+                      bias_sampling_interval=None, background_mode="poisson",
+                      background_pool_size=100):
+    # **NOTE** bias is only sampled at the end of each run by default
+    num_bias_samples = 1 if bias_sampling_interval is None else int(math.ceil(simtime / bias_sampling_interval))
+
+    return _estimate(num_hcu, num_mcu_per_hcu, num_mcu_neurons, delay_model,
+                     simtime, stim_minicolumns, e_cell_mean_firing_rate,
+                     plastic=True, wta=False, background_rate=network.background_rate,
+                     num_bias_samples=num_bias_samples, record_membrane=False,
+                     reset_rate=None, background_mode=background_mode,
+                     background_pool_size=background_pool_size)
+
+# Estimate resources required to test a network as network.test_discrete
+# does with the same minicolumn stimuli, stim_minicolumns
+def estimate_testing(num_hcu, num_mcu_per_hcu, num_mcu_neurons, delay_model,
+                     simtime, record_membrane, stim_minicolumns,
+                     e_cell_mean_firing_rate=None, reset_rate=None,
+                     background_mode="poisson", background_pool_size=100):
+    # By default, assume one minicolumn in each HCU is active at 20Hz
+    if e_cell_mean_firing_rate is None:
+        e_cell_mean_firing_rate = 20.0 / float(num_mcu_per_hcu)
+
+    return _estimate(num_hcu, num_mcu_per_hcu, num_mcu_neurons, delay_model,
+                     simtime, stim_minicolumns, e_cell_mean_firing_rate,
+                     plastic=False, wta=True, background_rate=network.background_rate,
+                     num_bias_samples=0, record_membrane=record_membrane,
+                     reset_rate=reset_rate, background_mode=background_mode,
+                     background_pool_size=background_pool_size)
+
+# Estimate cores used to provide background drive in background_mode to each of num_hcu HCUs
+# with populations of the sizes in populations: the cores simulating any background spike
+# sources and the fraction of synapse cores processing the synaptic events they cause
+def estimate_background_cores(num_hcu, populations, background_rate, background_mode, background_pool_size):
+    estimate = ResourceEstimate(num_hcu)
+    synapse_cores = 0.0
+    for h, (p, num_neurons) in itertools.product(range(num_hcu), enumerate(populations)):
+        _add_background_sources(estimate, "%u - %u" % (h, p), num_neurons,
+                                background_mode, background_pool_size)
+        synapse_cores += sum(s.get_synapse_core_load(num_neurons)
+                             for s in _get_background_synapses(num_neurons, background_rate,
+                                                               background_mode, background_pool_size))
+
+    return estimate.num_spike_source_cores + synapse_cores
+
+# Round number of boards up to a size spalloc can allocate:
+# single boards or multiples of three-board triads
+def get_spalloc_num_boards(num_boards):
+    if num_boards <= 1:
+        return 1
+    else:
+        return 3 * int(math.ceil(num_boards / 3.0))
+
+def _estimate(num_hcu, num_mcu_per_hcu, num_mcu_neurons, delay_model,
+              simtime, stim_minicolumns, e_cell_mean_firing_rate,
+              plastic, wta, background_rate, num_bias_samples,
+              record_membrane, reset_rate, background_mode, background_pool_size):
+    num_excitatory, num_inhibitory, _, _ = network.scale_parameters(num_mcu_per_hcu, num_mcu_neurons)
+    num_timesteps = int(math.ceil(simtime / network.dt))
+    num_membrane_samples = int(math.ceil(simtime / 1000.0)) if record_membrane else 0
+
+    # Stimulus spike sources are only built for neurons in stimulated minicolumns
+    num_stim_sources = len(set(int(m) for m, _, _, _ in stim_minicolumns)) * num_mcu_neurons
+
+    # Mean rate of stimulus spike sources and stimulus spikes per HCU in each
+    # run - if stimuli outlast simtime, they are split between several runs
+    stim_duration = max([simtime] + [t + d for _, t, _, d in stim_minicolumns])
+    stim_spikes = sum(rate * duration * 0.001 * num_mcu_neurons
+                      for _, _, rate, duration in stim_minicolumns)
+    stim_rate = (stim_spikes * 1000.0) / (stim_duration * max(1, num_stim_sources))
+    stim_spikes *= simtime / stim_duration
+
+    estimate = ResourceEstimate(num_hcu)
+    for h in range(num_hcu):
+        hcu_name = "%u" % h
+
+        # Synapses onto excitatory cells from background and stimulus spike sources
+        e_synapses = _get_background_synapses(num_excitatory, background_rate,
+                                              background_mode, background_pool_size)
+        if num_stim_sources > 0:
+            e_synapses.append(_SynapseGroup("excitatory", False, num_stim_sources,
+                                            num_stim_sources / float(num_excitatory), stim_rate, network.delay))
+
+        # Plus AMPA and NMDA synapses from excitatory cells of every HCU
+        for i_pre in range(num_hcu):
+            hcu_delay = delay_model(i_pre, h)
+            for receptor in ("excitatory", "excitatory2"):
+                e_synapses.append(_SynapseGroup(receptor, plastic, num_excitatory,
+                                                network.epsilon * num_excitatory,
+                                                e_cell_mean_firing_rate, hcu_delay))
+
+        # Plus any reset spike source
+        if reset_rate is not None:
+            e_synapses.append(_SynapseGroup("inhibitory", False, 1, 1.0, reset_rate, network.delay))
+            estimate.add_spike_source("%s - reset" % hcu_name, 1, 0)
+
+        # If HCU has inhibitory cells, add their synapses onto excitatory cells
+        # and add inhibitory cells themselves along with their background source
+        if wta:
+            e_synapses.append(_SynapseGroup("inhibitory", False, num_inhibitory,
+                                            network.epsilon * num_inhibitory,
+                                            i_cell_mean_firing_rate, network.delay))
+
+            i_synapses = _get_background_synapses(num_inhibitory, background_rate,
+                                                  background_mode, background_pool_size)
+            i_synapses.extend([_SynapseGroup("excitatory", False, num_excitatory, network.epsilon * num_excitatory,
+                                             e_cell_mean_firing_rate, network.delay),
+                               _SynapseGroup("inhibitory", False, num_inhibitory, network.epsilon * num_inhibitory,
+                                             i_cell_mean_firing_rate, network.delay)])
+            estimate.add_neurons("%s - i_cells" % hcu_name, num_inhibitory, i_synapses,
+                                 _get_recording_bytes(num_inhibitory, num_timesteps, 0, 0))
+            _add_background_sources(estimate, "%s - i" % hcu_name, num_inhibitory,
+                                    background_mode, background_pool_size)
+
+        estimate.add_neurons("%s - e_cells" % hcu_name, num_excitatory, e_synapses,
+                             _get_recording_bytes(num_excitatory, num_timesteps,
+                                                  num_bias_samples, num_membrane_samples))
+        _add_background_sources(estimate, "%s - e" % hcu_name, num_excitatory,
+                                background_mode, background_pool_size)
+        if num_stim_sources > 0:
+            estimate.add_spike_source("%s - e_stim" % hcu_name, num_stim_sources, 4 * int(math.ceil(stim_spikes)))
+
+    return estimate
+
+# Synapses providing background drive to each neuron of a population of num_neurons.
+# Each HCU has its own shared pool - even when HCUs are built as a grid - from which
+# each neuron receives network.background_fan_in inputs and background currents need
+# no synapses at all
+def _get_background_synapses(num_neurons, background_rate, background_mode, background_pool_size):
+    if background_mode == "poisson":
+        return [_SynapseGroup("excitatory", False, num_neurons, 1.0, background_rate, network.delay)]
+    elif background_mode == "shared":
+        return [_SynapseGroup("excitatory", False, background_pool_size, network.background_fan_in,
+                              background_rate / float(network.background_fan_in), network.delay)]
+    else:
+        return []
+
+# Add per-HCU share of spike sources providing background drive to a population of num_neurons
+def _add_background_sources(estimate, name, num_neurons, background_mode, background_pool_size):
+    if background_mode == "poisson":
+        estimate.add_spike_source("%s_poisson" % name, num_neurons, 0)
+    elif background_mode == "shared":
+        estimate.add_spike_source("%s_background_pool" % name, background_pool_size, 0)
+
+# Bytes of SDRAM used to record spikes every timestep and bias and membrane voltage samples
+def _get_recording_bytes(num_neurons, num_timesteps, num_bias_samples, num_membrane_samples):
+    spike_bytes = 4 * int(math.ceil(num_neurons / 32.0)) * num_timesteps
+    return spike_bytes + (4 * num_neurons * (num_bias_samples + num_membrane_samples))
+
+# Candidate cluster widths for a population of num_neurons - whole numbers of
+# neuron cores, doubling until a single cluster holds the entire population
+def _get_cluster_widths(num_neurons):
+    for i in itertools.count():
+        width = neurons_per_core * (2 ** i)
+        yield width
+        if width >= num_neurons:
+            return
+
+#------------------------------------------------------------------------------
+# _SynapseGroup
+#------------------------------------------------------------------------------
+# Synapses of one receptor type onto each neuron of a population from a
+# presynaptic population of num_pre neurons firing at pre_rate [Hz]
+class _SynapseGroup(object):
+    def __init__(self, receptor, plastic, num_pre, fan_in, pre_rate, delay):
+        self.receptor = receptor
+        self.plastic = plastic
+        self.num_pre = num_pre
+        self.fan_in = fan_in
+        self.pre_rate = pre_rate
+        self.delay = delay
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # Fraction of a synapse core needed to process events onto a cluster of width
+    def get_synapse_core_load(self, width):
+        events_per_core = plastic_events_per_core if self.plastic else static_events_per_core
+        return (width * self.fan_in * self.pre_rate) / events_per_core
+
+    # Bytes of SDRAM used by synaptic matrix rows onto a cluster of width
+    def get_sdram_bytes(self, width):
+        # Rows contain the synapses each presynaptic neuron makes onto cluster
+        num_synapses = width * self.fan_in
+        row_length = num_synapses / float(self.num_pre)
+
+        # If rows are shorter than a synapse, many presynaptic neurons have no row
+        num_rows = self.num_pre * min(1.0, row_length)
+
+        # Delays too long for rows are represented by an additional delay sub-row
+        if self.delay > max_row_delay:
+            num_rows *= 2
+
+        if self.plastic:
+            return int((num_rows * plastic_row_header_bytes) + (num_synapses * plastic_synapse_bytes))
+        else:
+            return int((num_rows * static_row_header_bytes) + (num_synapses * static_synapse_bytes))
+
+#------------------------------------------------------------------------------
+# ResourceEstimate
+#------------------------------------------------------------------------------
+# Cores and SDRAM required to simulate a network along with
+# the widest cluster of each neuron population which fits on a chip
+class ResourceEstimate(object):
+    def __init__(self, num_hcu):
+        self.num_hcu = num_hcu
+
+        self.num_neuron_cores = 0
+        self.num_synapse_cores = 0
+        self.num_spike_source_cores = 0
+        self.sdram_bytes = 0
+        self.cluster_widths = {}
+        self.unmappable_populations = []
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    # Add population of neurons receiving synapse groups, choosing the widest cluster whose
+    # neuron and synapse cores and SDRAM fit on a single chip, as their synapse cores need
+    # to share SDRAM with the neuron cores they deliver input to
+    def add_neurons(self, name, num_neurons, synapse_groups, recording_bytes):
+        fitting_width = None
+        for width in _get_cluster_widths(num_neurons):
+            clusters = self._get_clusters(num_neurons, width, synapse_groups)
+            if any(c > cores_per_chip or s > sdram_per_chip for c, _, s in clusters):
+                break
+
+            fitting_width = width
+            fitting_clusters = clusters
+
+        # If even a single neuron core's cluster doesn't fit on a chip, record and use it anyway
+        if fitting_width is None:
+            self.unmappable_populations.append(name)
+            fitting_width = neurons_per_core
+            fitting_clusters = self._get_clusters(num_neurons, fitting_width, synapse_groups)
+
+        self.cluster_widths[name] = fitting_width
+        for cores, neuron_cores, sdram_bytes in fitting_clusters:
+            self.num_neuron_cores += neuron_cores
+            self.num_synapse_cores += cores - neuron_cores
+            self.sdram_bytes += sdram_bytes
+
+        self.sdram_bytes += recording_bytes
+
+    def add_spike_source(self, name, num_sources, sdram_bytes):
+        self.num_spike_source_cores += int(math.ceil(num_sources / float(spike_sources_per_core)))
+        self.sdram_bytes += sdram_bytes
+
+    # Get widest cluster width which fits on a chip for
+    # populations of excitatory cells across all HCUs
+    def get_e_cell_cluster_width(self):
+        return min(w for n, w in self.cluster_widths.items() if n.endswith("e_cells"))
+
+    # Keyword arguments to pass through network.train_discrete
+    # and network.test_discrete to request and map a machine
+    def get_spinnaker_kwargs(self):
+        return {"spalloc_num_boards": self.num_boards,
+                "e_cell_max_cluster_width": self.get_e_cell_cluster_width()}
+
+    def log(self):
+        logger.info("Estimated %u neuron cores, %u synapse cores and %u spike source cores"
+                    % (self.num_neuron_cores, self.num_synapse_cores, self.num_spike_source_cores))
+        logger.info("Estimated %.1fMiB SDRAM, requiring %u chips on %u boards (e cell cluster width %u)"
+                    % (self.sdram_bytes / (1024.0 * 1024.0), self.num_chips,
+                       self.num_boards, self.get_e_cell_cluster_width()))
+
+        if len(self.unmappable_populations) > 0:
+            logger.warning("Clusters of %u populations will not fit on a chip e.g. %s"
+                           % (len(self.unmappable_populations), self.unmappable_populations[0]))
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    # Get total cores, neuron cores and SDRAM bytes of each
+    # cluster when population is split into clusters of width
+    def _get_clusters(self, num_neurons, width, synapse_groups):
+        clusters = []
+        for start in range(0, num_neurons, width):
+            cluster_width = min(width, num_neurons - start)
+            neuron_cores = int(math.ceil(cluster_width / float(neurons_per_core)))
+
+            # Each receptor type is processed by its own synapse cores
+            receptor_loads = {}
+            sdram_bytes = 0
+            for s in synapse_groups:
+                receptor_loads[s.receptor] = receptor_loads.get(s.receptor, 0.0) + s.get_synapse_core_load(cluster_width)
+                sdram_bytes += s.get_sdram_bytes(cluster_width)
+
+            synapse_cores = sum(max(1, int(math.ceil(l))) for l in receptor_loads.values())
+            clusters.append((neuron_cores + synapse_cores, neuron_cores, sdram_bytes))
+
+        return clusters
+
+    #-------------------------------------------------------------------
+    # Properties
+    #-------------------------------------------------------------------
+    @property
+    def num_cores(self):
+        return self.num_neuron_cores + self.num_synapse_cores + self.num_spike_source_cores
+
+    @property
+    def num_chips(self):
+        core_chips = self.num_cores / (cores_per_chip * core_utilisation)
+        sdram_chips = self.sdram_bytes / float(sdram_per_chip)
+        return int(math.ceil(max(core_chips, sdram_chips)))
+
+    @property
+    def num_boards(self):
+        return get_spalloc_num_boards(int(math.ceil(self.num_chips / float(chips_per_board))))
+
+if __name__ == "__main__":
+    import argparse
+
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Estimate SpiNNaker resources required to simulate a network")
+    parser.add_argument("--hcu_grid_size", type=int, default=1, help="Width of square grid of HCUs")
+    parser.add_argument("--num_mcu_per_hcu", type=int, default=10, help="How many MCUs make up each HCU")
+    parser.add_argument("--num_mcu_neurons", type=int, default=100, help="How many neurons make up an MCU")
+    parser.add_argument("--phase", choices=["train", "test"], default="train", help="Whether to estimate training or testing")
+    parser.add_argument("--simtime", type=float, default=5000.0, help="Duration of each run [ms]")
+    parser.add_argument("--background_mode", choices=network.background_modes, default="poisson", help="How background drive is provided to neurons")
+    parser.add_argument("--background_pool_size", type=int, default=100, help="Size of shared background pool per HCU")
+    args = parser.parse_args()
+
+    # Use same delay model and stimuli as sequence experiment
+    from experiment_sequence import get_delay_model, get_testing_stimuli, get_training_stimuli
+    delay_model = get_delay_model(args.hcu_grid_size)
+
+    if args.phase == "train":
+        estimate = estimate_training(args.hcu_grid_size ** 2, args.num_mcu_per_hcu, args.num_mcu_neurons,
+                                     delay_model, args.simtime, get_training_stimuli()[0],
+                                     background_mode=args.background_mode,
+                                     background_pool_size=args.background_pool_size)
+    else:
+        estimate = estimate_testing(args.hcu_grid_size ** 2, args.num_mcu_per_hcu, args.num_mcu_neurons,
+                                    delay_model, args.simtime, True, get_testing_stimuli()[0],
+                                    background_mode=args.background_mode,
+                                    background_pool_size=args.background_pool_size)
+    estimate.log()
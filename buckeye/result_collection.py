@@ -0,0 +1,47 @@
+import logging
+import os
+import time
+
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Run result writers returned by train_discrete and test_discrete on a bounded
+# pool of threads so readback from the simulator overlaps serialisation and disk
+# IO. Each task is a writer and the filename or SpikeStore it should write to.
+# Everything is synced to disk before returning so simulation can safely be ended
+def collect_results(tasks, num_threads=4):
+    start_time = time.time()
+
+    def run_task(task):
+        writer, target = task
+        writer(target)
+
+        # If target is a file, sync it to disk
+        if isinstance(target, str):
+            sync_file(target)
+
+    # Run writers, logging progress as each completes
+    pool = ThreadPool(num_threads)
+    try:
+        for i, _ in enumerate(pool.imap_unordered(run_task, tasks)):
+            logger.info("Collected %u/%u results" % (i + 1, len(tasks)))
+    finally:
+        pool.close()
+        pool.join()
+
+    # Sync any stores written to
+    stores = set(id(t) for _, t in tasks if hasattr(t, "sync"))
+    for _, target in tasks:
+        if id(target) in stores:
+            target.sync()
+            stores.remove(id(target))
+
+    logger.info("Collected %u results in %.1fs" % (len(tasks), time.time() - start_time))
+
+def sync_file(filename):
+    with open(filename, "rb") as f:
+        os.fsync(f.fileno())
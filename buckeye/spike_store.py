@@ -0,0 +1,199 @@
+import json
+import logging
+import numpy
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# SpikeStore
+#------------------------------------------------------------------------------
+# Append-only, columnar on-disk store of recorded spikes. Each named
+# recording (typically a population of one HCU) is a pair of flat binary
+# files of int32 neuron ids and float32 times [ms], written in chunks which
+# are sorted by neuron id and then time. index.json records the number of
+# neurons in each recording and the extent and time window of each chunk
+# so recordings can be memory-mapped and sliced in time without parsing.
+# Recordings can be appended to concurrently from multiple threads
+class SpikeStore(object):
+    id_dtype = numpy.dtype(numpy.int32)
+    time_dtype = numpy.dtype(numpy.float32)
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        # Load index
+        index_filename = os.path.join(self.folder, "index.json")
+        if os.path.exists(index_filename):
+            with open(index_filename, "r") as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+        # Discard any spikes appended after index was last written
+        for name, entry in self.index.items():
+            self._truncate_files(name, entry["num_spikes"])
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def append(self, name, ids, times, num_neurons, t_start, t_stop):
+        ids = numpy.asarray(ids, dtype=self.id_dtype)
+        times = numpy.asarray(times, dtype=self.time_dtype)
+        assert len(ids) == len(times), "Each spike requires a neuron id and a time"
+
+        # Sort chunk by neuron id and then time
+        order = numpy.lexsort((times, ids))
+
+        with self._lock:
+            self._append(name, ids[order], times[order], num_neurons, t_start, t_stop)
+
+        logger.debug("Appended %u spikes from %gms to %gms to '%s'" % (len(ids), t_start, t_stop, name))
+
+    # Get memory-mapped ids and times of spikes in recording
+    # emitted in chunks which overlap [t_start, t_stop)
+    def get_spikes(self, name, t_start=None, t_stop=None):
+        entry = self.index[name]
+        chunks = [c for c in entry["chunks"]
+                  if (t_start is None or c[3] > t_start) and (t_stop is None or c[2] < t_stop)]
+
+        if len(chunks) == 0 or entry["num_spikes"] == 0:
+            return (numpy.empty(0, dtype=self.id_dtype),
+                    numpy.empty(0, dtype=self.time_dtype))
+
+        # Chunks are contiguous so slice out spikes from first to last
+        first_spike = chunks[0][0]
+        end_spike = chunks[-1][0] + chunks[-1][1]
+
+        ids_filename, times_filename = self._get_filenames(name)
+        ids = numpy.memmap(ids_filename, dtype=self.id_dtype, mode="r",
+                           shape=(entry["num_spikes"],))[first_spike:end_spike]
+        times = numpy.memmap(times_filename, dtype=self.time_dtype, mode="r",
+                             shape=(entry["num_spikes"],))[first_spike:end_spike]
+
+        # If chunks extend beyond window, mask out spikes outside it
+        if ((t_start is not None and chunks[0][2] < t_start)
+            or (t_stop is not None and chunks[-1][3] > t_stop)):
+            mask = numpy.ones(len(times), dtype=bool)
+            if t_start is not None:
+                mask &= (times >= t_start)
+            if t_stop is not None:
+                mask &= (times < t_stop)
+            return ids[mask], times[mask]
+        else:
+            return ids, times
+
+    def get_num_neurons(self, name):
+        return self.index[name]["num_neurons"]
+
+    def get_names(self):
+        return sorted(self.index.keys())
+
+    # Remove all spikes emitted at or after time,
+    # e.g. before re-recording a simulation from time
+    def truncate(self, time):
+        with self._lock:
+            for name, entry in self.index.items():
+                entry["chunks"] = [c for c in entry["chunks"] if c[2] < time]
+                entry["num_spikes"] = sum(c[1] for c in entry["chunks"])
+                self._truncate_files(name, entry["num_spikes"])
+
+                # If last remaining chunk extends beyond time, rewrite it without the later spikes
+                if len(entry["chunks"]) > 0 and entry["chunks"][-1][3] > time:
+                    self._truncate_last_chunk(name, entry, time)
+
+            self._write_index()
+
+    # Sync all recordings and index to disk
+    def sync(self):
+        with self._lock:
+            for name in self.index:
+                for filename in self._get_filenames(name):
+                    if os.path.exists(filename):
+                        with open(filename, "rb") as f:
+                            os.fsync(f.fileno())
+
+            index_filename = os.path.join(self.folder, "index.json")
+            if os.path.exists(index_filename):
+                with open(index_filename, "rb") as f:
+                    os.fsync(f.fileno())
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _append(self, name, ids, times, num_neurons, t_start, t_stop):
+        entry = self.index.setdefault(name, {"num_neurons": num_neurons,
+                                             "num_spikes": 0, "chunks": []})
+        assert entry["num_neurons"] == num_neurons, "Recording '%s' has %u neurons" % (name, entry["num_neurons"])
+
+        # Append spikes to column files
+        ids_filename, times_filename = self._get_filenames(name)
+        with open(ids_filename, "ab") as f:
+            ids.tofile(f)
+        with open(times_filename, "ab") as f:
+            times.tofile(f)
+
+        # Only then add chunk to index
+        entry["chunks"].append([entry["num_spikes"], len(ids), float(t_start), float(t_stop)])
+        entry["num_spikes"] += len(ids)
+        self._write_index()
+
+    def _truncate_last_chunk(self, name, entry, time):
+        first_spike, num_spikes, t_start, _ = entry["chunks"][-1]
+        if num_spikes == 0:
+            entry["chunks"][-1][3] = float(time)
+            return
+
+        ids, times = [numpy.array(numpy.memmap(f, dtype=d, mode="r", shape=(entry["num_spikes"],))[first_spike:])
+                      for f, d in zip(self._get_filenames(name), (self.id_dtype, self.time_dtype))]
+        keep = (times < time)
+
+        self._truncate_files(name, first_spike)
+        entry["chunks"].pop()
+        entry["num_spikes"] = first_spike
+        self._append(name, ids[keep], times[keep], entry["num_neurons"], t_start, time)
+
+    def _get_filenames(self, name):
+        return (os.path.join(self.folder, "%s_ids.bin" % name),
+                os.path.join(self.folder, "%s_times.bin" % name))
+
+    def _truncate_files(self, name, num_spikes):
+        for filename, dtype in zip(self._get_filenames(name), (self.id_dtype, self.time_dtype)):
+            if os.path.exists(filename) and os.path.getsize(filename) > num_spikes * dtype.itemsize:
+                with open(filename, "r+b") as f:
+                    f.truncate(num_spikes * dtype.itemsize)
+
+    def _write_index(self):
+        # Write to temporary file and rename so index is never partially written
+        handle, temp_filename = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(self.index, f)
+        os.rename(temp_filename, os.path.join(self.folder, "index.json"))
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Convert neo spike trains into flat arrays of neuron ids and times
+def get_spiketrain_arrays(spiketrains):
+    if len(spiketrains) == 0:
+        return numpy.empty(0, dtype=int), numpy.empty(0)
+
+    lengths = [len(s) for s in spiketrains]
+    ids = numpy.repeat([s.annotations["source_index"] for s in spiketrains], lengths)
+    times = numpy.concatenate([numpy.asarray(s.magnitude, dtype=float) for s in spiketrains])
+    return ids, times
+
+# Slice spikes of recording into trials, given as [start, stop) times,
+# returning the ids and times, relative to its start, of each trial's spikes
+def get_trial_spikes(store, name, trials):
+    trial_spikes = []
+    for start, stop in trials:
+        ids, times = store.get_spikes(name, start, stop)
+        trial_spikes.append((ids, times - start))
+    return trial_spikes
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import numpy
+import os
+import tempfile
+import time
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# StimulusCache
+#------------------------------------------------------------------------------
+# On-disk cache of CSR-format stimulus spike trains, keyed by a hash of
+# everything that determines them. Each entry is a pair of .npy files
+# which are loaded memory-mapped and entries are evicted, least-recently
+# used first, once the cache grows beyond max_bytes. The cache may be shared
+# between processes so entries used within the last grace_period seconds,
+# which another process may be part way through loading, are never evicted
+class StimulusCache(object):
+    def __init__(self, folder, max_bytes=2 * 1024 ** 3, grace_period=60.0):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.grace_period = grace_period
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def load(self, key):
+        offsets_filename, times_filename = self._get_filenames(key)
+
+        # Touch files before loading them so they are treated as recently
+        # used and can't be evicted within the grace period. If either file
+        # is missing or, regardless, gets evicted before it is loaded, miss
+        try:
+            os.utime(offsets_filename, None)
+            os.utime(times_filename, None)
+            entry = (numpy.load(offsets_filename, mmap_mode="r"),
+                     numpy.load(times_filename, mmap_mode="r"))
+        except (IOError, OSError):
+            logger.debug("Stimulus cache miss for %s" % key)
+            return None
+
+        logger.debug("Stimulus cache hit for %s" % key)
+        return entry
+
+    def store(self, key, offsets, times):
+        # Write times before offsets so an entry is only
+        # visible once both of its files are complete
+        offsets_filename, times_filename = self._get_filenames(key)
+        self._write_atomic(times_filename, times)
+        self._write_atomic(offsets_filename, offsets)
+
+        # Evict old entries if cache has grown too large
+        self._evict()
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _get_filenames(self, key):
+        return (os.path.join(self.folder, "%s_offsets.npy" % key),
+                os.path.join(self.folder, "%s_times.npy" % key))
+
+    def _write_atomic(self, filename, array):
+        # Write to temporary file in cache folder and then rename over target
+        handle, temp_filename = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(handle, "wb") as f:
+            numpy.save(f, array)
+        os.rename(temp_filename, filename)
+
+    def _evict(self):
+        # Group cache files into entries, skipping any
+        # files another process evicts while they're listed
+        entries = {}
+        for f in os.listdir(self.folder):
+            if f.endswith("_offsets.npy") or f.endswith("_times.npy"):
+                path = os.path.join(self.folder, f)
+                key = f.rsplit("_", 1)[0]
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                size, last_used = entries.get(key, (0, 0.0))
+                entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+
+        total_bytes = sum(size for size, _ in entries.values())
+
+        # Remove least-recently used entries, last used before the grace period, until cache fits
+        evict_before = time.time() - self.grace_period
+        for key, (size, last_used) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total_bytes <= self.max_bytes or last_used >= evict_before:
+                break
+
+            logger.debug("Evicting %u byte stimulus cache entry %s" % (size, key))
+            for filename in self._get_filenames(key):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+            total_bytes -= size
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Build cache key from the stimulus schedule, seed and HCU geometry
+def get_stimulus_key(stim_minicolumns, seed, num_hcu, num_excitatory, num_mcu_per_hcu):
+    schedule = numpy.ascontiguousarray(stim_minicolumns, dtype=numpy.float64).reshape(-1, 4)
+
+    key_hash = hashlib.sha1()
+    key_hash.update(schedule.tobytes())
+    key_hash.update(("%u,%u,%u,%u" % (seed, num_hcu, num_excitatory, num_mcu_per_hcu)).encode("ascii"))
+    return key_hash.hexdigest()
@@ -0,0 +1,103 @@
+import logging
+import numpy
+
+import recall_metrics
+
+from analyse_spikes import combine_e_spikes, load_store_spikes
+
+logger = logging.getLogger()
+
+# Stop conditions are functions of the SpikeStore a chunked test is being
+# recorded to and the current simulation time [ms] which return True when
+# the simulation can stop early. Each is evaluated after spikes emitted during
+# a chunk have been flushed so only considers spikes emitted before time
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Stop once every minicolumn has been active for at least min_dwell_bins since start_time.
+# Minicolumns visited so far and the run of bins the last chunk ended with are kept
+# between calls so only the bins emitted since the last call need to be decoded
+def all_minicolumns_visited(num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time=0.0,
+                            bin_size=10.0, min_rate=10.0, min_dwell_bins=3):
+    state = {"decoded_time": start_time, "visited": set(), "run_minicolumn": -1, "run_length": 0}
+
+    def condition(store, time):
+        active = _get_active_minicolumns(store, state["decoded_time"], time, num_hcus, num_mcu_neurons,
+                                         num_mcu_per_hcu, bin_size, min_rate)
+        if active is None:
+            return False
+        state["decoded_time"] += len(active) * bin_size
+
+        # If the first run of new bins continues the run the previous bins ended with, extend it
+        _, minicolumn, _, length = recall_metrics.get_runs(active[numpy.newaxis,:])
+        if minicolumn[0] == state["run_minicolumn"]:
+            length[0] += state["run_length"]
+        state["run_minicolumn"] = minicolumn[-1]
+        state["run_length"] = length[-1]
+
+        state["visited"].update(int(m) for m in minicolumn[(minicolumn >= 0) & (length >= min_dwell_bins)])
+        logger.debug("%u/%u minicolumns visited by %gms" % (len(state["visited"]), num_mcu_per_hcu, time))
+        return len(state["visited"]) == num_mcu_per_hcu
+
+    return condition
+
+# Stop once no excitatory neuron has spiked for duration ms after start_time
+# e.g. the time of the cue, before which the network may be silent anyway
+def network_silent(duration, num_hcus, start_time):
+    def condition(store, time):
+        window_start = time - duration
+        if window_start < start_time:
+            return False
+
+        num_spikes = sum(len(store.get_spikes("hcu_%u_e" % i, window_start, time)[0])
+                         for i in range(num_hcus))
+        return num_spikes == 0
+
+    return condition
+
+# Stop once the same minicolumn has been active for all of the last duration ms after start_time
+def attractor_locked(duration, num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time=0.0,
+                     bin_size=10.0, min_rate=10.0):
+    def condition(store, time):
+        window_start = time - duration
+        if window_start < start_time:
+            return False
+
+        active = _get_active_minicolumns(store, window_start, time, num_hcus, num_mcu_neurons,
+                                         num_mcu_per_hcu, bin_size, min_rate)
+        return active is not None and active[0] >= 0 and numpy.all(active == active[0])
+
+    return condition
+
+# Stop once any of conditions would
+def any_of(*conditions):
+    def condition(store, time):
+        return any(c(store, time) for c in conditions)
+
+    return condition
+
+# Stop a sequence recall test once recall has completed - every minicolumn has been
+# visited, the network has fallen silent or it is locked in a single attractor
+def recall_complete(num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time=0.0,
+                    silent_duration=500.0, locked_duration=1000.0):
+    return any_of(all_minicolumns_visited(num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time),
+                  network_silent(silent_duration, num_hcus, start_time),
+                  attractor_locked(locked_duration, num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time))
+
+# Decode active minicolumn in each whole bin between t_start and t_stop
+# from spikes in store, returning None if window doesn't contain a bin
+def _get_active_minicolumns(store, t_start, t_stop, num_hcus, num_mcu_neurons,
+                            num_mcu_per_hcu, bin_size, min_rate):
+    num_bins = int((t_stop - t_start) // bin_size)
+    if num_bins <= 0:
+        return None
+
+    t_stop = t_start + (num_bins * bin_size)
+    e_spikes = combine_e_spikes([load_store_spikes(store, "hcu_%u_e" % i, t_start, t_stop)
+                                 for i in range(num_hcus)],
+                                num_mcu_neurons, num_mcu_per_hcu)
+
+    rates = recall_metrics.get_binned_rates(e_spikes, [(t_start, t_stop)], num_hcus,
+                                            num_mcu_neurons, num_mcu_per_hcu, bin_size)
+    return recall_metrics.get_active_minicolumns(rates, min_rate)[0]
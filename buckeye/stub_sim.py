@@ -0,0 +1,215 @@
+# No-op implementation of the subset of the PyNN API (and the
+# pynn_spinnaker_bcpnn extensions) used by network.py. Networks can be built
+# exactly as they would be for a real simulator but nothing is simulated:
+# calls are only counted and projections calculate how many synapses they
+# would have so the host-side cost of building networks can be measured.
+# Like numpy_sim, this module provides both the simulator and BCPNN model
+# namespaces so can be used as network.select_backend("stub")
+import collections
+import logging
+
+logger = logging.getLogger()
+
+# Number of calls made to each part of the API since setup
+calls = collections.Counter()
+
+#------------------------------------------------------------------------------
+# Cell types
+#------------------------------------------------------------------------------
+class _CellType(object):
+    def __init__(self, **parameters):
+        calls[type(self).__name__] += 1
+        self.parameters = parameters
+
+class IF_curr_exp(_CellType):
+    pass
+
+class IF_curr_dual_exp(_CellType):
+    pass
+
+class IF_curr_ca2_adaptive_dual_exp(_CellType):
+    pass
+
+class SpikeSourcePoisson(_CellType):
+    pass
+
+class SpikeSourceArray(_CellType):
+    pass
+
+#------------------------------------------------------------------------------
+# Synapse types
+#------------------------------------------------------------------------------
+class StaticSynapse(object):
+    def __init__(self, weight=0.0, delay=None):
+        calls["StaticSynapse"] += 1
+        self.weight = weight
+        self.delay = delay
+
+class BCPNNSynapse(object):
+    def __init__(self, **parameters):
+        calls["BCPNNSynapse"] += 1
+        self.parameters = parameters
+
+#------------------------------------------------------------------------------
+# Connectors
+#------------------------------------------------------------------------------
+# Connectors calculate the number of synapses they would build
+# between populations without generating their connectivity
+class OneToOneConnector(object):
+    def __init__(self):
+        calls["OneToOneConnector"] += 1
+
+    def get_num_synapses(self, num_pre, num_post):
+        return min(num_pre, num_post)
+
+class AllToAllConnector(object):
+    def __init__(self, allow_self_connections=True):
+        calls["AllToAllConnector"] += 1
+
+    def get_num_synapses(self, num_pre, num_post):
+        return num_pre * num_post
+
+class FixedProbabilityConnector(object):
+    def __init__(self, p_connect, allow_self_connections=True, rng=None):
+        calls["FixedProbabilityConnector"] += 1
+        self.p_connect = p_connect
+
+    # **NOTE** expected number of synapses
+    def get_num_synapses(self, num_pre, num_post):
+        return int(round(self.p_connect * num_pre * num_post))
+
+class FixedNumberPreConnector(object):
+    def __init__(self, n, allow_self_connections=True, with_replacement=False, rng=None):
+        calls["FixedNumberPreConnector"] += 1
+        self.n = n
+
+    def get_num_synapses(self, num_pre, num_post):
+        return self.n * num_post
+
+class FromListConnector(object):
+    def __init__(self, conn_list):
+        calls["FromListConnector"] += 1
+        self.conn_list = conn_list
+
+    def get_num_synapses(self, num_pre, num_post):
+        return len(self.conn_list)
+
+#------------------------------------------------------------------------------
+# Current sources
+#------------------------------------------------------------------------------
+class NoisyCurrentSource(object):
+    def __init__(self, mean=0.0, stdev=1.0, start=0.0, stop=None, dt=None):
+        calls["NoisyCurrentSource"] += 1
+
+    def inject_into(self, cells):
+        cells.inject(self)
+
+#------------------------------------------------------------------------------
+# SpiNNakerConfig
+#------------------------------------------------------------------------------
+class SpiNNakerConfig(object):
+    def __init__(self):
+        self.mean_firing_rate = None
+        self.max_cluster_width = None
+        self.flush_time = None
+
+#------------------------------------------------------------------------------
+# Population
+#------------------------------------------------------------------------------
+class Population(object):
+    def __init__(self, size, cellclass, cellparams=None, label=None):
+        calls["Population"] += 1
+        self.size = size
+        self.celltype = cellclass
+        self.label = label
+        self.recorded = {}
+        self.spinnaker_config = SpiNNakerConfig()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, selector):
+        return PopulationView(self, selector)
+
+    def initialize(self, **initial_values):
+        calls["Population.initialize"] += 1
+
+    def inject(self, current_source):
+        calls["Population.inject"] += 1
+
+    def record(self, variables, sampling_interval=None, to_file=None):
+        calls["Population.record"] += 1
+        self.recorded[variables] = sampling_interval
+
+#------------------------------------------------------------------------------
+# PopulationView
+#------------------------------------------------------------------------------
+class PopulationView(object):
+    def __init__(self, parent, selector, label=None):
+        calls["PopulationView"] += 1
+        self.parent = parent
+        self.size = len(range(parent.size)[selector])
+        self.label = label
+
+    def __len__(self):
+        return self.size
+
+#------------------------------------------------------------------------------
+# Assembly
+#------------------------------------------------------------------------------
+class Assembly(object):
+    def __init__(self, *populations, **kwargs):
+        calls["Assembly"] += 1
+        self.populations = list(populations)
+        self.label = kwargs.get("label", None)
+        self.size = sum(len(p) for p in self.populations)
+
+    def __len__(self):
+        return self.size
+
+#------------------------------------------------------------------------------
+# Projection
+#------------------------------------------------------------------------------
+class Projection(object):
+    def __init__(self, presynaptic_population, postsynaptic_population,
+                 connector, synapse_type=None, receptor_type="excitatory",
+                 label=None):
+        calls["Projection"] += 1
+        self.pre = presynaptic_population
+        self.post = postsynaptic_population
+        self.connector = connector
+        self.synapse_type = synapse_type
+        self.receptor_type = receptor_type
+        self.label = label
+
+        self.num_synapses = connector.get_num_synapses(len(self.pre), len(self.post))
+
+    def __len__(self):
+        return self.num_synapses
+
+    def size(self):
+        return self.num_synapses
+
+#------------------------------------------------------------------------------
+# Simulator control
+#------------------------------------------------------------------------------
+_time = 0.0
+
+def setup(timestep=0.1, min_delay=0.1, max_delay=10.0, **extra_params):
+    global _time
+    calls.clear()
+    calls["setup"] += 1
+    _time = 0.0
+    return 0
+
+def run(simtime):
+    global _time
+    calls["run"] += 1
+    _time += simtime
+    return _time
+
+def end():
+    calls["end"] += 1
+
+def get_current_time():
+    return _time
@@ -0,0 +1,263 @@
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import traceback
+
+import experiment_sequence
+import network
+import stop_conditions
+
+from stimulus_cache import StimulusCache
+
+logger = logging.getLogger()
+
+# Parameters which determine the result of training - test
+# jobs which only differ in other parameters share a trained network
+training_params = ("symmetrical", "tau_p", "hcu_grid_size",
+                   "num_mcu_per_hcu", "num_mcu_neurons")
+
+# Default values for parameters not specified in a grid
+default_params = {"symmetrical": False, "tau_p": 2000,
+                  "hcu_grid_size": 1, "num_mcu_per_hcu": 10,
+                  "num_mcu_neurons": 100, "record_membrane": False}
+
+# Default testing parameters for each training mode
+default_asymmetrical_test_params = {"i_alpha": 0.15, "gain_per_hcu": 0.546328125}
+default_symmetrical_test_params = {"i_alpha": 0.7, "gain_per_hcu": 1.3}
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Expand a dictionary mapping parameter names to lists of
+# values into a list of dictionaries, one per combination
+def expand_grid(grid):
+    names = sorted(grid.keys())
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[n] for n in names])]
+
+# Build stable key for a set of job parameters
+def get_job_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("ascii")).hexdigest()[:16]
+
+# Split full test job parameters into training and testing parameters
+def get_job_params(params):
+    # Apply defaults
+    full_params = dict(default_params)
+    full_params.update(params)
+
+    # Apply mode-specific testing defaults
+    test_defaults = (default_symmetrical_test_params if full_params["symmetrical"]
+                     else default_asymmetrical_test_params)
+    for n, v in test_defaults.items():
+        full_params.setdefault(n, v)
+
+    train_params = {n: full_params[n] for n in training_params}
+    return train_params, full_params
+
+def load_index(root):
+    index_filename = os.path.join(root, "index.json")
+    if not os.path.exists(index_filename):
+        return {}
+
+    with open(index_filename, "r") as f:
+        return json.load(f)
+
+def save_index(root, index):
+    # Write to temporary file and rename so an interrupted
+    # sweep never leaves a partially written index behind
+    handle, temp_filename = tempfile.mkstemp(dir=root, suffix=".tmp")
+    with os.fdopen(handle, "w") as f:
+        json.dump(index, f, indent=4, sort_keys=True)
+    os.rename(temp_filename, os.path.join(root, "index.json"))
+
+# Find completed jobs in sweep whose parameters match all criteria
+def query(root, kind="test", **criteria):
+    return [(os.path.join(root, entry["folder"]), entry["params"])
+            for entry in load_index(root).values()
+            if entry["kind"] == kind and entry["status"] == "complete"
+            and all(entry["params"].get(n) == v for n, v in criteria.items())]
+
+# Select simulator backend in worker processes
+def _init_worker(backend):
+    if backend is not None:
+        network.select_backend(backend)
+
+def _run_job(job):
+    key, kind, params, folder, training_folder, stim_seed, stim_cache_folder, segment_duration, early_stop, setup_kwargs = job
+
+    try:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        stim_cache = (None if stim_cache_folder is None
+                      else StimulusCache(stim_cache_folder))
+
+        if kind == "train":
+            mode = (experiment_sequence.Mode.train_symmetrical if params["symmetrical"]
+                    else experiment_sequence.Mode.train_asymmetrical)
+            experiment_sequence.train(folder, mode, params["tau_p"], params["hcu_grid_size"],
+                                      params["num_mcu_per_hcu"], params["num_mcu_neurons"],
+                                      stim_seed=stim_seed, stim_cache=stim_cache,
+                                      segment_duration=segment_duration,
+                                      checkpoint_folder=os.path.join(folder, "checkpoint"),
+                                      **setup_kwargs)
+        else:
+            mode = (experiment_sequence.Mode.test_symmetrical if params["symmetrical"]
+                    else experiment_sequence.Mode.test_asymmetrical)
+
+            # If early stopping is enabled, stop once recall following cue 100ms into test is complete
+            stop_condition = (stop_conditions.recall_complete(params["hcu_grid_size"] ** 2, params["num_mcu_neurons"],
+                                                              params["num_mcu_per_hcu"], start_time=100.0)
+                              if early_stop else None)
+
+            experiment_sequence.test(training_folder, folder, mode,
+                                     params["gain_per_hcu"], params["i_alpha"],
+                                     params["hcu_grid_size"], params["num_mcu_per_hcu"],
+                                     params["num_mcu_neurons"], params["record_membrane"],
+                                     stim_seed=stim_seed, stim_cache=stim_cache,
+                                     stop_condition=stop_condition, **setup_kwargs)
+        return key, None
+    except Exception:
+        return key, traceback.format_exc()
+
+#------------------------------------------------------------------------------
+# Sweep
+#------------------------------------------------------------------------------
+# Runs train and test jobs for every combination of parameters in a
+# grid using a pool of worker processes. Each job writes to its own folder
+# within root and progress is recorded in root/index.json so interrupted
+# or budget-limited sweeps can be resumed by running them again. Training
+# is checkpointed every segment_duration ms so completed training isn't
+# repeated and, on backends which can save their state, failed training jobs
+# resume from their last segment rather than restarting from zero.
+# With early_stop, test jobs stop simulating as soon as recall is complete
+class Sweep(object):
+    def __init__(self, root, num_workers=1, max_jobs=None, backend=None,
+                 stim_seed=1, stim_cache_folder="stimulus_cache",
+                 segment_duration=None, early_stop=False, **setup_kwargs):
+        self.root = root
+        self.num_workers = num_workers
+        self.max_jobs = max_jobs
+        self.backend = backend
+        self.stim_seed = stim_seed
+        self.stim_cache_folder = stim_cache_folder
+        self.segment_duration = segment_duration
+        self.early_stop = early_stop
+        self.setup_kwargs = setup_kwargs
+
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+        self.index = load_index(self.root)
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def run(self, grid):
+        # Build list of test jobs and the training jobs they depend on
+        train_jobs = {}
+        test_jobs = {}
+        for params in expand_grid(grid):
+            train_params, test_params = get_job_params(params)
+            train_key = get_job_key(train_params)
+            test_key = get_job_key(test_params)
+
+            train_jobs[train_key] = train_params
+            test_jobs[test_key] = (test_params, train_key)
+
+        # Register any new jobs in index
+        for key, params in train_jobs.items():
+            self._add_job(key, "train", params)
+        for key, (params, train_key) in test_jobs.items():
+            self._add_job(key, "test", params, train_key)
+        save_index(self.root, self.index)
+
+        budget = self.max_jobs
+
+        # Train any networks which aren't already trained
+        pending = [k for k in sorted(train_jobs) if not self._is_complete(k)]
+        logger.info("%u/%u training jobs to run" % (len(pending), len(train_jobs)))
+        budget = self._run_jobs(pending, budget)
+
+        # Test using networks that have been trained
+        pending = [k for k in sorted(test_jobs)
+                   if not self._is_complete(k) and self._is_complete(test_jobs[k][1])]
+        logger.info("%u/%u testing jobs to run" % (len(pending), len(test_jobs)))
+        self._run_jobs(pending, budget)
+
+        return [(os.path.join(self.root, self.index[k]["folder"]), self.index[k]["params"])
+                for k in sorted(test_jobs) if self._is_complete(k)]
+
+    def query(self, kind="test", **criteria):
+        return query(self.root, kind, **criteria)
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _add_job(self, key, kind, params, train_key=None):
+        if key not in self.index:
+            self.index[key] = {"kind": kind, "params": params, "status": "pending",
+                               "folder": "%s_%s" % (kind, key), "training": train_key}
+
+    def _is_complete(self, key):
+        return self.index[key]["status"] == "complete"
+
+    def _run_jobs(self, keys, budget):
+        # Limit jobs to remaining budget
+        if budget is not None:
+            if len(keys) > budget:
+                logger.info("Job budget reached - deferring %u jobs" % (len(keys) - budget))
+            keys = keys[:budget]
+            budget -= len(keys)
+
+        if len(keys) == 0:
+            return budget
+
+        # Build job descriptions
+        jobs = []
+        for k in keys:
+            entry = self.index[k]
+            training_folder = (None if entry["training"] is None
+                               else os.path.join(self.root, self.index[entry["training"]]["folder"]))
+            jobs.append((k, entry["kind"], entry["params"],
+                         os.path.join(self.root, entry["folder"]), training_folder,
+                         self.stim_seed, self.stim_cache_folder,
+                         self.segment_duration, self.early_stop, self.setup_kwargs))
+
+        # Run jobs in pool, updating index as each one completes
+        pool = multiprocessing.Pool(self.num_workers, _init_worker, (self.backend,),
+                                    maxtasksperchild=1)
+        try:
+            for key, error in pool.imap_unordered(_run_job, jobs):
+                if error is None:
+                    logger.info("Job %s complete" % key)
+                    self.index[key]["status"] = "complete"
+                else:
+                    logger.error("Job %s failed:\n%s" % (key, error))
+                    self.index[key]["status"] = "failed"
+                    self.index[key]["error"] = error
+                save_index(self.root, self.index)
+        finally:
+            pool.close()
+            pool.join()
+
+        return budget
+
+if __name__ == "__main__":
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+    # Sweep testing parameters of asymmetrical network on local backend
+    grid = {"symmetrical": [False],
+            "tau_p": [2000],
+            "gain_per_hcu": [0.5, 0.546328125, 0.6],
+            "i_alpha": [0.1, 0.15, 0.2]}
+
+    sweep = Sweep(sys.argv[1] if len(sys.argv) > 1 else "sweep",
+                  num_workers=multiprocessing.cpu_count(), backend="numpy")
+    sweep.run(grid)
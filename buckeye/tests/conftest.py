@@ -0,0 +1,74 @@
+import itertools
+import os
+import sys
+
+import numpy
+import pytest
+
+# Modules are imported flat, as they are when scripts are run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import network
+import numpy_sim
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+# Small network, trained on each minicolumn in turn, which simulates in seconds
+num_hcu = 1
+num_mcu_per_hcu = 10
+num_mcu_neurons = 4
+tau_p = 500.0
+
+stim_minicolumns = [(m, float(i * 100), 20.0, 100.0)
+                    for i, m in enumerate(itertools.chain(*itertools.repeat(range(num_mcu_per_hcu), 2)))]
+training_simtime = 2000.0
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+@pytest.fixture
+def numpy_backend():
+    network.set_backend(numpy_sim, numpy_sim)
+    yield numpy_sim
+
+    # End any simulation test left running
+    numpy_sim.end()
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def constant_delay(i_pre, i_post):
+    return 1.0
+
+# Train small network, returning its result writers and end function
+def train(**kwargs):
+    return network.train_discrete(5.0, 5.0, 150.0, 5.0, tau_p,
+                                  stim_minicolumns, kwargs.pop("training_simtime", training_simtime),
+                                  kwargs.pop("delay_model", constant_delay), kwargs.pop("num_hcu", num_hcu),
+                                  num_mcu_per_hcu, num_mcu_neurons,
+                                  stim_seed=kwargs.pop("stim_seed", 1), seed=kwargs.pop("seed", 5),
+                                  **kwargs)
+
+# Write weights and biases of trained network to folder, ending simulation.
+# Returns bias and sparse AMPA and NMDA weights of each HCU and connection
+def write_training_results(folder, hcu_results, connection_results, end):
+    from weight_files import load_sparse_weights
+
+    biases = []
+    for i, (_, bias_writer) in enumerate(hcu_results):
+        filename = os.path.join(folder, "hcu_%u_e_bias.npy" % i)
+        bias_writer(filename)
+        biases.append(numpy.load(filename))
+
+    weights = []
+    for i, writers in enumerate(connection_results):
+        connection_weights = []
+        for writer, receptor in zip(writers, ("ampa", "nmda")):
+            filename = os.path.join(folder, "connection_%u_e_e_%s.npy" % (i, receptor))
+            writer(filename)
+            connection_weights.append(numpy.array(load_sparse_weights(filename)))
+        weights.append(tuple(connection_weights))
+
+    end()
+    return biases, weights
@@ -0,0 +1,42 @@
+import pytest
+
+import network
+import numpy_sim
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+# Start with no backend selected and restore whichever was selected afterwards
+@pytest.fixture
+def no_backend(monkeypatch):
+    monkeypatch.setattr(network, "sim", None)
+    monkeypatch.setattr(network, "bcpnn", None)
+    monkeypatch.setitem(network.backends, "spinnaker", ("missing_pynn_spinnaker", "missing_pynn_spinnaker_bcpnn"))
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_unknown_backend(no_backend):
+    with pytest.raises(ValueError):
+        network.select_backend("nest")
+
+def test_backend_selected_by_name(no_backend):
+    network.ensure_backend("numpy")
+    assert network.sim is numpy_sim
+    assert network.bcpnn is numpy_sim
+
+    # Selected backend should be kept
+    network.ensure_backend()
+    assert network.sim is numpy_sim
+
+def test_unavailable_default_backend_raises(no_backend):
+    # NumPy backend should never be substituted for an unavailable SpiNNaker
+    with pytest.raises(ImportError):
+        network.ensure_backend()
+    assert network.sim is None
+
+def test_registered_backend(no_backend, monkeypatch):
+    monkeypatch.setattr(network, "backends", dict(network.backends))
+    network.register_backend("local", "numpy_sim", "numpy_sim")
+    network.select_backend("local")
+    assert network.sim is numpy_sim
@@ -0,0 +1,92 @@
+import os
+
+import numpy
+import pytest
+
+import conftest
+import network
+import resource_estimator
+
+from instrumentation import RunProfile
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcu = 2
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Test network trained in folder, with HCUs built individually or as a grid, returning excitatory spikes of each HCU
+def run_test(folder, grid_populations):
+    connection_weights = [(os.path.join(folder, "connection_%u_e_e_ampa.npy" % i),
+                           os.path.join(folder, "connection_%u_e_e_nmda.npy" % i))
+                          for i in range(num_hcu ** 2)]
+    hcu_biases = [network.load_hcu_bias(os.path.join(folder, "hcu_%u_e_bias.npy" % h)) for h in range(num_hcu)]
+
+    spike_store = SpikeStore(os.path.join(folder, "testing_spikes_%u" % grid_populations))
+    _, end = network.test_discrete(connection_weights, hcu_biases, 0.546328125 / num_hcu, 0.114 / num_hcu,
+                                   300.0, 0.15, [(0, 100.0, 20.0, 50.0)], 500.0,
+                                   conftest.constant_delay, num_hcu, conftest.num_mcu_per_hcu,
+                                   conftest.num_mcu_neurons, False, stim_seed=1, seed=5,
+                                   spike_store=spike_store, grid_populations=grid_populations)
+    end()
+
+    spikes = []
+    for h in range(num_hcu):
+        ids, times = spike_store.get_spikes("hcu_%u_e" % h)
+        order = numpy.lexsort((times, ids))
+        spikes.append(numpy.column_stack((ids[order], times[order])))
+    return spikes
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_background_traffic():
+    # Shared pool sources fire at a tenth of the rate but each neuron receives from ten of them
+    assert network.get_background_traffic(2, 1000, 65.0, "poisson", 100) == (2000, 130000.0, 130000.0)
+    assert network.get_background_traffic(2, 1000, 65.0, "shared", 100) == (200, 1300.0, 130000.0)
+    assert network.get_background_traffic(2, 1000, 65.0, "current", 100) == (0, 0.0, 0.0)
+
+def test_background_cores():
+    # Poisson sources of 1000 excitatory and 250 inhibitory cells need 4 + 1 cores, shared pools
+    # one core each and, in both modes, synapse cores are loaded by 1250 * 65Hz of events
+    synapse_cores = (1250 * 65.0) / resource_estimator.static_events_per_core
+    assert resource_estimator.estimate_background_cores(1, [1000, 250], 65.0, "poisson", 100) == 5 + synapse_cores
+    assert resource_estimator.estimate_background_cores(1, [1000, 250], 65.0, "shared", 100) == 2 + synapse_cores
+    assert resource_estimator.estimate_background_cores(1, [1000, 250], 65.0, "current", 100) == 0.0
+
+def test_background_reported():
+    profile = RunProfile()
+    network.report_background_traffic(profile, 1, 1000, 250, True, network.background_rate, "shared", 100)
+    assert profile.counts["background_sources"] == 200
+    assert profile.counts["background_synaptic_events_per_second"] == 1250 * network.background_rate
+    assert profile.counts["background_cores"] == resource_estimator.estimate_background_cores(
+        1, [1000, 250], network.background_rate, "shared", 100)
+
+@pytest.mark.parametrize("background_mode", network.background_modes)
+def test_background_modes_drive_network(tmp_path, numpy_backend, background_mode):
+    profile = RunProfile()
+    biases, _ = conftest.write_training_results(str(tmp_path), *conftest.train(background_mode=background_mode,
+                                                                              profile=profile))
+
+    # Background should be built as required by the mode and, with stimuli, drive intrinsic plasticity
+    expected_populations = {"poisson": 3, "shared": 3, "current": 2}[background_mode]
+    assert profile.counts["populations"] == expected_populations
+    assert numpy.all(numpy.isfinite(biases[0]))
+    assert numpy.ptp(biases[0]) > 0.0
+
+def test_unknown_background_mode(numpy_backend):
+    with pytest.raises(ValueError):
+        conftest.train(background_mode="none")
+
+def test_testing_grid_equivalent_without_background(tmp_path, numpy_backend, monkeypatch):
+    conftest.write_training_results(str(tmp_path), *conftest.train(num_hcu=num_hcu))
+
+    # Without background noise, whose draws depend on how populations are laid out,
+    # testing networks built individually or as a grid should behave identically
+    monkeypatch.setattr(network, "background_rate", 0.0)
+    spikes = run_test(str(tmp_path), False)
+    grid_spikes = run_test(str(tmp_path), True)
+    assert all(len(s) > 0 and numpy.array_equal(s, g) for s, g in zip(spikes, grid_spikes))
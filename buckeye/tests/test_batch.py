@@ -0,0 +1,68 @@
+import os
+
+import numpy
+import pytest
+
+import conftest
+import network
+import recall_metrics
+
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+cue_minicolumns = [2, 5, 7]
+trial_duration = 500.0
+reset_duration = 300.0
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Test network trained in folder on each cue in turn, returning trials and excitatory spikes
+def run_batch(folder, **kwargs):
+    connection_weights = [(os.path.join(folder, "connection_0_e_e_ampa.npy"),
+                           os.path.join(folder, "connection_0_e_e_nmda.npy"))]
+    hcu_biases = [network.load_hcu_bias(os.path.join(folder, "hcu_0_e_bias.npy"))]
+
+    spike_store = SpikeStore(os.path.join(folder, "testing_spikes"))
+    spike_store.truncate(0.0)
+    _, trials, end = network.test_discrete_batch(connection_weights, hcu_biases, 0.546328125, 0.114, 300.0, 0.15,
+                                                 cue_minicolumns, trial_duration, reset_duration,
+                                                 conftest.constant_delay, 1, conftest.num_mcu_per_hcu,
+                                                 conftest.num_mcu_neurons, False, stim_seed=1, seed=5,
+                                                 spike_store=spike_store, **kwargs)
+    end()
+    return trials, spike_store.get_spikes("hcu_0_e")
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_cue_schedule():
+    stim, trials = network.get_cue_schedule([2, 5], 1000.0, 500.0)
+    assert stim == [(2, 100.0, 20.0, 50.0), (5, 1600.0, 20.0, 50.0)]
+    assert trials == [(0.0, 1000.0), (1500.0, 2500.0)]
+    assert list(network.get_reset_spike_times(trials, 500.0, 10.0)) == [1000.0 + (i * 100.0) for i in range(5)] + \
+                                                                      [2500.0 + (i * 100.0) for i in range(5)]
+
+@pytest.mark.parametrize("reset_rate", [None, 200.0])
+def test_batch_trials_sliced(tmp_path, numpy_backend, reset_rate):
+    conftest.write_training_results(str(tmp_path), *conftest.train())
+    trials, (ids, times) = run_batch(str(tmp_path), reset_rate=reset_rate)
+    assert trials == network.get_cue_schedule(cue_minicolumns, trial_duration, reset_duration)[1]
+    assert times.max() < trials[-1][1] + reset_duration
+
+    # Binning spikes by trial should count every spike
+    # within a trial, relative to the start of its trial
+    in_trial = [(times >= start) & (times < stop) for start, stop in trials]
+    rates = recall_metrics.get_binned_rates(numpy.column_stack((ids, times)), trials,
+                                            1, conftest.num_mcu_neurons, conftest.num_mcu_per_hcu)
+    spikes_per_bin = rates * (conftest.num_mcu_neurons * 10.0 / 1000.0)
+    assert numpy.allclose(spikes_per_bin.sum(axis=(1, 2)), [numpy.sum(t) for t in in_trial])
+    for i, (t, (start, _)) in enumerate(zip(in_trial, trials)):
+        first_bin = int((times[t].min() - start) // 10.0)
+        assert spikes_per_bin[i, first_bin].sum() > 0
+
+    # Reset spikes should silence excitatory neurons between trials
+    if reset_rate is not None:
+        assert numpy.all(numpy.any(in_trial, axis=0))
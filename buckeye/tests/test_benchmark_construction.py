@@ -0,0 +1,47 @@
+import pytest
+
+import benchmark_construction
+import network
+import stub_sim
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+@pytest.fixture
+def stub_backend():
+    network.set_backend(stub_sim, stub_sim)
+    yield stub_sim
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_connector_synapse_counts():
+    assert stub_sim.AllToAllConnector().get_num_synapses(3, 4) == 12
+    assert stub_sim.OneToOneConnector().get_num_synapses(3, 4) == 3
+    assert stub_sim.FixedProbabilityConnector(0.1).get_num_synapses(10, 20) == 20
+    assert stub_sim.FixedNumberPreConnector(5).get_num_synapses(10, 20) == 100
+    assert stub_sim.FromListConnector([(0, 1, 0.5, 1.0)] * 7).get_num_synapses(10, 20) == 7
+
+@pytest.mark.parametrize("phase", ["train", "test"])
+def test_benchmark_counts(stub_backend, phase):
+    def run(num_hcu, grid_populations):
+        return benchmark_construction._run_benchmark((phase, num_hcu, 10, 4, False, grid_populations, "poisson"))
+
+    one = run(1, False)
+    four = run(4, False)
+    four_grid = run(4, True)
+
+    # Each HCU should be built from the same populations, all of which are counted
+    assert four["counts"]["populations"] == 4 * one["counts"]["populations"]
+    assert four["calls"]["Population"] == four["counts"]["populations"]
+    assert four["calls"]["Projection"] == four["counts"]["projections"]
+    assert four["counts"]["synapses"] > 4 * one["counts"]["synapses"]
+
+    # Grid populations should build the same neurons with a number
+    # of populations which doesn't grow with the number of HCUs
+    assert four_grid["counts"]["neurons"] == four["counts"]["neurons"]
+    assert four_grid["counts"]["populations"] == one["counts"]["populations"]
+    assert four_grid["counts"]["projections"] < four["counts"]["projections"]
+
+    # Each report should be formatted as a row of the table
+    assert len(benchmark_construction.format_row(four)) == len(benchmark_construction.format_header())
@@ -0,0 +1,66 @@
+import numpy
+
+import network
+
+from weight_files import build_sparse_weights, save_sparse_weights
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+# Dense weights with NaN for unconnected synapses, including empty rows
+# at either side of the chunk boundaries used in the tests below
+dense = numpy.full((7, 5), numpy.nan)
+dense[0, [1, 4]] = [0.5, 1.0]
+dense[2, 0] = 2.0
+dense[3, :] = 0.25
+dense[5, 2] = -1.0
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_dense_weights_converted_in_chunks(tmp_path):
+    filename = str(tmp_path / "dense.npy")
+    numpy.save(filename, dense)
+
+    pre, post = numpy.where(~numpy.isnan(dense))
+    for chunk_rows in (1, 2, 3, 256):
+        connections = network.convert_weights_to_list(filename, 2.0, 3.0, chunk_rows=chunk_rows)
+        assert connections.dtype == network.connection_dtype
+        assert list(connections["pre"]) == list(pre)
+        assert list(connections["post"]) == list(post)
+        assert numpy.array_equal(connections["weight"], dense[pre, post] * 3.0)
+        assert numpy.all(connections["delay"] == 2.0)
+
+def test_empty_dense_weights(tmp_path):
+    filename = str(tmp_path / "empty.npy")
+    numpy.save(filename, numpy.full((4, 4), numpy.nan))
+    assert len(network.convert_weights_to_list(filename, 1.0)) == 0
+
+def test_sparse_weights_converted(tmp_path):
+    weights = build_sparse_weights([0, 0, 3], [1, 2, 0], [0.5, 0.25, 1.0])
+    filename = str(tmp_path / "sparse.npy")
+    save_sparse_weights(filename, weights, 11)
+
+    # Fixed-point weights should be scaled back to floating point
+    connections = network.convert_weights_to_list(filename, 1.0, 2.0)
+    assert list(connections["pre"]) == [0, 0, 3]
+    assert list(connections["post"]) == [1, 2, 0]
+    assert list(connections["weight"]) == [1.0, 0.5, 2.0]
+
+def test_connection_list_columns():
+    connections = numpy.zeros(3, dtype=network.connection_dtype)
+    connections["pre"] = [0, 1, 2]
+    connections["weight"] = 0.5
+
+    # Connection lists should be viewed as columns without copying
+    columns = network.connection_list_columns(connections)
+    assert columns.shape == (3, 4)
+    assert numpy.shares_memory(columns, connections)
+    assert list(columns[:,0]) == [0.0, 1.0, 2.0]
+    assert list(columns[:,2]) == [0.5] * 3
+
+    # Lists in other record types should be converted
+    legacy = numpy.zeros(2, dtype=[("pre", numpy.int32), ("post", numpy.int32),
+                                   ("weight", numpy.float32), ("delay", numpy.float32)])
+    legacy["post"] = [3, 4]
+    assert list(network.connection_list_columns(legacy)[:,1]) == [3.0, 4.0]
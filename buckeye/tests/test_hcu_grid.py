@@ -0,0 +1,88 @@
+import os
+
+import numpy
+
+import conftest
+import network
+
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcu = 3
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Train network, with HCUs built individually or as a grid, collecting spikes through
+# the result writers of each HCU. Returns biases, weights and spikes of each HCU
+def train(folder, grid_populations):
+    os.makedirs(folder)
+    hcu_results, connection_results, end = conftest.train(num_hcu=num_hcu, grid_populations=grid_populations)
+
+    spike_store = SpikeStore(os.path.join(folder, "spikes"))
+    for spikes_writer, _ in hcu_results:
+        spikes_writer(spike_store)
+
+    spikes = []
+    for h in range(num_hcu):
+        ids, times = spike_store.get_spikes("hcu_%u_e" % h)
+        order = numpy.lexsort((times, ids))
+        spikes.append(numpy.column_stack((ids[order], times[order])))
+
+    return conftest.write_training_results(folder, hcu_results, connection_results, end) + (spikes,)
+
+# Build HCUs configured for testing individually and as a grid
+def build_testing_hcus(sim, grid_populations):
+    num_excitatory, num_inhibitory, JE, JI = network.scale_parameters(conftest.num_mcu_per_hcu,
+                                                                      conftest.num_mcu_neurons)
+    kwargs = {"sim": sim, "seed": 1, "num_excitatory": num_excitatory, "num_inhibitory": num_inhibitory,
+              "JE": JE, "JI": JI, "tau_ca2": 300.0, "i_alpha": 0.15, "e_cell_mean_firing_rate": 2.0,
+              "simtime": 100.0, "record_membrane": False}
+    if grid_populations:
+        return network.HCUGrid.testing_adaptive(num_hcu=num_hcu, biases=[numpy.zeros(num_excitatory)] * num_hcu,
+                                                stim_spike_times=[[]] * (num_hcu * num_excitatory), **kwargs)
+    else:
+        return [network.HCU.testing_adaptive(name="%u" % h, bias=numpy.zeros(num_excitatory),
+                                             stim_spike_times=[[]] * num_excitatory, **kwargs)
+                for h in range(num_hcu)]
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_initial_voltages_match(numpy_backend):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    # Each population of a grid should start with the same voltages as those of individual HCUs
+    hcus = build_testing_hcus(sim, False)
+    grid = build_testing_hcus(sim, True)
+    for population in ("e_cells", "i_cells"):
+        assert numpy.array_equal(numpy.concatenate([getattr(h, population).initial_values["v"] for h in hcus]),
+                                 getattr(grid, population).initial_values["v"])
+
+    # Excitatory and inhibitory voltages should be drawn from separate streams
+    assert not numpy.array_equal(hcus[0].e_cells.initial_values["v"][:len(hcus[0].i_cells)],
+                                 hcus[0].i_cells.initial_values["v"])
+
+def test_training_grid_equivalent(tmp_path, numpy_backend):
+    biases, weights, spikes = train(str(tmp_path / "hcus"), False)
+    grid_biases, grid_weights, grid_spikes = train(str(tmp_path / "grid"), True)
+
+    assert all(numpy.array_equal(a, b) for a, b in zip(biases, grid_biases))
+    assert all(numpy.array_equal(a, b) for w, g in zip(weights, grid_weights) for a, b in zip(w, g))
+    assert all(len(s) > 0 and numpy.array_equal(s, g) for s, g in zip(spikes, grid_spikes))
+
+def test_grid_spikes_read_back_once(tmp_path, numpy_backend):
+    hcu_results, _, end = conftest.train(num_hcu=num_hcu, grid_populations=True)
+
+    # Only the first HCU's writer should read back spikes, once for the whole grid
+    spike_store = SpikeStore(str(tmp_path / "spikes"))
+    for spikes_writer, _ in hcu_results[1:]:
+        spikes_writer(spike_store)
+    assert spike_store.get_names() == []
+
+    hcu_results[0][0](spike_store)
+    assert sorted(spike_store.get_names()) == ["hcu_%u_e" % h for h in range(num_hcu)]
+    end()
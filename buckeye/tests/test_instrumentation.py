@@ -0,0 +1,54 @@
+import json
+
+import conftest
+
+from instrumentation import RunProfile
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_phases_totalled(tmp_path):
+    profile = RunProfile({"num_hcu": 1})
+    for _ in range(2):
+        with profile.phase("simulation"):
+            pass
+    with profile.phase("setup"):
+        pass
+    profile.count("stimulus_spikes", 10)
+    profile.count("stimulus_spikes", 5)
+
+    filename = str(tmp_path / "profile.json")
+    profile.write(filename)
+    with open(filename, "r") as f:
+        report = json.load(f)
+
+    assert report["metadata"] == {"num_hcu": 1}
+    assert [p["name"] for p in report["phases"]] == ["simulation", "simulation", "setup"]
+    assert report["phase_totals"]["simulation"]["calls"] == 2
+    assert report["phase_totals"]["setup"]["calls"] == 1
+    assert report["counts"] == {"stimulus_spikes": 15}
+
+def test_wrapped_simulator_counted(numpy_backend):
+    profile = RunProfile()
+    sim = profile.wrap_simulator(numpy_backend)
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    pre = sim.Population(3, sim.IF_curr_exp())
+    post = sim.Population(2, sim.IF_curr_exp())
+    sim.Projection(pre, post, sim.AllToAllConnector(), sim.StaticSynapse())
+    profile.count_synapses()
+
+    assert profile.counts == {"populations": 2, "neurons": 5, "projections": 1, "synapses": 6}
+
+def test_training_profiled(numpy_backend):
+    profile = RunProfile()
+    hcu_results, connection_results, end = conftest.train(profile=profile, segment_duration=1000.0)
+    end()
+
+    # Each segment should be simulated in its own phase
+    names = [p["name"] for p in profile.phases]
+    assert names.count("simulation") == 2
+    assert names.index("setup") < names.index("hcu_construction") < names.index("simulation")
+    assert profile.counts["stimulus_spikes"] > 0
+    assert profile.counts["populations"] > 0
+    assert profile.counts["synapses"] > 0
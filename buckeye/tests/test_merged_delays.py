@@ -0,0 +1,38 @@
+import numpy
+
+import conftest
+import network
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcu = 3
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Connections within HCUs have one delay and those between them another
+def two_delay(i_pre, i_post):
+    return 1.0 if i_pre == i_post else 2.0
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_pairs_grouped_by_delay():
+    groups = network.group_hcu_pairs_by_delay(num_hcu, two_delay)
+    assert groups == [(1.0, [(0, 0), (1, 1), (2, 2)]),
+                      (2.0, [(0, 1), (0, 2), (1, 0), (1, 2), (2, 0), (2, 1)])]
+
+def test_merged_weights_split_into_pairs(tmp_path, numpy_backend):
+    # Weights read back from merged projections, and split back into HCU pairs,
+    # should match those read back from a projection per pair
+    separate = conftest.write_training_results(str(tmp_path), *conftest.train(num_hcu=num_hcu,
+                                                                               delay_model=two_delay))
+    merged = conftest.write_training_results(str(tmp_path), *conftest.train(num_hcu=num_hcu, delay_model=two_delay,
+                                                                             merge_delays=True))
+
+    assert all(numpy.array_equal(a, b) for a, b in zip(separate[0], merged[0]))
+    for separate_weights, merged_weights in zip(separate[1], merged[1]):
+        for a, b in zip(separate_weights, merged_weights):
+            assert len(a) > 0
+            assert numpy.array_equal(a, b)
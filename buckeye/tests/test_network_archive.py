@@ -0,0 +1,165 @@
+import os
+
+import numpy
+import pytest
+
+import conftest
+import network
+import network_archive
+import numpy_sim
+import weight_files
+
+from spike_store import SpikeStore
+from weight_archive import WeightArchive
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcu = 2
+testing_stim_minicolumns = [(0, 100.0, 20.0, 50.0)]
+testing_simtime = 500.0
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+# Train network once, writing its weights to an archive and its biases alongside
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("trained")
+    network.set_backend(numpy_sim, numpy_sim)
+
+    hcu_results, connection_results, end = conftest.train(num_hcu=num_hcu)
+
+    archive_filename = str(folder / "connection_weights.arc")
+    with WeightArchive(archive_filename, "w") as archive:
+        for i, (ampa_writer, nmda_writer) in enumerate(connection_results):
+            ampa_writer((archive, "connection_%u_e_e_ampa" % i))
+            nmda_writer((archive, "connection_%u_e_e_nmda" % i))
+
+    biases = []
+    for i, (_, bias_writer) in enumerate(hcu_results):
+        filename = str(folder / ("hcu_%u_e_bias.npy" % i))
+        bias_writer(filename)
+        biases.append(network.load_hcu_bias(filename))
+    end()
+
+    archive = WeightArchive(archive_filename)
+    connection_weights = [((archive, "connection_%u_e_e_ampa" % i), (archive, "connection_%u_e_e_nmda" % i))
+                          for i in range(num_hcu ** 2)]
+    return connection_weights, biases
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Test trained network, returning the excitatory spikes recorded from each HCU
+def run_test(folder, connection_weights, biases, **kwargs):
+    spike_store = SpikeStore(os.path.join(folder, "testing_spikes"))
+    _, end = network.test_discrete(connection_weights, biases, 0.546328125 / num_hcu, 0.114 / num_hcu,
+                                   300.0, 0.15, testing_stim_minicolumns, testing_simtime,
+                                   conftest.constant_delay, num_hcu, conftest.num_mcu_per_hcu,
+                                   conftest.num_mcu_neurons, False, stim_seed=kwargs.pop("stim_seed", 1),
+                                   seed=5, spike_store=spike_store, **kwargs)
+    end()
+    return [numpy.column_stack(spike_store.get_spikes("hcu_%u_e" % i)) for i in range(num_hcu)]
+
+# Build archive of two HCU network in which each AMPA connection list has two synapses with every field set to value
+def build_archive(filename, key, values):
+    connection_lists = []
+    for v in values:
+        ampa_list = numpy.empty(2, dtype=network.connection_dtype)
+        for f in network.connection_dtype.names:
+            ampa_list[f] = v
+        connection_lists.append((ampa_list, numpy.zeros(3, dtype=network.connection_dtype)))
+
+    return network_archive.NetworkArchive.write(filename, {"num_hcu": 2, "key": key, "delays": [1.0] * 4},
+                                                numpy.array([0, 1, 2]), numpy.array([5.0, 7.0]),
+                                                connection_lists, [numpy.ones(3), numpy.zeros(3)])
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_archive_round_trip(tmp_path):
+    filename = str(tmp_path / "network.arc")
+    build_archive(filename, "a", range(4))
+
+    archive = network_archive.NetworkArchive(filename)
+    assert archive.description == {"num_hcu": 2, "key": "a", "delays": [1.0] * 4}
+
+    offsets, times = archive.get_stimuli()
+    assert list(offsets) == [0, 1, 2]
+    assert list(times) == [5.0, 7.0]
+
+    connection_lists = archive.get_connection_lists()
+    assert len(connection_lists) == 4
+    assert all(numpy.all(ampa["pre"] == i) and len(nmda) == 3 for i, (ampa, nmda) in enumerate(connection_lists))
+    assert [list(b) for b in archive.get_hcu_biases()] == [[1.0] * 3, [0.0] * 3]
+
+    # No temporary files should be left behind
+    assert os.listdir(str(tmp_path)) == ["network.arc"]
+
+def test_open_network(tmp_path, monkeypatch):
+    filename = str(tmp_path / "network.arc")
+    assert network_archive.open_network(filename, "a") is None
+
+    build_archive(filename, "a", range(4)).close()
+    with network_archive.open_network(filename, "a") as archive:
+        assert archive.description["key"] == "a"
+
+    # Archive of network built from different inputs should be closed
+    closed = []
+    close = network_archive.NetworkArchive.close
+    monkeypatch.setattr(network_archive.NetworkArchive, "close", lambda self: closed.append(self) or close(self))
+    assert network_archive.open_network(filename, "b") is None
+    assert len(closed) == 1
+
+def test_diff_networks(tmp_path):
+    archive_a = build_archive(str(tmp_path / "a.arc"), "a", range(4))
+    assert network_archive.diff_networks(archive_a, build_archive(str(tmp_path / "b.arc"), "b", range(4))) == []
+
+    differences = network_archive.diff_networks(archive_a, build_archive(str(tmp_path / "c.arc"), "c", [0, 1, 5, 3]))
+    assert differences == ["connection_1_0_ampa: pre 2/2 differ by up to 3, post 2/2 differ by up to 3, "
+                           "weight 2/2 differ by up to 3, delay 2/2 differ by up to 3"]
+
+def test_keys():
+    assert network_archive.get_network_key({"a": 1, "b": [1, 2]}) == network_archive.get_network_key({"b": [1, 2], "a": 1})
+    assert network_archive.get_network_key({"a": 1}) != network_archive.get_network_key({"a": 2})
+    assert network_archive.get_array_hash([numpy.ones(3)]) != network_archive.get_array_hash([numpy.zeros(3)])
+
+def test_training_rebuild_equivalent(tmp_path, numpy_backend):
+    direct_biases, direct_weights = conftest.write_training_results(str(tmp_path), *conftest.train(num_hcu=num_hcu))
+
+    # Network exported to archive and network rebuilt from it should both train identically to one built directly
+    filename = str(tmp_path / "training_network.arc")
+    for _ in range(2):
+        biases, weights = conftest.write_training_results(str(tmp_path),
+                                                          *conftest.train(num_hcu=num_hcu, network_archive=filename))
+        assert all(numpy.array_equal(a, b) for a, b in zip(biases, direct_biases))
+        assert all(numpy.array_equal(a, b) for w, d in zip(weights, direct_weights) for a, b in zip(w, d))
+
+    with network_archive.NetworkArchive(filename) as archive:
+        assert archive.description["phase"] == "train"
+
+def test_testing_rebuild_equivalent(tmp_path, trained, numpy_backend, monkeypatch):
+    connection_weights, biases = trained
+    direct_spikes = run_test(str(tmp_path), connection_weights, biases)
+    assert sum(len(s) for s in direct_spikes) > 0
+
+    # Archived networks should be identified without reading their weights
+    def load_weight_array(source):
+        raise AssertionError("Weights read to build key")
+    monkeypatch.setattr(weight_files, "load_weight_array", load_weight_array)
+
+    # Network exported to archive and network rebuilt from it should both behave identically to one built directly
+    filename = str(tmp_path / "testing_network.arc")
+    for _ in range(2):
+        spikes = run_test(str(tmp_path), connection_weights, biases, network_archive=filename)
+        assert all(numpy.array_equal(a, b) for a, b in zip(spikes, direct_spikes))
+
+    with network_archive.NetworkArchive(filename) as archive:
+        assert all(numpy.array_equal(a, b) for a, b in zip(archive.get_hcu_biases(), biases))
+
+def test_unseeded_network_not_archived(tmp_path, trained, numpy_backend):
+    connection_weights, biases = trained
+    filename = str(tmp_path / "testing_network.arc")
+    run_test(str(tmp_path), connection_weights, biases, stim_seed=None, network_archive=filename)
+    assert not os.path.exists(filename)
@@ -0,0 +1,119 @@
+import numpy
+import pytest
+
+import network
+import numpy_sim
+
+from spike_store import get_spiketrain_arrays
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def get_spikes(cells):
+    return get_spiketrain_arrays(cells.get_data("spikes").segments[0].spiketrains)
+
+# Build a population whose neurons each fire once when driven by a single spike
+def build_driven_cells(sim, num_neurons, spike_times, connector_list):
+    source = sim.Population(1, sim.SpikeSourceArray(spike_times=spike_times))
+    cells = sim.Population(num_neurons, sim.IF_curr_exp(tau_refrac=20.0))
+    cells.record("spikes")
+    sim.Projection(source, cells, sim.FromListConnector(connector_list),
+                   sim.StaticSynapse(), receptor_type="excitatory")
+    return cells
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_p_kernel_equal_time_constants():
+    delta = numpy.linspace(0.0, 100.0, 11)
+
+    # Kernel with equal time constants should be the limit of that with almost equal ones
+    assert numpy.allclose(numpy_sim.bcpnn_p_kernel(delta, 20.0, 20.0),
+                          numpy_sim.bcpnn_p_kernel(delta, 20.0, 20.0 + 1.0E-6), atol=1.0E-6)
+
+def test_csr_gather():
+    indptr = numpy_sim.csr_indptr(numpy.array([0, 0, 2, 2, 2, 3]), 4)
+    assert list(indptr) == [0, 2, 2, 5, 6]
+    assert list(numpy_sim.csr_gather(indptr, numpy.array([2, 0]))) == [2, 3, 4, 0, 1]
+
+def test_constant_current_fires_regularly(numpy_backend):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    cells = sim.Population(2, sim.IF_curr_exp(i_offset=1.0, tau_refrac=2.0))
+    cells.record("spikes")
+    sim.run(500.0)
+
+    ids, times = get_spikes(cells)
+    assert len(times) > 20
+
+    # Both neurons should fire with identical, constant inter-spike intervals
+    intervals = numpy.diff(times[ids == 0])
+    assert numpy.all(intervals == intervals[0])
+    assert numpy.array_equal(times[ids == 0], times[ids == 1])
+
+@pytest.mark.parametrize("delay", [1.0, 3.0])
+def test_spike_source_array_delay(numpy_backend, delay):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    cells = build_driven_cells(sim, 1, [10.0], [(0, 0, 20.0, delay)])
+    sim.run(50.0)
+
+    # Input arriving after delay should immediately make neuron fire
+    _, times = get_spikes(cells)
+    assert list(times) == [10.0 + delay]
+
+def test_structured_and_float_connection_lists_agree(numpy_backend):
+    sim = numpy_backend
+    connections = numpy.empty(3, dtype=network.connection_dtype)
+    connections["pre"] = 0
+    connections["post"] = [0, 2, 3]
+    connections["weight"] = 20.0
+    connections["delay"] = [1.0, 2.0, 4.0]
+
+    results = []
+    for conn_list in (connections, network.connection_list_columns(connections)):
+        sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+        cells = build_driven_cells(sim, 4, [10.0], conn_list)
+        sim.run(50.0)
+        results.append(get_spikes(cells))
+        sim.end()
+
+    assert all(numpy.array_equal(a, b) for a, b in zip(*results))
+    assert list(results[0][0]) == [0, 2, 3]
+    assert list(results[0][1]) == [11.0, 12.0, 14.0]
+
+def test_population_view_data(numpy_backend):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    cells = build_driven_cells(sim, 4, [10.0], [(0, n, 20.0, float(n + 1)) for n in range(4)])
+    sim.run(50.0)
+
+    # Source indices of a view's spike trains are relative to the view
+    ids, times = get_spiketrain_arrays(cells[2:].get_data("spikes").segments[0].spiketrains)
+    assert list(ids) == [0, 1]
+    assert list(times) == [13.0, 14.0]
+
+    with pytest.raises(AssertionError):
+        cells[2:].get_data("spikes", clear=True)
+
+def test_bias_sampling(numpy_backend):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+
+    cells = sim.Population(2, sim.IF_curr_dual_exp(i_offset=1.0, plasticity_enabled=True))
+    cells.record("bias", sampling_interval=100.0)
+
+    # Samples should be taken at the start and then at the end of each interval
+    sim.run(300.0)
+    bias = cells.get_data("bias").segments[0].filter(name="bias")[0]
+    assert len(bias) == 4
+    assert list(bias.times.rescale("ms").magnitude) == [0.0, 100.0, 200.0, 300.0]
+    assert numpy.array_equal(network.get_final_bias_sample(sim, cells), numpy.asarray(bias[-1,:]))
+
+    # Once simulation has moved on from the last sample, it is stale
+    sim.run(50.0)
+    with pytest.raises(ValueError):
+        network.get_final_bias_sample(sim, cells)
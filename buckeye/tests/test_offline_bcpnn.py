@@ -0,0 +1,61 @@
+import numpy
+import pytest
+
+import conftest
+import network
+import numpy_sim
+import offline_bcpnn
+
+from analyse_spikes import load_store_spikes
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+# Train network once, streaming its spikes to a store and writing its weights and biases
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("offline_bcpnn")
+    network.set_backend(numpy_sim, numpy_sim)
+
+    store = SpikeStore(str(folder / "training_spikes"))
+    hcu_results, connection_results, end = conftest.train(spike_store=store)
+    biases, weights = conftest.write_training_results(str(folder), hcu_results, connection_results, end)
+
+    num_excitatory, _, _, _ = network.scale_parameters(conftest.num_mcu_per_hcu, conftest.num_mcu_neurons)
+    spikes = offline_bcpnn.spikes_to_csr(load_store_spikes(store, "hcu_0_e"), num_excitatory)
+    return spikes, biases[0], weights[0]
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+# Recorded biases are scaled by 1000
+def test_intrinsic_bias_matches_simulation(trained):
+    spikes, bias, _ = trained
+    assert len(spikes[1]) > 0
+
+    offline_bias = offline_bcpnn.get_intrinsic_bias(spikes, 5.0, conftest.tau_p, 20.0, 0.05,
+                                                    conftest.training_simtime)
+    assert numpy.allclose(offline_bias, bias * 0.001, rtol=0.0, atol=1.0E-12)
+
+@pytest.mark.parametrize("receptor, tau_zi, tau_zj", [(0, 5.0, 5.0), (1, 150.0, 5.0)])
+def test_weights_match_simulation(trained, receptor, tau_zi, tau_zj):
+    spikes, _, weights = trained
+    _, _, JE, _ = network.scale_parameters(conftest.num_mcu_per_hcu, conftest.num_mcu_neurons)
+
+    connectivity = weights[receptor]
+    offline_weights = offline_bcpnn.recalculate_sparse_weights(connectivity, spikes, spikes,
+                                                               conftest.constant_delay(0, 0),
+                                                               tau_zi, tau_zj, conftest.tau_p, 20.0, JE,
+                                                               conftest.training_simtime)
+
+    # Connectivity should be preserved and weights agree to within float32 precision they are saved with
+    assert numpy.array_equal(offline_weights["pre"], connectivity["pre"])
+    assert numpy.array_equal(offline_weights["post"], connectivity["post"])
+    assert numpy.allclose(offline_weights["weight"], connectivity["weight"], rtol=1.0E-6, atol=1.0E-6)
+
+def test_truncate_spikes():
+    spikes = numpy.array([[1, 5.0], [0, 3.0], [1, 2.0], [0, 7.0]])
+    offsets, times = offline_bcpnn.truncate_spikes(offline_bcpnn.spikes_to_csr(spikes, 3), 5.0)
+    assert list(offsets) == [0, 1, 3, 3]
+    assert list(times) == [3.0, 2.0, 5.0]
@@ -0,0 +1,97 @@
+import numpy
+
+import recall_metrics
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcus = 1
+num_mcu_neurons = 2
+num_mcu_per_hcu = 3
+trials = [(0.0, 100.0), (200.0, 300.0)]
+
+# Minicolumn active in each 10ms bin of each trial (-1 for silent)
+trial_active = [[0, 0, 0, 0, 1, 1, 1, 1, 1, 1],
+                [2, 2, 1, 1, 1, 1, 1, -1, -1, -1]]
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Build spikes, in the format returned by analyse_spikes.combine_e_spikes, in which both neurons of the
+# active minicolumn spike in the middle of each bin. Stray spikes are also emitted between trials
+def build_spikes():
+    spikes = [(n + 1, 150.0) for n in range(num_mcu_neurons)]
+    for (start, _), active in zip(trials, trial_active):
+        for b, m in enumerate(active):
+            if m >= 0:
+                spikes.extend((m * num_mcu_neurons * num_hcus + n, start + (b * 10.0) + 5.0)
+                              for n in range(num_mcu_neurons))
+    return numpy.array(spikes, dtype=float)
+
+def get_active():
+    rates = recall_metrics.get_binned_rates(build_spikes(), trials, num_hcus, num_mcu_neurons, num_mcu_per_hcu)
+    return recall_metrics.get_active_minicolumns(rates)
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_binned_rates():
+    rates = recall_metrics.get_binned_rates(build_spikes(), trials, num_hcus, num_mcu_neurons, num_mcu_per_hcu)
+    assert rates.shape == (2, 10, 3)
+
+    # Each neuron of active minicolumn spikes once per 10ms bin i.e. at 100Hz
+    assert rates[0, 0, 0] == 100.0
+    assert rates[1, 0, 2] == 100.0
+    assert numpy.sum(rates) == 100.0 * sum(numpy.count_nonzero(numpy.asarray(a) >= 0) for a in trial_active)
+
+def test_active_minicolumns():
+    assert numpy.array_equal(get_active(), trial_active)
+
+    # Minicolumns firing more slowly than min_rate are silent
+    rates = recall_metrics.get_binned_rates(build_spikes(), trials, num_hcus, num_mcu_neurons, num_mcu_per_hcu)
+    assert numpy.all(recall_metrics.get_active_minicolumns(rates, 150.0) == -1)
+
+def test_runs():
+    trial, minicolumn, start, length = recall_metrics.get_runs(get_active())
+    assert list(trial) == [0, 0, 1, 1, 1]
+    assert list(minicolumn) == [0, 1, 2, 1, -1]
+    assert list(start) == [0, 4, 0, 2, 7]
+    assert list(length) == [4, 6, 2, 5, 3]
+
+def test_attractor_states():
+    # Silent runs and runs shorter than min_dwell_bins aren't attractor states
+    trial, minicolumn, start, length = recall_metrics.get_attractor_states(get_active())
+    assert list(trial) == [0, 0, 1]
+    assert list(minicolumn) == [0, 1, 1]
+    assert list(start) == [0, 4, 2]
+    assert list(length) == [4, 6, 5]
+
+def test_state_sequences():
+    sequences = recall_metrics.get_state_sequences(get_active())
+    assert sequences.tolist() == [[0, 1], [1, -1]]
+
+    # Revisits of a minicolumn interrupted only by a short state are merged
+    active = numpy.array([[0, 0, 0, 2, 0, 0, 0, 1, 1, 1]])
+    assert recall_metrics.get_state_sequences(active).tolist() == [[0, 1]]
+
+def test_dwell_statistics():
+    mean_dwell, num_transitions = recall_metrics.get_dwell_statistics(get_active())
+    assert list(mean_dwell) == [50.0, 50.0]
+    assert list(num_transitions) == [1, 0]
+
+def test_sequence_accuracy():
+    expected = recall_metrics.get_expected_sequences([0, 2], num_mcu_per_hcu)
+    assert expected.tolist() == [[0, 1, 2], [2, 0, 1]]
+    assert recall_metrics.get_expected_sequences([2], num_mcu_per_hcu, 5).tolist() == [[2, 0, 1, 2, 0]]
+
+    # Only the matching prefix of each trial's sequence counts
+    accuracy = recall_metrics.get_sequence_accuracy(recall_metrics.get_state_sequences(get_active()), expected)
+    assert numpy.allclose(accuracy, [2.0 / 3.0, 0.0])
+
+def test_score_trials():
+    expected = recall_metrics.get_expected_sequences([0, 2], num_mcu_per_hcu)
+    scores = recall_metrics.score_trials(build_spikes(), trials, expected, num_hcus,
+                                         num_mcu_neurons, num_mcu_per_hcu)
+    assert numpy.array_equal(scores["active"], trial_active)
+    assert numpy.allclose(scores["accuracy"], [2.0 / 3.0, 0.0])
+    assert list(scores["num_transitions"]) == [1, 0]
@@ -0,0 +1,55 @@
+import resource_estimator
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def constant_delay(i_pre, i_post):
+    return 1.0
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_training_estimate():
+    # One HCU of 10 minicolumns of 100 neurons, with the first minicolumn stimulated at 20Hz for 100ms
+    estimate = resource_estimator.estimate_training(1, 10, 100, constant_delay, 1000.0,
+                                                    [(0, 0.0, 20.0, 100.0)])
+
+    # 1000 excitatory cells fit in a single cluster of 4 neuron cores. Their AMPA and NMDA synapses
+    # each need one core: 1000 cells * 100 synapses * 4Hz / 0.5E6 plastic events per core = 0.8
+    assert estimate.cluster_widths == {"0 - e_cells": 1024}
+    assert estimate.num_neuron_cores == 4
+    assert estimate.num_synapse_cores == 2
+
+    # 1000 background Poisson sources need 4 cores and the 100 stimulus sources 1
+    assert estimate.num_spike_source_cores == 5
+
+    # Per cell, background rows take 12 + 4 bytes and AMPA and NMDA rows 28 + (100 * 8). Stimulus rows,
+    # onto a tenth of cells, take 12 + 4. Spikes are recorded every timestep and bias once. The
+    # 200 stimulus spikes take 4 bytes each
+    synapse_bytes = 1000 * (16 + (2 * 828)) + 100 * 16
+    recording_bytes = (4 * 32 * 1000) + (4 * 1000)
+    assert estimate.sdram_bytes == synapse_bytes + recording_bytes + (4 * 200)
+
+    assert estimate.num_chips == 1
+    assert estimate.get_spinnaker_kwargs() == {"spalloc_num_boards": 1, "e_cell_max_cluster_width": 1024}
+
+def test_testing_estimate():
+    estimate = resource_estimator.estimate_testing(1, 10, 100, constant_delay, 1000.0, False,
+                                                   [(0, 100.0, 20.0, 50.0)])
+
+    # Excitatory cells have static AMPA, NMDA and inhibitory synapses, each
+    # processed by one core, and 250 inhibitory cells fit on one neuron core
+    # with one core each for their excitatory and inhibitory synapses
+    assert estimate.cluster_widths == {"0 - e_cells": 1024, "0 - i_cells": 256}
+    assert estimate.num_neuron_cores == 4 + 1
+    assert estimate.num_synapse_cores == 3 + 2
+
+    # Background Poisson sources need 4 cores for excitatory
+    # and 1 for inhibitory cells and stimulus sources need 1
+    assert estimate.num_spike_source_cores == 6
+
+    # 16 cores at 75% utilisation need a second chip
+    assert estimate.num_chips == 2
+
+def test_spalloc_num_boards():
+    assert [resource_estimator.get_spalloc_num_boards(n) for n in (0, 1, 2, 3, 4, 7)] == [1, 1, 3, 3, 6, 9]
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import pytest
+
+from result_collection import collect_results
+
+#------------------------------------------------------------------------------
+# FakeStore
+#------------------------------------------------------------------------------
+# Stands in for a SpikeStore, counting how often it is synced
+class FakeStore(object):
+    def __init__(self):
+        self.spikes = []
+        self.num_syncs = 0
+
+    def sync(self):
+        self.num_syncs += 1
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_all_results_written(tmp_path):
+    store = FakeStore()
+
+    def file_writer(filename):
+        with open(filename, "w") as f:
+            f.write(os.path.basename(filename))
+
+    tasks = [(file_writer, str(tmp_path / ("%u.txt" % i))) for i in range(10)]
+    tasks += [(lambda s, i=i: s.spikes.append(i), store) for i in range(3)]
+    collect_results(tasks)
+
+    for i in range(10):
+        with open(str(tmp_path / ("%u.txt" % i)), "r") as f:
+            assert f.read() == "%u.txt" % i
+
+    # Store should be written by each of its writers and then synced once
+    assert sorted(store.spikes) == [0, 1, 2]
+    assert store.num_syncs == 1
+
+def test_results_written_concurrently():
+    # Writers can only pass barrier if they run concurrently
+    barrier = threading.Barrier(2, timeout=10.0)
+    store = FakeStore()
+    collect_results([(lambda s: barrier.wait(), store) for _ in range(2)], num_threads=2)
+    assert store.num_syncs == 1
+
+def test_writer_errors_raised():
+    def failing_writer(target):
+        raise IOError("readback failed")
+
+    with pytest.raises(IOError):
+        collect_results([(failing_writer, FakeStore())])
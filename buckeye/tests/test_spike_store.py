@@ -0,0 +1,79 @@
+import numpy
+
+from spike_store import SpikeStore, get_trial_spikes
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Build store containing three 100ms chunks, each with a spike
+# from neurons 1 and 0 at 10ms and 60ms into the chunk
+def build_store(folder):
+    store = SpikeStore(str(folder))
+    for t in (0.0, 100.0, 200.0):
+        store.append("hcu_0_e", [1, 0, 1, 0], [t + 10.0, t + 60.0, t + 60.0, t + 10.0], 2, t, t + 100.0)
+    return store
+
+def get_spikes(store, t_start=None, t_stop=None):
+    ids, times = store.get_spikes("hcu_0_e", t_start, t_stop)
+    return list(zip(ids.tolist(), times.tolist()))
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_chunks_sorted_by_id_then_time(tmp_path):
+    store = build_store(tmp_path)
+    assert get_spikes(store, 0.0, 100.0) == [(0, 10.0), (0, 60.0), (1, 10.0), (1, 60.0)]
+    assert store.get_num_neurons("hcu_0_e") == 2
+    assert store.get_names() == ["hcu_0_e"]
+
+def test_get_spikes_window(tmp_path):
+    store = build_store(tmp_path)
+    assert len(get_spikes(store)) == 12
+
+    # Spikes outside window are masked out of partially overlapping chunks
+    assert get_spikes(store, 150.0, 220.0) == [(0, 160.0), (1, 160.0), (0, 210.0), (1, 210.0)]
+    assert get_spikes(store, 300.0) == []
+
+def test_reopen(tmp_path):
+    build_store(tmp_path)
+
+    # Spikes appended to files after index was written should be discarded
+    with open(str(tmp_path / "hcu_0_e_ids.bin"), "ab") as f:
+        numpy.zeros(3, dtype=SpikeStore.id_dtype).tofile(f)
+
+    store = SpikeStore(str(tmp_path))
+    assert len(get_spikes(store)) == 12
+    assert (tmp_path / "hcu_0_e_ids.bin").stat().st_size == 12 * SpikeStore.id_dtype.itemsize
+
+def test_truncate_at_chunk_boundary(tmp_path):
+    store = build_store(tmp_path)
+    store.truncate(100.0)
+
+    assert get_spikes(store) == [(0, 10.0), (0, 60.0), (1, 10.0), (1, 60.0)]
+    assert store.index["hcu_0_e"]["chunks"] == [[0, 4, 0.0, 100.0]]
+
+def test_truncate_within_chunk(tmp_path):
+    store = build_store(tmp_path)
+    store.truncate(150.0)
+
+    # Spikes at or after time should be removed from chunk straddling it and chunk should end at time
+    assert get_spikes(store, 100.0) == [(0, 110.0), (1, 110.0)]
+    assert store.index["hcu_0_e"]["chunks"][-1] == [4, 2, 100.0, 150.0]
+
+    # Appending after truncation should continue from time and persist
+    store.append("hcu_0_e", [0], [170.0], 2, 150.0, 200.0)
+    assert get_spikes(SpikeStore(str(tmp_path)), 100.0) == [(0, 110.0), (1, 110.0), (0, 170.0)]
+
+def test_truncate_all(tmp_path):
+    store = build_store(tmp_path)
+    store.truncate(0.0)
+    assert get_spikes(store) == []
+    assert (tmp_path / "hcu_0_e_times.bin").stat().st_size == 0
+
+def test_trial_spikes(tmp_path):
+    store = build_store(tmp_path)
+    trial_spikes = get_trial_spikes(store, "hcu_0_e", [(0.0, 50.0), (200.0, 250.0)])
+
+    # Spike times should be relative to start of their trial
+    assert [(list(ids), list(times)) for ids, times in trial_spikes] == [([0, 1], [10.0, 10.0]),
+                                                                         ([0, 1], [10.0, 10.0])]
@@ -0,0 +1,148 @@
+import os
+import time
+
+import numpy
+import pytest
+
+import network
+import numpy_sim
+
+from spike_store import get_spiketrain_arrays
+from stimulus_cache import StimulusCache, get_stimulus_key
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcu = 2
+num_excitatory = 20
+num_mcu_per_hcu = 5
+stim_minicolumns = [(0, 0.0, 50.0, 100.0), (3, 100.0, 50.0, 100.0), (1, 200.0, 20.0, 50.0)]
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def generate(seed):
+    return network.generate_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu,
+                                             numpy.random.RandomState(seed))
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_reproducible():
+    offsets, times = generate(1)
+    assert len(times) > 0
+
+    repeat_offsets, repeat_times = generate(1)
+    assert numpy.array_equal(offsets, repeat_offsets)
+    assert numpy.array_equal(times, repeat_times)
+
+    assert not numpy.array_equal(times, generate(2)[1])
+
+def test_spikes_within_stimulated_windows():
+    offsets, times = generate(1)
+    assert len(offsets) == (num_hcu * num_excitatory) + 1
+    assert offsets[-1] == len(times)
+
+    for h in range(num_hcu):
+        hcu_times = network.get_hcu_stimuli(offsets, times, h, num_excitatory)
+        for n, neuron_times in enumerate(hcu_times):
+            # Spikes of each neuron should be sorted whole milliseconds
+            assert numpy.all(numpy.diff(neuron_times) >= 0.0)
+            assert numpy.array_equal(neuron_times, numpy.round(neuron_times))
+
+            # Only neurons of stimulated minicolumns should spike and only while their minicolumn is stimulated
+            windows = [(start, start + duration) for m, start, _, duration in stim_minicolumns
+                       if m == (n % num_mcu_per_hcu)]
+            assert all(any(start <= t <= stop for start, stop in windows) for t in neuron_times)
+
+def test_windowed_stimuli():
+    offsets, times = generate(1)
+    windowed_offsets, windowed_times = network.window_stimuli(offsets, times, 100.0)
+    assert windowed_offsets[-1] == len(windowed_times)
+
+    # Each neuron should only retain its spikes from the start of the window
+    for n in range(num_hcu * num_excitatory):
+        neuron_times = times[offsets[n]:offsets[n + 1]]
+        assert numpy.array_equal(windowed_times[windowed_offsets[n]:windowed_offsets[n + 1]],
+                                 neuron_times[neuron_times >= 100.0])
+
+def test_minicolumn_out_of_range():
+    for minicolumn in (-1, num_mcu_per_hcu, num_excitatory + num_mcu_per_hcu):
+        with pytest.raises(AssertionError):
+            network.generate_discrete_stimuli([(minicolumn, 0.0, 50.0, 100.0)], num_hcu, num_excitatory,
+                                              num_mcu_per_hcu)
+
+def test_stimulus_sources_only_for_stimulated_cells(numpy_backend):
+    sim = numpy_backend
+    sim.setup(timestep=1.0, min_delay=1.0, max_delay=7.0)
+    cells = sim.Population(4, sim.IF_curr_exp(tau_refrac=20.0))
+    cells.record("spikes")
+
+    # Without any stimulus spikes, no sources should be built
+    network.build_stimulus(sim, cells, "unstimulated", [[]] * 4, 20.0)
+    assert len(numpy_sim._state.populations) == 1
+
+    # Otherwise there should be one source per stimulated cell, driving only that cell
+    network.build_stimulus(sim, cells, "stimulated", [[], [5.0], [], [10.0, 30.0]], 20.0)
+    assert [len(p) for p in numpy_sim._state.populations] == [4, 2]
+
+    sim.run(50.0)
+    ids, times = get_spiketrain_arrays(cells.get_data("spikes").segments[0].spiketrains)
+    assert sorted(set(ids)) == [1, 3]
+    assert times[ids == 1].min() > 5.0
+    assert times[ids == 3].min() > 10.0
+
+def test_seeded_stimuli_cached(tmp_path):
+    cache = StimulusCache(str(tmp_path))
+    offsets, times = network.get_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu,
+                                                  seed=1, cache=cache)
+
+    # Seeded stimuli should be generated with a RandomState seeded with seed and stored in cache
+    expected_offsets, expected_times = generate(1)
+    assert numpy.array_equal(offsets, expected_offsets)
+    assert numpy.array_equal(times, expected_times)
+
+    key = get_stimulus_key(stim_minicolumns, 1, num_hcu, num_excitatory, num_mcu_per_hcu)
+    cached_offsets, cached_times = cache.load(key)
+    assert numpy.array_equal(cached_offsets, expected_offsets)
+    assert numpy.array_equal(cached_times, expected_times)
+
+    # Subsequent requests should be loaded from cache
+    offsets, times = network.get_discrete_stimuli(stim_minicolumns, num_hcu, num_excitatory, num_mcu_per_hcu,
+                                                  seed=1, cache=cache)
+    assert isinstance(times, numpy.memmap)
+    assert numpy.array_equal(times, expected_times)
+
+def test_stimulus_key():
+    key = get_stimulus_key(stim_minicolumns, 1, num_hcu, num_excitatory, num_mcu_per_hcu)
+    assert get_stimulus_key(stim_minicolumns, 1, num_hcu, num_excitatory, num_mcu_per_hcu) == key
+    assert get_stimulus_key(stim_minicolumns, 2, num_hcu, num_excitatory, num_mcu_per_hcu) != key
+    assert get_stimulus_key(stim_minicolumns[:2], 1, num_hcu, num_excitatory, num_mcu_per_hcu) != key
+
+def test_cache_eviction(tmp_path):
+    offsets, times = generate(1)
+    entry_bytes = offsets.nbytes + times.nbytes
+
+    # Store two entries, making the first least-recently used
+    cache = StimulusCache(str(tmp_path), max_bytes=entry_bytes * 1.5, grace_period=0.0)
+    cache.store("a", offsets, times)
+    past = time.time() - 10.0
+    for filename in cache._get_filenames("a"):
+        os.utime(filename, (past, past))
+    cache.store("b", offsets, times)
+
+    # Least-recently used entry should have been evicted
+    assert cache.load("a") is None
+    assert cache.load("b") is not None
+
+    # Entries used within the grace period should never be evicted
+    cache = StimulusCache(str(tmp_path), max_bytes=0)
+    cache.store("c", offsets, times)
+    assert cache.load("b") is not None
+    assert cache.load("c") is not None
+
+def test_partially_evicted_entry_missed(tmp_path):
+    cache = StimulusCache(str(tmp_path))
+    cache.store("a", *generate(1))
+    os.remove(cache._get_filenames("a")[1])
+    assert cache.load("a") is None
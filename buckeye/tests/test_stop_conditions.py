@@ -0,0 +1,103 @@
+import numpy
+import pytest
+
+import stop_conditions
+
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+num_hcus = 1
+num_mcu_neurons = 2
+num_mcu_per_hcu = 3
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Append chunk from t_start to t_stop to store in which both neurons of minicolumn m spike
+# in the middle of each 10ms bin between the start and stop of each (m, start, stop)
+def append_chunk(store, t_start, t_stop, active=()):
+    ids = []
+    times = []
+    for m, start, stop in active:
+        bin_times = numpy.arange(start, stop, 10.0) + 5.0
+        for t in bin_times[(bin_times >= t_start) & (bin_times < t_stop)]:
+            # **NOTE** minicolumns are interleaved within HCUs
+            ids.extend(m + (n * num_mcu_per_hcu) for n in range(num_mcu_neurons))
+            times.extend([t] * num_mcu_neurons)
+
+    store.append("hcu_0_e", ids, times, num_mcu_neurons * num_mcu_per_hcu, t_start, t_stop)
+
+# Record time range of every read from store
+class RecordingStore(SpikeStore):
+    def __init__(self, folder):
+        super(RecordingStore, self).__init__(folder)
+        self.reads = []
+
+    def get_spikes(self, name, t_start=None, t_stop=None):
+        self.reads.append((t_start, t_stop))
+        return super(RecordingStore, self).get_spikes(name, t_start, t_stop)
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_all_minicolumns_visited(tmp_path):
+    store = RecordingStore(str(tmp_path / "spikes"))
+    condition = stop_conditions.all_minicolumns_visited(num_hcus, num_mcu_neurons, num_mcu_per_hcu,
+                                                        start_time=100.0)
+
+    # Minicolumn 0 is active before start time and 2 has only just become active
+    active = [(0, 50.0, 100.0), (1, 100.0, 130.0), (2, 130.0, 160.0), (0, 160.0, 180.0)]
+    append_chunk(store, 0.0, 145.0, active)
+    assert not condition(store, 145.0)
+
+    # Minicolumn 2's state continues across chunks so should now be visited but 0 only briefly
+    append_chunk(store, 145.0, 200.0, active)
+    assert not condition(store, 200.0)
+
+    append_chunk(store, 200.0, 250.0, [(0, 200.0, 230.0)])
+    assert condition(store, 250.0)
+
+    # Only bins which weren't decoded by previous calls should be read
+    assert store.reads == [(100.0, 140.0), (140.0, 200.0), (200.0, 250.0)]
+
+def test_network_silent(tmp_path):
+    store = SpikeStore(str(tmp_path / "spikes"))
+    condition = stop_conditions.network_silent(100.0, num_hcus, start_time=100.0)
+
+    # Network which hasn't spiked isn't silent until duration after start time
+    append_chunk(store, 0.0, 150.0)
+    assert not condition(store, 150.0)
+
+    append_chunk(store, 150.0, 250.0, [(1, 150.0, 160.0)])
+    assert not condition(store, 250.0)
+
+    append_chunk(store, 250.0, 300.0)
+    assert condition(store, 300.0)
+
+    # Start time must be specified
+    with pytest.raises(TypeError):
+        stop_conditions.network_silent(100.0, num_hcus)
+
+def test_attractor_locked(tmp_path):
+    store = SpikeStore(str(tmp_path / "spikes"))
+    condition = stop_conditions.attractor_locked(100.0, num_hcus, num_mcu_neurons, num_mcu_per_hcu)
+
+    append_chunk(store, 0.0, 150.0, [(1, 0.0, 60.0), (2, 60.0, 150.0)])
+    assert not condition(store, 150.0)
+
+    append_chunk(store, 150.0, 200.0, [(2, 150.0, 200.0)])
+    assert condition(store, 200.0)
+
+def test_recall_complete(tmp_path):
+    store = SpikeStore(str(tmp_path / "spikes"))
+    condition = stop_conditions.recall_complete(num_hcus, num_mcu_neurons, num_mcu_per_hcu, start_time=100.0,
+                                                silent_duration=200.0, locked_duration=1000.0)
+
+    # Recall should complete once the network falls silent after cue
+    append_chunk(store, 0.0, 200.0, [(0, 100.0, 150.0)])
+    assert not condition(store, 200.0)
+
+    append_chunk(store, 200.0, 400.0)
+    assert condition(store, 400.0)
@@ -0,0 +1,61 @@
+import functools
+
+import numpy
+
+import network
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_stream_seeds_deterministic():
+    seed = network.get_stream_seed(1, "connection", 0, 1, "ampa")
+    assert network.get_stream_seed(1, "connection", 0, 1, "ampa") == seed
+
+    # Seeds should fit in 32 bits
+    assert 0 <= seed < 2 ** 32
+
+def test_stream_seeds_independent():
+    keys = [("connection", i_pre, i_post, r) for i_pre in range(3) for i_post in range(3)
+            for r in ("ampa", "nmda")] + [("background", "e", h) for h in range(3)]
+
+    # Each key should get its own seed, which also depends on base seed
+    seeds = [network.get_stream_seed(1, *k) for k in keys]
+    assert len(set(seeds)) == len(keys)
+    assert all(network.get_stream_seed(2, *k) != s for k, s in zip(keys, seeds))
+
+def test_stream_rng_reproducible():
+    a = network.get_stream_rng(1, "background", "e", 0).next(100, "uniform", {"low": 0.0, "high": 1.0})
+    b = network.get_stream_rng(1, "background", "e", 0).next(100, "uniform", {"low": 0.0, "high": 1.0})
+    c = network.get_stream_rng(1, "background", "e", 1).next(100, "uniform", {"low": 0.0, "high": 1.0})
+    assert numpy.array_equal(a, b)
+    assert not numpy.array_equal(a, c)
+
+def test_hcu_connection_lists_reproducible():
+    ampa, nmda = network.generate_hcu_connection_lists(1, 0, 1, 40, 2.0)
+    repeat_ampa, repeat_nmda = network.generate_hcu_connection_lists(1, 0, 1, 40, 2.0)
+    assert numpy.array_equal(ampa, repeat_ampa)
+    assert numpy.array_equal(nmda, repeat_nmda)
+
+    # AMPA and NMDA connectivity are drawn from different streams
+    assert not numpy.array_equal(ampa[["pre", "post"]], nmda[["pre", "post"]])
+    assert numpy.all(ampa["delay"] == 2.0)
+
+def test_pregenerated_connection_lists_match():
+    delay_model = functools.partial(network.constant_hcu_delay, delay=3.0)
+    pregenerated = network.pregenerate_connection_lists(1, 2, 40, delay_model, num_processes=2)
+
+    # Connection lists generated in parallel should match those generated serially
+    for (i_pre, i_post), lists in zip([(0, 0), (0, 1), (1, 0), (1, 1)], pregenerated):
+        serial = network.generate_hcu_connection_lists(1, i_pre, i_post, 40, 3.0)
+        assert all(numpy.array_equal(p, s) for p, s in zip(lists, serial))
+
+def test_fixed_number_pre_list():
+    rng = network.get_stream_rng(1, "background", "e", 0)
+    connections = network.fixed_number_pre_list(rng, 20, 10, 5, 0.2, 1.0)
+
+    # Each postsynaptic neuron should receive input from 5 distinct presynaptic neurons
+    assert len(connections) == 50
+    for n in range(10):
+        pre = connections["pre"][connections["post"] == n]
+        assert len(numpy.unique(pre)) == 5
+        assert numpy.all((pre >= 0) & (pre < 20))
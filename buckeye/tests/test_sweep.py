@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import experiment_sequence
+import sweep
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+# Two test jobs which share a trained network
+grid = {"tau_p": [1000], "i_alpha": [0.1, 0.2]}
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+# Replace experiments with ones which just record that they ran in their output folder.
+# Jobs run in forked worker processes which inherit the replacements
+@pytest.fixture
+def fake_experiments(monkeypatch):
+    def train(folder, *args, **kwargs):
+        with open(os.path.join(folder, "trained"), "a") as f:
+            f.write("trained\n")
+
+    def test(training_folder, folder, mode, gain_per_hcu, i_alpha, *args, **kwargs):
+        if i_alpha > 0.15:
+            raise ValueError("i_alpha too large")
+
+        assert os.path.exists(os.path.join(training_folder, "trained"))
+        open(os.path.join(folder, "tested"), "w").close()
+
+    monkeypatch.setattr(experiment_sequence, "train", train)
+    monkeypatch.setattr(experiment_sequence, "test", test)
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_expand_grid():
+    assert sweep.expand_grid({"b": [1, 2], "a": [3]}) == [{"a": 3, "b": 1}, {"a": 3, "b": 2}]
+
+def test_job_params():
+    train_params, test_params = sweep.get_job_params({"tau_p": 1000, "i_alpha": 0.1})
+    assert train_params == {"symmetrical": False, "tau_p": 1000, "hcu_grid_size": 1,
+                            "num_mcu_per_hcu": 10, "num_mcu_neurons": 100}
+
+    # Mode-specific testing defaults should only apply to parameters which aren't specified
+    assert test_params["i_alpha"] == 0.1
+    assert test_params["gain_per_hcu"] == sweep.default_asymmetrical_test_params["gain_per_hcu"]
+    assert sweep.get_job_params({"symmetrical": True})[1]["i_alpha"] == 0.7
+
+    # Keys should only depend on parameter values
+    assert sweep.get_job_key({"a": 1, "b": 2}) == sweep.get_job_key({"b": 2, "a": 1})
+    assert sweep.get_job_key({"a": 1}) != sweep.get_job_key({"a": 2})
+
+def test_sweep(tmp_path, fake_experiments):
+    root = str(tmp_path / "sweep")
+    results = sweep.Sweep(root, stim_cache_folder=None).run(grid)
+
+    # Only the test job which didn't fail should be complete and it
+    # should share a training job with the one which did
+    assert len(results) == 1
+    folder, params = results[0]
+    assert params["i_alpha"] == 0.1
+    assert os.path.exists(os.path.join(folder, "tested"))
+
+    index = sweep.load_index(root)
+    statuses = sorted((e["kind"], e["status"]) for e in index.values())
+    assert statuses == [("test", "complete"), ("test", "failed"), ("train", "complete")]
+    assert "i_alpha too large" in [e for e in index.values() if e["status"] == "failed"][0]["error"]
+
+    assert sweep.query(root, "train") == [(os.path.join(root, e["folder"]), e["params"])
+                                          for e in index.values() if e["kind"] == "train"]
+    assert len(sweep.query(root, i_alpha=0.1)) == 1
+    assert sweep.query(root, i_alpha=0.2) == []
+
+def test_sweep_resumed(tmp_path, fake_experiments):
+    root = str(tmp_path / "sweep")
+
+    # With a budget of one job, only training should run
+    assert sweep.Sweep(root, max_jobs=1, stim_cache_folder=None).run(grid) == []
+    assert sorted(e["status"] for e in sweep.load_index(root).values()) == ["complete", "pending", "pending"]
+
+    # Resumed sweep should run the tests without repeating training
+    assert len(sweep.Sweep(root, stim_cache_folder=None).run(grid)) == 1
+    with open(os.path.join(sweep.query(root, "train")[0][0], "trained"), "r") as f:
+        assert f.read() == "trained\n"
@@ -0,0 +1,154 @@
+import os
+import types
+
+import numpy
+import pytest
+
+import conftest
+import network
+import numpy_sim
+import training_checkpoint
+
+from spike_store import SpikeStore
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def assert_results_equal(a, b):
+    biases_a, weights_a = a
+    biases_b, weights_b = b
+    assert all(numpy.array_equal(x, y) for x, y in zip(biases_a, biases_b))
+    assert all(numpy.array_equal(x, y) for w_a, w_b in zip(weights_a, weights_b) for x, y in zip(w_a, w_b))
+
+def train(folder, **kwargs):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return conftest.write_training_results(folder, *conftest.train(**kwargs))
+
+# Get excitatory spikes from store, sorted by neuron and time, regardless of how they were chunked
+def get_spikes(spike_store):
+    ids, times = spike_store.get_spikes("hcu_0_e")
+    order = numpy.lexsort((times, ids))
+    return numpy.column_stack((ids[order], times[order]))
+
+#------------------------------------------------------------------------------
+# Fixtures
+#------------------------------------------------------------------------------
+# numpy_sim without the ability to save and restore its state, like backends which can't
+@pytest.fixture
+def stateless_backend(numpy_backend):
+    stateless_sim = types.ModuleType("stateless_sim")
+    stateless_sim.__dict__.update((n, v) for n, v in vars(numpy_sim).items()
+                                  if n not in ("save_state", "load_state"))
+    network.set_backend(stateless_sim, numpy_sim)
+    yield stateless_sim
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_segmented_training_matches_single_run(tmp_path, numpy_backend):
+    single = train(str(tmp_path / "single"))
+
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    segmented = train(str(tmp_path / "segmented"), segment_duration=500.0, checkpoint_folder=checkpoint_folder)
+    assert_results_equal(single, segmented)
+
+    # Only the final segment should remain checkpointed
+    assert training_checkpoint.load_checkpoint(checkpoint_folder) == {"segment": 3, "time": 2000.0,
+                                                                      "folder": "segment_3",
+                                                                      "state": "simulator_state.pkl"}
+    assert sorted(os.listdir(checkpoint_folder)) == ["checkpoint.json", "segment_3"]
+
+def test_complete_checkpoint_not_retrained(tmp_path, numpy_backend):
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    trained = train(str(tmp_path / "trained"), checkpoint_folder=checkpoint_folder)
+
+    # Results should be copied from checkpoint without building a network
+    results = conftest.train(checkpoint_folder=checkpoint_folder)
+    assert numpy_sim._state is None
+    assert_results_equal(trained, conftest.write_training_results(str(tmp_path), *results))
+
+def test_converged_checkpoint(tmp_path, numpy_backend):
+    # With a large enough tolerance, training should stop after the second segment
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    converged = train(str(tmp_path / "converged"), segment_duration=500.0, checkpoint_folder=checkpoint_folder,
+                      convergence_tolerance=1.0E6)
+
+    checkpoint = training_checkpoint.load_checkpoint(checkpoint_folder)
+    assert checkpoint["time"] == 1000.0
+    assert checkpoint["converged"]
+
+    # Checkpointed biases and weights should be those of a network trained for
+    # as long, not the initial bias of neurons which haven't yet been sampled
+    assert_results_equal(converged, train(str(tmp_path / "short"), training_simtime=1000.0))
+    initial_bias = 0.05 * numpy.log(1000.0 / (20.0 * conftest.tau_p)) * 1000.0
+    assert not numpy.allclose(converged[0][0], initial_bias)
+
+    # Converged training should be complete
+    conftest.train(checkpoint_folder=checkpoint_folder, convergence_tolerance=1.0E6)
+    assert numpy_sim._state is None
+
+def test_interrupted_training_resumed(tmp_path, numpy_backend, monkeypatch):
+    single_store = SpikeStore(str(tmp_path / "single_spikes"))
+    single = train(str(tmp_path / "single"), spike_store=single_store)
+
+    # Interrupt training during its third segment
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    resumed_store = SpikeStore(str(tmp_path / "resumed_spikes"))
+    run = numpy_sim.run
+    run_times = []
+    def interrupted_run(simtime):
+        if len(run_times) == 2:
+            raise KeyboardInterrupt()
+        run_times.append(simtime)
+        return run(simtime)
+
+    monkeypatch.setattr(numpy_sim, "run", interrupted_run)
+    with pytest.raises(KeyboardInterrupt):
+        conftest.train(segment_duration=500.0, checkpoint_folder=checkpoint_folder, spike_store=resumed_store)
+    checkpoint = training_checkpoint.load_checkpoint(checkpoint_folder)
+    assert checkpoint["time"] == 1000.0
+
+    # Resumed training should only simulate the remaining segments but match uninterrupted training exactly
+    run_times = []
+    monkeypatch.setattr(numpy_sim, "run", lambda simtime: run_times.append(simtime) or run(simtime))
+    resumed = train(str(tmp_path / "resumed"), segment_duration=500.0, checkpoint_folder=checkpoint_folder,
+                    spike_store=resumed_store)
+    assert run_times == [500.0, 500.0]
+    assert_results_equal(single, resumed)
+    assert numpy.array_equal(get_spikes(single_store), get_spikes(resumed_store))
+    assert training_checkpoint.load_checkpoint(checkpoint_folder)["segment"] == 3
+
+def test_partial_checkpoint_without_state_restarted(tmp_path, numpy_backend):
+    single = train(str(tmp_path / "single"))
+
+    # Checkpoint of interrupted training, without the state to resume it from, should be ignored
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    os.makedirs(checkpoint_folder)
+    training_checkpoint._save_checkpoint(checkpoint_folder, {"segment": 1, "time": 1000.0, "folder": "segment_1"})
+
+    restarted = train(str(tmp_path / "restarted"), segment_duration=500.0, checkpoint_folder=checkpoint_folder)
+    assert_results_equal(single, restarted)
+    assert training_checkpoint.load_checkpoint(checkpoint_folder)["time"] == 2000.0
+
+def test_stateless_backend_only_checkpoints_results(tmp_path, stateless_backend, monkeypatch):
+    checkpoint_times = []
+    write_checkpoint = training_checkpoint.write_checkpoint
+    def recorded_write_checkpoint(folder, segment, time, *args):
+        checkpoint_times.append(time)
+        return write_checkpoint(folder, segment, time, *args)
+    monkeypatch.setattr(training_checkpoint, "write_checkpoint", recorded_write_checkpoint)
+
+    # Without the ability to resume, training should only be checkpointed once complete
+    checkpoint_folder = str(tmp_path / "checkpoint")
+    train(str(tmp_path / "trained"), segment_duration=500.0, checkpoint_folder=checkpoint_folder)
+    assert checkpoint_times == [2000.0]
+    assert training_checkpoint.load_checkpoint(checkpoint_folder) == {"segment": 3, "time": 2000.0,
+                                                                      "folder": "segment_3"}
+
+def test_max_weight_change():
+    previous = [(numpy.array([1.0, 2.0]), numpy.array([0.0]))]
+    weights = [(numpy.array([1.5, 2.0]), numpy.array([-2.0]))]
+    assert training_checkpoint.get_max_weight_change(weights, previous) == 2.0
+    assert training_checkpoint.get_max_weight_change([(numpy.empty(0), numpy.empty(0))],
+                                                     [(numpy.empty(0), numpy.empty(0))]) == 0.0
@@ -0,0 +1,167 @@
+import os
+
+import numpy
+import pytest
+
+import weight_files
+
+from weight_archive import WeightArchive
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+def build_random_weights(seed=1, num_neurons=20, p_connect=0.2):
+    rng = numpy.random.RandomState(seed)
+    pre, post = numpy.where(rng.uniform(size=(num_neurons, num_neurons)) < p_connect)
+    return weight_files.build_sparse_weights(pre, post, rng.normal(scale=4.0, size=len(pre)))
+
+#------------------------------------------------------------------------------
+# Tests
+#------------------------------------------------------------------------------
+def test_archive_round_trip(tmp_path):
+    filename = str(tmp_path / "weights.arc")
+    weights = build_random_weights()
+    dense = numpy.arange(12.0).reshape(3, 4)
+
+    with WeightArchive(filename, "w") as archive:
+        archive.add("sparse", weights)
+        archive.add("dense", dense)
+        archive.add("empty", weights[:0])
+
+    archive = WeightArchive(filename)
+    assert archive.get_names() == ["dense", "empty", "sparse"]
+    assert numpy.array_equal(archive.get("sparse"), weights)
+    assert numpy.array_equal(archive.get("dense"), dense)
+    assert archive.get("empty").dtype == weights.dtype
+    assert len(archive.get("empty")) == 0
+
+    # Blocks should be read-only memory maps, aligned so they can be mapped
+    block = archive.get("sparse")
+    assert isinstance(block, numpy.memmap)
+    assert archive.index["sparse"]["offset"] % WeightArchive.alignment == 0
+    with pytest.raises(ValueError):
+        block["weight"][0] = 0.0
+
+def test_incomplete_archive(tmp_path):
+    filename = str(tmp_path / "weights.arc")
+    archive = WeightArchive(filename, "w")
+    archive.add("sparse", build_random_weights())
+    archive._file.flush()
+
+    # Archive isn't complete until it is closed
+    with pytest.raises(IOError):
+        WeightArchive(filename)
+
+@pytest.mark.parametrize("use_archive", [False, True])
+def test_sparse_round_trip(tmp_path, use_archive):
+    weights = build_random_weights()
+    if use_archive:
+        filename = str(tmp_path / "weights.arc")
+        with WeightArchive(filename, "w") as archive:
+            weight_files.save_sparse_weights((archive, "weights"), weights)
+        source = (WeightArchive(filename), "weights")
+    else:
+        source = str(tmp_path / "weights.npy")
+        weight_files.save_sparse_weights(source, weights)
+
+    assert numpy.array_equal(weight_files.load_sparse_weights(source), weights)
+
+@pytest.mark.parametrize("frac_bits", [8, 11])
+def test_fixed_point_quantisation_error(tmp_path, frac_bits):
+    filename = str(tmp_path / "weights.npy")
+    weights = build_random_weights()
+    weight_files.save_sparse_weights(filename, weights, frac_bits)
+
+    data = weight_files.load_weight_array(filename)
+    assert data.dtype == weight_files.get_fixed_point_weight_dtype(frac_bits)
+    assert weight_files.get_sparse_weight_field(data) == ("weight_q%u" % frac_bits, 2.0 ** -frac_bits)
+
+    # Rounding should introduce at most half a least-significant bit of error
+    loaded = weight_files.load_sparse_weights(filename)
+    assert loaded.dtype == weight_files.sparse_weight_dtype
+    assert numpy.array_equal(loaded["pre"], weights["pre"])
+    assert numpy.array_equal(loaded["post"], weights["post"])
+    assert numpy.amax(numpy.abs(loaded["weight"] - weights["weight"])) <= 2.0 ** -(frac_bits + 1)
+
+def test_fixed_point_saturation(tmp_path):
+    filename = str(tmp_path / "weights.npy")
+    weights = weight_files.build_sparse_weights([0, 0], [0, 1], [100.0, -100.0])
+    weight_files.save_sparse_weights(filename, weights, 11)
+
+    # Weights out of range of 16-bit fixed-point should saturate
+    loaded = weight_files.load_sparse_weights(filename)
+    assert loaded["weight"][0] == pytest.approx(32767.0 / 2048.0)
+    assert loaded["weight"][1] == -16.0
+
+@pytest.mark.parametrize("shape", [(4, 5), (1, 4, 5)])
+def test_legacy_dense_weights(tmp_path, shape):
+    filename = str(tmp_path / "weights.npy")
+    dense = numpy.empty(shape)
+    dense.fill(numpy.nan)
+    dense.reshape(4, 5)[[0, 2, 3], [4, 1, 1]] = [1.0, -2.0, 3.0]
+    numpy.save(filename, dense)
+
+    weights = weight_files.load_sparse_weights(filename)
+    assert list(weights["pre"]) == [0, 2, 3]
+    assert list(weights["post"]) == [4, 1, 1]
+    assert list(weights["weight"]) == [1.0, -2.0, 3.0]
+
+    # Expanding them again should recover the original matrix
+    assert numpy.array_equal(weight_files.get_dense_weights(weights, (4, 5)), dense.reshape(4, 5),
+                             equal_nan=True)
+
+def test_weights_from_list():
+    weights = weight_files.get_sparse_weights_from_list([(2, 0, 1.0), (0, 1, 2.0), (0, 0, 3.0)])
+    assert list(weights["pre"]) == [0, 0, 2]
+    assert list(weights["post"]) == [0, 1, 0]
+    assert list(weights["weight"]) == [3.0, 2.0, 1.0]
+
+def test_dense_weights_keep_unconnected_neurons():
+    weights = weight_files.build_sparse_weights([0, 1], [1, 0], [1.0, 2.0])
+
+    # Neurons without any synapses, at the end of either dimension, should be retained
+    dense = weight_files.get_dense_weights(weights, (3, 4))
+    assert dense.shape == (3, 4)
+    assert numpy.count_nonzero(~numpy.isnan(dense)) == 2
+    assert dense[0, 1] == 1.0
+    assert dense[1, 0] == 2.0
+
+def test_weight_source_key(tmp_path, monkeypatch):
+    # Keys should be built without reading weights
+    def load_weight_array(source):
+        raise AssertionError("Weights read to build key")
+    monkeypatch.setattr(weight_files, "load_weight_array", load_weight_array)
+
+    filename = str(tmp_path / "weights.npy")
+    weights = build_random_weights()
+    weight_files.save_sparse_weights(filename, weights)
+    key = weight_files.get_weight_source_key(filename)
+    assert weight_files.get_weight_source_key(filename) == key
+
+    # Key of file should change when it is rewritten
+    os.utime(filename, (0.0, 0.0))
+    assert weight_files.get_weight_source_key(filename) != key
+
+    # Keys of archive blocks should only depend on their contents
+    for name, seed in (("a", 1), ("b", 1), ("c", 2)):
+        with WeightArchive(str(tmp_path / ("%s.arc" % name)), "w") as archive:
+            weight_files.save_sparse_weights((archive, "weights"), build_random_weights(seed))
+    block_key = lambda name: weight_files.get_weight_source_key((WeightArchive(str(tmp_path / ("%s.arc" % name))),
+                                                                 "weights"))
+    assert block_key("a") == block_key("b")
+    assert block_key("a") != block_key("c")
+
+def test_weight_source_key_without_checksum(tmp_path):
+    # Blocks of archives written without checksums should be identified by their archive's metadata
+    archive_filename = str(tmp_path / "weights.arc")
+    with WeightArchive(archive_filename, "w") as archive:
+        weight_files.save_sparse_weights((archive, "weights"), build_random_weights())
+        del archive.index["weights"]["crc32"]
+
+    archive = WeightArchive(archive_filename)
+    key = weight_files.get_weight_source_key((archive, "weights"))
+    assert key[0] == os.path.abspath(archive_filename)
+    assert key[-1] == "weights"
+
+    os.utime(archive_filename, (0.0, 0.0))
+    assert weight_files.get_weight_source_key((archive, "weights")) != key
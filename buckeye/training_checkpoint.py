@@ -0,0 +1,130 @@
+import json
+import logging
+import numpy
+import os
+import shutil
+import tempfile
+
+from result_collection import collect_results
+from weight_archive import WeightArchive
+from weight_files import load_sparse_weights, save_weight_array
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Load description of last complete training segment from
+# checkpoint folder or return None if there isn't one
+def load_checkpoint(folder):
+    checkpoint_filename = os.path.join(folder, "checkpoint.json")
+    if not os.path.exists(checkpoint_filename):
+        return None
+
+    with open(checkpoint_filename, "r") as f:
+        return json.load(f)
+
+# Checkpoint training at end of a segment. If save_state is provided, it is called
+# with a filename to save the simulator state to, so training can be resumed from
+# the checkpoint. If result writers returned by train_discrete are provided, weights
+# and biases are also snapshotted so they can be returned from the checkpoint
+def write_checkpoint(folder, segment, time, hcu_results=None, connection_results=None, save_state=None):
+    segment_folder = "segment_%u" % segment
+    segment_path = os.path.join(folder, segment_folder)
+    if not os.path.exists(segment_path):
+        os.makedirs(segment_path)
+
+    checkpoint = {"segment": segment, "time": time, "folder": segment_folder}
+
+    if save_state is not None:
+        save_state(os.path.join(segment_path, "simulator_state.pkl"))
+        checkpoint["state"] = "simulator_state.pkl"
+
+    # Write weights of all connections to archive and final biases of HCUs
+    if hcu_results is not None:
+        with WeightArchive(os.path.join(segment_path, "connection_weights.arc"), "w") as archive:
+            tasks = []
+            for i, (ampa_weight_writer, nmda_weight_writer) in enumerate(connection_results):
+                tasks.append((ampa_weight_writer, (archive, "connection_%u_e_e_ampa" % i)))
+                tasks.append((nmda_weight_writer, (archive, "connection_%u_e_e_nmda" % i)))
+            for i, (_, hcu_bias_writer) in enumerate(hcu_results):
+                tasks.append((hcu_bias_writer, os.path.join(segment_path, "hcu_%u_e_bias.npy" % i)))
+            collect_results(tasks)
+
+    # Only once segment is complete, point checkpoint at it
+    previous = load_checkpoint(folder)
+    _save_checkpoint(folder, checkpoint)
+
+    logger.info("Checkpointed training segment %u at %gms" % (segment, time))
+
+    # Remove superseded segment
+    if previous is not None and previous["folder"] != segment_folder:
+        shutil.rmtree(os.path.join(folder, previous["folder"]), ignore_errors=True)
+
+# Read weights of all connections into memory, using result
+# writers returned by train_discrete, so convergence can be tested
+def read_weights(connection_results):
+    archive = _WeightBuffer()
+    tasks = []
+    for i, (ampa_weight_writer, nmda_weight_writer) in enumerate(connection_results):
+        tasks.append((ampa_weight_writer, (archive, "connection_%u_e_e_ampa" % i)))
+        tasks.append((nmda_weight_writer, (archive, "connection_%u_e_e_nmda" % i)))
+    collect_results(tasks)
+
+    return [(load_sparse_weights((archive, "connection_%u_e_e_ampa" % i))["weight"],
+             load_sparse_weights((archive, "connection_%u_e_e_nmda" % i))["weight"])
+            for i in range(len(connection_results))]
+
+# Mark checkpointed segment as the end of training
+def mark_converged(folder):
+    checkpoint = load_checkpoint(folder)
+    checkpoint["converged"] = True
+    _save_checkpoint(folder, checkpoint)
+
+# Get largest absolute change between two sets of snapshotted weights.
+# Sparse weights are sorted by synapse so can be compared directly
+def get_max_weight_change(weights, previous_weights):
+    return max(numpy.amax(numpy.abs(w - p)) if len(w) > 0 else 0.0
+               for connection, previous_connection in zip(weights, previous_weights)
+               for w, p in zip(connection, previous_connection))
+
+# Get result writers, in the format returned by train_discrete,
+# which copy weights and biases from the checkpointed segment.
+# Spikes were streamed to the store while training so aren't re-written
+def get_checkpoint_results(folder, checkpoint, num_hcu):
+    segment_path = os.path.join(folder, checkpoint["folder"])
+    archive = WeightArchive(os.path.join(segment_path, "connection_weights.arc"))
+
+    def copy_writer(source):
+        return lambda filename: shutil.copyfile(os.path.join(segment_path, source), filename)
+
+    def copy_block_writer(name):
+        return lambda target: save_weight_array(target, archive.get(name))
+
+    hcu_results = [(lambda store: None, copy_writer("hcu_%u_e_bias.npy" % i))
+                   for i in range(num_hcu)]
+    connection_results = [(copy_block_writer("connection_%u_e_e_ampa" % i),
+                           copy_block_writer("connection_%u_e_e_nmda" % i))
+                          for i in range(num_hcu ** 2)]
+    return hcu_results, connection_results
+
+def _save_checkpoint(folder, checkpoint):
+    # Write to temporary file and rename so checkpoint is never partially written
+    handle, temp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(handle, "w") as f:
+        json.dump(checkpoint, f)
+    os.rename(temp_filename, os.path.join(folder, "checkpoint.json"))
+
+#------------------------------------------------------------------------------
+# _WeightBuffer
+#------------------------------------------------------------------------------
+# In-memory stand-in for a WeightArchive which weight writers can write blocks to
+class _WeightBuffer(object):
+    def __init__(self):
+        self._blocks = {}
+
+    def add(self, name, array):
+        self._blocks[name] = array
+
+    def get(self, name):
+        return self._blocks[name]
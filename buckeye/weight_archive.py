@@ -0,0 +1,129 @@
+import json
+import logging
+import numpy
+import os
+import struct
+import threading
+import zlib
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# WeightArchive
+#------------------------------------------------------------------------------
+# Single file holding named blocks of weights, typically one per HCU
+# pair and receptor. Blocks are written one after another, aligned so they
+# can be memory-mapped, and are followed by a JSON index of their offsets,
+# shapes, dtypes and CRC-32 checksums and then a fixed-size footer locating the index:
+#
+# [magic][block 0][block 1]...[JSON index][index offset][index length][magic]
+#
+# Archives are opened for writing with mode="w" and blocks added to them,
+# possibly from multiple threads, until they are closed. Archives opened for
+# reading (the default) return blocks as read-only, zero-copy memory maps
+class WeightArchive(object):
+    magic = b"BCPNNWA1"
+    footer_format = "<QQ8s"
+    alignment = 64
+
+    def __init__(self, filename, mode="r"):
+        assert mode in ("r", "w"), "Weight archives can be opened for reading or writing"
+
+        self.filename = filename
+        self.mode = mode
+
+        if mode == "w":
+            self._file = open(filename, "wb")
+            self._file.write(self.magic)
+            self._lock = threading.Lock()
+            self.index = {}
+        else:
+            self._file = None
+            self.index = self._read_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #-------------------------------------------------------------------
+    # Public methods
+    #-------------------------------------------------------------------
+    def add(self, name, array):
+        assert self.mode == "w", "Blocks can only be added to archives opened for writing"
+
+        array = numpy.ascontiguousarray(array)
+        with self._lock:
+            assert name not in self.index, "Archive already contains block '%s'" % name
+
+            # Pad so block starts on aligned offset
+            offset = self._file.tell()
+            padding = (-offset) % self.alignment
+            self._file.write(b"\0" * padding)
+            offset += padding
+
+            data = array.tobytes()
+            self._file.write(data)
+            self.index[name] = {"offset": offset, "shape": list(array.shape),
+                                "dtype": self._encode_dtype(array.dtype),
+                                "crc32": zlib.crc32(data) & 0xFFFFFFFF}
+
+    def get(self, name):
+        assert self.mode == "r", "Blocks can only be read from archives opened for reading"
+
+        block = self.index[name]
+        dtype = self._decode_dtype(block["dtype"])
+        shape = tuple(block["shape"])
+
+        # **NOTE** numpy can't memory-map empty arrays
+        if int(numpy.prod(shape)) == 0:
+            return numpy.empty(shape, dtype=dtype)
+
+        return numpy.memmap(self.filename, dtype=dtype, mode="r",
+                            offset=block["offset"], shape=shape)
+
+    def get_names(self):
+        return sorted(self.index.keys())
+
+    def close(self):
+        if self._file is None:
+            return
+
+        # Write index followed by footer
+        index_data = json.dumps(self.index, sort_keys=True).encode("utf-8")
+        index_offset = self._file.tell()
+        self._file.write(index_data)
+        self._file.write(struct.pack(self.footer_format, index_offset, len(index_data), self.magic))
+
+        # Sync to disk
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+        logger.debug("Wrote %u blocks to weight archive %s" % (len(self.index), self.filename))
+
+    #-------------------------------------------------------------------
+    # Private methods
+    #-------------------------------------------------------------------
+    def _read_index(self):
+        footer_size = struct.calcsize(self.footer_format)
+        with open(self.filename, "rb") as f:
+            f.seek(-footer_size, os.SEEK_END)
+            index_offset, index_length, magic = struct.unpack(self.footer_format, f.read(footer_size))
+            if magic != self.magic:
+                raise IOError("%s is not a complete weight archive" % self.filename)
+
+            f.seek(index_offset)
+            return json.loads(f.read(index_length).decode("utf-8"))
+
+    def _encode_dtype(self, dtype):
+        # Structured dtypes are stored as lists of fields
+        return dtype.descr if dtype.names is not None else dtype.str
+
+    def _decode_dtype(self, dtype):
+        if isinstance(dtype, list):
+            return numpy.dtype([tuple(str(f) for f in field) for field in dtype])
+        else:
+            return numpy.dtype(str(dtype))
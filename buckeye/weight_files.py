@@ -0,0 +1,148 @@
+import logging
+import numpy
+import os
+
+logger = logging.getLogger()
+
+#------------------------------------------------------------------------------
+# Globals
+#------------------------------------------------------------------------------
+# Record type of sparse weight files - only connected synapses are stored
+sparse_weight_dtype = numpy.dtype([("pre", numpy.int32), ("post", numpy.int32),
+                                   ("weight", numpy.float32)])
+
+# Prefix of weight field in sparse weight files storing weights as 16-bit
+# fixed-point, followed by the number of fractional bits e.g. weight_q11
+fixed_point_field_prefix = "weight_q"
+
+#------------------------------------------------------------------------------
+# Functions
+#------------------------------------------------------------------------------
+# Weights are saved to and loaded from either a .npy filename or a
+# (WeightArchive, block name) tuple. Either way, they are loaded memory-mapped
+def save_weight_array(target, array):
+    if isinstance(target, tuple):
+        archive, name = target
+        archive.add(name, array)
+    else:
+        numpy.save(target, array)
+
+def load_weight_array(source):
+    if isinstance(source, tuple):
+        archive, name = source
+        return archive.get(name)
+    else:
+        return numpy.load(source, mmap_mode="r")
+
+# Identify the weights a filename or (WeightArchive, block name) tuple refers to
+# without reading them. Archive blocks are identified by the type, shape and
+# checksum stored in their archive's index or, in archives written without
+# checksums, by the archive's path, size and modification time, as files are
+def get_weight_source_key(source):
+    if isinstance(source, tuple):
+        archive, name = source
+        block = archive.index[name]
+        if "crc32" in block:
+            return [block["dtype"], block["shape"], block["crc32"]]
+        else:
+            return _get_file_key(archive.filename) + [name]
+    else:
+        return _get_file_key(source)
+
+def _get_file_key(filename):
+    stat = os.stat(filename)
+    return [os.path.abspath(filename), stat.st_size, stat.st_mtime]
+
+def get_fixed_point_weight_dtype(frac_bits):
+    return numpy.dtype([("pre", numpy.int32), ("post", numpy.int32),
+                        ("%s%u" % (fixed_point_field_prefix, frac_bits), numpy.int16)])
+
+# Build sparse weights, sorted by pre and then postsynaptic index
+def build_sparse_weights(pre, post, weight):
+    order = numpy.lexsort((post, pre))
+
+    weights = numpy.empty(len(order), dtype=sparse_weight_dtype)
+    weights["pre"] = numpy.asarray(pre)[order]
+    weights["post"] = numpy.asarray(post)[order]
+    weights["weight"] = numpy.asarray(weight)[order]
+    return weights
+
+# Build sparse weights from a weight list in the format returned by
+# Projection.get("weight", format="list") i.e. (pre, post, weight) tuples
+def get_sparse_weights_from_list(weight_list):
+    weight_list = numpy.asarray(weight_list, dtype=float).reshape(-1, 3)
+    return build_sparse_weights(weight_list[:,0].astype(numpy.int32),
+                                weight_list[:,1].astype(numpy.int32),
+                                weight_list[:,2])
+
+# Save sparse weights, optionally as 16-bit fixed-point with frac_bits fractional bits
+def save_sparse_weights(target, weights, frac_bits=None):
+    if frac_bits is None:
+        save_weight_array(target, weights)
+        return
+
+    # Round weights to fixed-point, saturating those out of range
+    scale = float(2 ** frac_bits)
+    fixed_point_limits = numpy.iinfo(numpy.int16)
+    fixed_point = numpy.round(weights["weight"].astype(numpy.float64) * scale)
+    num_saturated = numpy.count_nonzero((fixed_point < fixed_point_limits.min) |
+                                        (fixed_point > fixed_point_limits.max))
+    numpy.clip(fixed_point, fixed_point_limits.min, fixed_point_limits.max, out=fixed_point)
+
+    fixed_point_weights = numpy.empty(len(weights), dtype=get_fixed_point_weight_dtype(frac_bits))
+    fixed_point_weights["pre"] = weights["pre"]
+    fixed_point_weights["post"] = weights["post"]
+    fixed_point_weights[fixed_point_weights.dtype.names[2]] = fixed_point
+
+    # Report quantisation error
+    if len(weights) > 0:
+        error = numpy.abs((fixed_point / scale) - weights["weight"])
+        logger.info("Quantised %u weights to %u fractional bits: max error %g, mean error %g, %u saturated"
+                    % (len(weights), frac_bits, numpy.amax(error), numpy.mean(error), num_saturated))
+
+    save_weight_array(target, fixed_point_weights)
+
+def is_sparse_weights(data):
+    return data.dtype.names is not None
+
+# Load weights from a sparse or fixed-point weight file or a legacy dense matrix
+def load_sparse_weights(source):
+    data = load_weight_array(source)
+
+    # **YUCK** older scripts output dense matrices, sometimes in 3D
+    if not is_sparse_weights(data):
+        if len(data.shape) == 3:
+            data = data[0]
+
+        pre, post = numpy.where(~numpy.isnan(data))
+        return build_sparse_weights(pre, post, data[pre, post])
+
+    # If data is in fixed-point, convert back to floating point
+    weight_field, weight_scale = get_sparse_weight_field(data)
+    if weight_scale != 1.0:
+        weights = numpy.empty(len(data), dtype=sparse_weight_dtype)
+        weights["pre"] = data["pre"]
+        weights["post"] = data["post"]
+        weights["weight"] = data[weight_field] * weight_scale
+        return weights
+    else:
+        return numpy.asarray(data)
+
+# Get name of the field sparse weight data stores weights in
+# and the scale which converts them to floating point
+def get_sparse_weight_field(data):
+    weight_field = data.dtype.names[2]
+    if weight_field.startswith(fixed_point_field_prefix):
+        frac_bits = int(weight_field[len(fixed_point_field_prefix):])
+        return weight_field, 1.0 / float(2 ** frac_bits)
+    else:
+        return weight_field, 1.0
+
+# Expand sparse weights into a dense (num_pre, num_post) matrix with NaN for unconnected
+# synapses. Sparse weights don't record how many neurons they connect, and neurons
+# with no synapses can't be inferred from them, so the shape must be specified
+def get_dense_weights(weights, shape):
+    dense = numpy.empty(shape)
+    dense.fill(numpy.nan)
+    dense[weights["pre"], weights["post"]] = weights["weight"]
+    return dense